@@ -0,0 +1,18 @@
+from fastapi import Depends, HTTPException, status
+from app.api.deps import get_current_user_remote
+from typing import Any
+User = Any
+
+def require_admin_role(user: User = Depends(get_current_user_remote)) -> User:
+    """
+    Dependency that ensures the authenticated user has the 'ROLE_ADMIN' role.
+    Role is expected to be in user.app_metadata['role']; the session is re-checked remotely.
+    """
+    role = user.app_metadata.get("role")
+
+    if role != "ROLE_ADMIN":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied. Admin role required."
+        )
+    return user
@@ -1,3 +1,3 @@
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_user_remote
 
-__all__ = ["get_current_user"]
+__all__ = ["get_current_user", "get_current_user_remote"]
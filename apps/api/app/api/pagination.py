@@ -0,0 +1,63 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row: Dict[str, Any], sort_column: str = "created_at") -> str:
+    """Opaque keyset cursor for (sort_column, id)."""
+    payload = json.dumps({"s": row[sort_column], "i": str(row["id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (sort value, id) from a client-supplied cursor. Both end up in a PostgREST filter, so they
+    are re-serialized from parsed values: an ISO-8601 timestamp and a UUID, else 400.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["s"]).isoformat(), str(uuid.UUID(payload["i"]))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(cursor: str, sort_column: str = "created_at") -> str:
+    """
+    PostgREST `or` filter for rows strictly after the cursor in
+    (sort_column DESC, id DESC) order. Values are quoted because timestamps contain `.` and `:`.
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    return (
+        f'{sort_column}.lt."{sort_value}",'
+        f'and({sort_column}.eq."{sort_value}",id.lt.{row_id})'
+    )
+
+
+def apply_keyset(query, cursor: Optional[str], limit: int, sort_column: str = "created_at"):
+    """Orders by (sort_column, id) DESC, seeks past the cursor and over-fetches one row to detect more."""
+    if cursor:
+        query = query.or_(keyset_filter(cursor, sort_column))
+    return query.order(sort_column, desc=True).order("id", desc=True).limit(limit + 1)
+
+
+def paginate(rows: List[Dict[str, Any]], limit: int, sort_column: str = "created_at") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trims the over-fetched row and returns (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1], sort_column)
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
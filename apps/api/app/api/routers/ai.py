@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import os
 import google.generativeai as genai
-from app.services.gemini import GeminiService
+from app.services.gemini import GeminiService, complete
 
 router = APIRouter()
 
@@ -35,12 +35,10 @@ async def generate_product_description(request: GenerateRequest):
         return {"description": f"[MOCK AI] This is a premium {request.title} featuring state-of-the-art design and durability. Perfect for daily use."}
 
     try:
-        model = genai.GenerativeModel('gemini-pro')
         prompt = f"Write a compelling, professional e-commerce product description for a product titled '{request.title}'. Keep it under 50 words."
         
-        # Use async generate for consistency
-        response = await model.generate_content_async(prompt)
-        return {"description": response.text}
+        # Cached + coalesced: repeated titles cost one upstream call
+        return {"description": await complete('gemini-pro', prompt)}
     except Exception as e:
         print(f"Gemini Error: {e}")
         # Fallback on error
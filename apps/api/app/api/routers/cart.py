@@ -2,92 +2,44 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from uuid import UUID
 from app.api.deps import get_current_user
 from app.core.security import get_supabase
-from app.schemas.cart import Cart, CartItemCreate, CartItemUpdate
+from app.schemas.cart import Cart, CartItemCreate, CartItemsBatchCreate, CartItemUpdate
 from typing import List
 
 router = APIRouter()
 
-@router.get("/", response_model=Cart)
-def get_my_cart(user = Depends(get_current_user)):
+# Every cart read/mutation is one Postgres function call (see the cart_rpc migration):
+# the function ensures the cart exists, applies the change and returns the hydrated cart.
+
+def _cart_rpc(fn: str, params: dict) -> dict:
     supabase = get_supabase()
-    
-    # 1. Get Cart ID
-    cart_res = supabase.table("carts").select("*").eq("user_id", user.id).execute()
-    
-    if not cart_res.data:
-        # Should have been created by trigger, but create if missing
-        cart_res = supabase.table("carts").insert({"user_id": user.id}).execute()
-        
-    cart = cart_res.data[0]
-    
-    # 2. Get Items with Product details
-    # Supabase allows deep joins? Yes: select(*, products(*))
-    # Note: "product:products(*)" syntax depends on FK name or relation.
-    # Assuming standard relation detection.
-    
-    items_res = supabase.table("cart_items")\
-        .select("*, product:products(*)")\
-        .eq("cart_id", cart['id'])\
-        .execute()
-        
-    cart['items'] = items_res.data
+    cart = supabase.rpc(fn, params).execute().data
+    if not cart:
+        raise HTTPException(status_code=404, detail="Cart not found")
     return cart
 
+@router.get("/", response_model=Cart)
+def get_my_cart(user = Depends(get_current_user)):
+    return _cart_rpc("cart_get", {"p_user_id": user.id})
+
 @router.post("/items", response_model=Cart)
 def add_item(item: CartItemCreate, user = Depends(get_current_user)):
-    supabase = get_supabase()
-    
-    # 1. Get Cart
-    cart_res = supabase.table("carts").select("id").eq("user_id", user.id).execute()
-    if not cart_res.data:
-         cart_res = supabase.table("carts").insert({"user_id": user.id}).execute()
-    cart_id = cart_res.data[0]['id']
-    
-    # 2. Check if item exists
-    existing = supabase.table("cart_items")\
-        .select("*")\
-        .eq("cart_id", cart_id)\
-        .eq("product_id", str(item.product_id))\
-        .execute()
-        
-    if existing.data:
-        # Update quantity
-        new_qty = existing.data[0]['quantity'] + item.quantity
-        supabase.table("cart_items")\
-            .update({"quantity": new_qty})\
-            .eq("id", existing.data[0]['id'])\
-            .execute()
-    else:
-        # Insert new
-        supabase.table("cart_items").insert({
-            "cart_id": cart_id,
-            "product_id": str(item.product_id),
-            "quantity": item.quantity
-        }).execute()
-        
-    # Return full cart
-    return get_my_cart(user)
+    # Upsert: ON CONFLICT (cart_id, product_id) quantity = quantity + excluded.quantity
+    return _cart_rpc("cart_add_items", {
+        "p_user_id": user.id,
+        "p_items": [{"product_id": str(item.product_id), "quantity": item.quantity}]
+    })
+
+@router.post("/items/batch", response_model=Cart)
+def add_items(batch: CartItemsBatchCreate, user = Depends(get_current_user)):
+    """
+    Adds many lines in one round trip (e.g. re-order, shared lists, agent replenishment).
+    """
+    return _cart_rpc("cart_add_items", {
+        "p_user_id": user.id,
+        "p_items": [{"product_id": str(i.product_id), "quantity": i.quantity} for i in batch.items]
+    })
 
 @router.delete("/items/{item_id}")
 def remove_item(item_id: UUID, user = Depends(get_current_user)):
-    supabase = get_supabase()
-    
-    # Verify ownership via cart lookup? RLS handles it if we use user token.
-    # Server client bypasses RLS if service role.
-    # We must be careful.
-    # Cheap check: Just delete where ID matches AND cart belongs to user?
-    # Or fetch cart id first.
-    
-    cart_res = supabase.table("carts").select("id").eq("user_id", user.id).execute()
-    if not cart_res.data:
-        raise HTTPException(status_code=404, detail="Cart not found")
-        
-    cart_id = cart_res.data[0]['id']
-    
-    supabase.table("cart_items")\
-        .delete()\
-        .eq("id", str(item_id))\
-        .eq("cart_id", cart_id)\
-        .execute()
-        
-    return get_my_cart(user)
+    # The function scopes the delete to the caller's cart, so foreign item ids are a no-op.
+    return _cart_rpc("cart_remove_item", {"p_user_id": user.id, "p_item_id": str(item_id)})
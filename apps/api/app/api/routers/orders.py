@@ -1,110 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from typing import List, Optional
+from postgrest.exceptions import APIError
 from uuid import UUID
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_remote
+from app.api.pagination import MAX_PAGE_SIZE, apply_keyset, paginate, set_next_cursor
 from app.core.security import get_supabase
 from app.schemas.order import Order
-from decimal import Decimal
+from app.services.catalog_cache import invalidate_product
 
 router = APIRouter()
 
+# Business-rule failures raised by the checkout_cart function (all roll the transaction back)
+CHECKOUT_CLIENT_ERRORS = ("No active cart found", "Cart is empty", "Insufficient stock")
+
 @router.post("/checkout", response_model=Order)
-def checkout(user = Depends(get_current_user)):
+def checkout(
+    user = Depends(get_current_user_remote),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128)
+):
+    """
+    Atomic checkout in one transaction (see the checkout_rpc migration):
+    locks the cart, decrements stock with `stock = stock - qty WHERE stock >= qty`
+    for every line, bulk-inserts order_items and clears the cart.
+    Retrying with the same `Idempotency-Key` header returns the original order.
+    Charges money, so the session is re-checked with Supabase Auth (revoked tokens fail).
+    """
     supabase = get_supabase()
-    
-    # 1. Get Cart Items
-    cart_res = supabase.table("carts").select("id").eq("user_id", user.id).execute()
-    if not cart_res.data:
-        raise HTTPException(status_code=400, detail="No active cart found")
-    cart_id = cart_res.data[0]['id']
-    
-    items_res = supabase.table("cart_items")\
-        .select("*, product:products(*)")\
-        .eq("cart_id", cart_id)\
-        .execute()
-        
-    if not items_res.data:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-        
-    items = items_res.data
-    
-    # 2. Calculate Total & Validate Stock
-    total = Decimal(0)
-    order_items_data = []
-    
-    for item in items:
-        qty = item['quantity']
-        product = item['product']
-        
-        if not product:
-            raise HTTPException(status_code=400, detail=f"Product for item {item['id']} not found")
-            
-        if product['stock'] < qty:
-            raise HTTPException(status_code=400, detail=f"Insufficient stock for {product['title']}")
-            
-        price = Decimal(str(product['price'])) # Convert float/string to Decimal safely
-        total += price * qty
-        
-        order_items_data.append({
-            "product_id": product['id'],
-            "quantity": qty,
-            "price_at_purchase": float(price) # Supabase expects float/numeric
-        })
+    try:
+        order = supabase.rpc("checkout_cart", {
+            "p_user_id": user.id,
+            "p_idempotency_key": idempotency_key
+        }).execute().data
+    except APIError as e:
+        if e.message and e.message.startswith(CHECKOUT_CLIENT_ERRORS):
+            raise HTTPException(status_code=400, detail=e.message)
+        raise HTTPException(status_code=500, detail="Failed to create order")
 
-    # 3. Create Order
-    # Note: A real transaction would be best. Supabase/PostgREST doesn't expose explicit transactions via API easily 
-    # without RPC. For V1 we do sequential steps. Failure mid-way is a risk but acceptable for MVP.
-    
-    order_res = supabase.table("orders").insert({
-        "user_id": user.id,
-        "total_amount": float(total),
-        "status": "paid" # Mock payment
-    }).execute()
-    
-    if not order_res.data:
+    if not order:
         raise HTTPException(status_code=500, detail="Failed to create order")
-        
-    order = order_res.data[0]
-    
-    # 4. Create Order Items & Decrement Stock
-    for item_data in order_items_data:
-        # Add order_id
-        item_data["order_id"] = order['id']
-        supabase.table("order_items").insert(item_data).execute()
-        
-        # Decrement Stock
-        # We need to fetch current stock again? Or rely on previous fetch?
-        # Ideally atomic decrement: update products set stock = stock - qty where id = ...
-        # Supabase-py doesn't easily do "stock - 1" without RPC.
-        # We'll read-modify-write.
-        
-        # Re-fetch for safety or use loop data? Use loop data for speed in MVP.
-        # But wait, we need to know the *current* stock in DB to decrement correctly if it changed?
-        # Let's assume naive read-modify-write.
-        
-        pass # Optimization: do this in a batch or RPC later.
-        
-        # Let's do the update:
-        # We know product['stock'] from step 1.
-        # We should ideally decrement.
-        
-        # Actually, let's just do it:
-        current_stock = [i['product']['stock'] for i in items if i['product']['id'] == item_data['product_id']][0]
-        new_stock = current_stock - item_data['quantity']
-        supabase.table("products").update({"stock": new_stock}).eq("id", item_data['product_id']).execute()
 
-    # 5. Clear Cart
-    supabase.table("cart_items").delete().eq("cart_id", cart_id).execute()
-    
-    # 6. Return Order (with items populated?)
-    # Return basic order details.
-    
+    _invalidate_purchased(supabase, [item["product_id"] for item in order.get("items", [])])
     return order
 
+def _invalidate_purchased(supabase, product_ids: List[str]):
+    """
+    Stock changed: drop the detail pages and retire every listing the products appear on.
+    Runs after the order is committed and charged, so no failure here may fail the checkout.
+    """
+    if not product_ids:
+        return
+    try:
+        rows = supabase.table("products").select("id,category,vendor_id").in_("id", product_ids).execute().data
+    except Exception as e:
+        print(f"[Orders] Listing lookup for cache invalidation failed: {e}")
+        rows = []  # unknown listings: still drops the details and the unfiltered listings
+    found = {str(row["id"]): row for row in rows}
+    for product_id in product_ids:
+        row = found.get(str(product_id), {})
+        try:
+            invalidate_product(product_id, categories=[row.get("category")], vendor_id=row.get("vendor_id"))
+        except Exception as e:
+            print(f"[Orders] Cache invalidation for product {product_id} failed: {e}")
+
+
+ORDER_COLUMNS = "id,user_id,total_amount,status,created_at"
+ORDER_ITEM_COLUMNS = "id,order_id,product_id,quantity,price_at_purchase"
 
 @router.get("/", response_model=List[Order])
-def list_orders(user = Depends(get_current_user)):
+def list_orders(
+    response: Response,
+    user = Depends(get_current_user),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    items: bool = True,
+    summary: bool = False
+):
+    """
+    Order history, newest first, keyset-paginated on (created_at, id).
+    - `items=false`: order rows only.
+    - `summary=true`: order rows plus `item_count` (no line items are shipped).
+    The next page cursor is returned in the `X-Next-Cursor` header.
+    """
     supabase = get_supabase()
-    # Fetch orders + items
-    res = supabase.table("orders").select("*, items:order_items(*)").eq("user_id", user.id).order("created_at", desc=True).execute()
-    return res.data
+
+    columns = ORDER_COLUMNS
+    if summary:
+        columns += ",item_count:order_items(count)"
+    elif items:
+        columns += f",items:order_items({ORDER_ITEM_COLUMNS})"
+
+    query = supabase.table("orders").select(columns).eq("user_id", user.id)
+    rows = apply_keyset(query, cursor, limit).execute().data
+    page, next_cursor = paginate(rows, limit)
+    set_next_cursor(response, next_cursor)
+
+    if summary:
+        for order in page:
+            # PostgREST returns embedded aggregates as [{"count": n}]
+            counts = order.pop("item_count", None) or [{"count": 0}]
+            order["item_count"] = counts[0]["count"]
+    return page
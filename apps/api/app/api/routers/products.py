@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from typing import List, Optional
 from uuid import UUID
 from app.api.deps import get_current_user
+from app.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_keyset, paginate, set_next_cursor
 from app.core.security import get_supabase
-from app.schemas.product import Product, ProductCreate, ProductUpdate
+from app.services.catalog_cache import (
+    CacheEntry, catalog_cache, etag_matches, invalidate_product, product_key, product_list_key
+)
+from app.services.product_search import product_search
+from app.schemas.product import Product, ProductCreate, ProductUpdate, PRODUCT_COLUMNS
 from supabase import Client
 
 router = APIRouter()
 
+# Clients and CDNs may store responses but must revalidate every use: the ETag/304 path
+# stays cheap, and a generation bump is visible on the very next request
+CATALOG_CACHE_CONTROL = "no-cache"
+
+def _conditional_response(request: Request, response: Response, entry: CacheEntry):
+    """
+    Applies ETag validators. Returns a bare 304 when the client already holds this version.
+    """
+    response.headers["ETag"] = entry.etag
+    response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
 # Mock Data for Development when DB is offline
 MOCK_PRODUCTS = [
     {
@@ -49,23 +68,60 @@ MOCK_PRODUCTS = [
 ]
 
 @router.get("/", response_model=List[Product])
-def list_products():
+def list_products(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    vendor_id: Optional[UUID] = None,
+):
+    """
+    Keyset-paginated catalog, newest first on (created_at, id).
+    Pass the `X-Next-Cursor` response header back as `cursor` to fetch the next page.
+    Served read-through from the catalog cache, with ETag / If-None-Match support.
+    """
     try:
-        supabase = get_supabase()
-        response = supabase.table("products").select("*").execute()
-        return response.data
+        cache_key = product_list_key(category, vendor_id, limit, cursor)
+        entry = catalog_cache.get(cache_key)
+        if entry is None:
+            supabase = get_supabase()
+            query = supabase.table("products").select(PRODUCT_COLUMNS)
+            if category:
+                query = query.eq("category", category)
+            if vendor_id:
+                query = query.eq("vendor_id", str(vendor_id))
+
+            rows = apply_keyset(query, cursor, limit).execute().data
+            page, next_cursor = paginate(rows, limit)
+            entry = catalog_cache.set(cache_key, {"items": page, "next_cursor": next_cursor})
+
+        set_next_cursor(response, entry.value["next_cursor"])
+        not_modified = _conditional_response(request, response, entry)
+        return not_modified or entry.value["items"]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"DB Error (list_products): {e}. Returning Mocks.")
-        return MOCK_PRODUCTS
+        return [
+            p for p in MOCK_PRODUCTS
+            if (not category or p["category"] == category) and (not vendor_id or p["vendor_id"] == str(vendor_id))
+        ][:limit]
 
 @router.get("/{id}", response_model=Product)
-def get_product(id: str):
+def get_product(id: str, request: Request, response: Response):
     try:
-        supabase = get_supabase()
-        response = supabase.table("products").select("*").eq("id", id).execute()
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return response.data[0]
+        cache_key = product_key(id)
+        entry = catalog_cache.get(cache_key)
+        if entry is None:
+            supabase = get_supabase()
+            db_response = supabase.table("products").select(PRODUCT_COLUMNS).eq("id", id).execute()
+            if not db_response.data:
+                raise HTTPException(status_code=404, detail="Product not found")
+            entry = catalog_cache.set(cache_key, db_response.data[0])
+
+        not_modified = _conditional_response(request, response, entry)
+        return not_modified or entry.value
     except Exception as e:
         print(f"DB Error (get_product): {e}. Returning Mock if match found.")
         # Fallback: check mocks
@@ -106,6 +162,9 @@ def create_product(product: ProductCreate, user = Depends(get_current_user)):
     # Check for RLS error if any, though supabase-py might raise exception
     if not response.data:
          raise HTTPException(status_code=400, detail="Could not create product")
+
+    invalidate_product(categories=[product_data.get("category")], vendor_id=user.id)
+    product_search.upsert(response.data[0])
     return response.data[0]
 
 @router.put("/{id}", response_model=Product)
@@ -117,7 +176,7 @@ def update_product(id: UUID, product_update: ProductUpdate, user = Depends(get_c
     # To act as USER, we need `supabase.auth.set_session(access_token)`.
     # For simple backend implementation now, we will manually check ownership.
     
-    existing = supabase.table("products").select("vendor_id").eq("id", str(id)).execute()
+    existing = supabase.table("products").select("vendor_id,category").eq("id", str(id)).execute()
     if not existing.data:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -126,7 +185,14 @@ def update_product(id: UUID, product_update: ProductUpdate, user = Depends(get_c
 
     update_data = product_update.model_dump(exclude_unset=True)
     response = supabase.table("products").update(update_data).eq("id", str(id)).execute()
-    
+
+    # Retire the item and every listing it was (or now is) part of
+    invalidate_product(
+        product_id=id,
+        categories=[existing.data[0].get("category"), update_data.get("category")],
+        vendor_id=user.id
+    )
+    product_search.upsert(response.data[0])
     return response.data[0]
 
 
@@ -178,5 +244,8 @@ def create_product_multipart(
     
     if not response.data:
          raise HTTPException(status_code=400, detail="Could not create product")
+
+    invalidate_product(categories=[category], vendor_id=user.id)
+    product_search.upsert(response.data[0])
     return response.data[0]
 
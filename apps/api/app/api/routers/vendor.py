@@ -3,7 +3,7 @@ from typing import List
 from app.api.vendor_deps import require_vendor_role
 from app.api.deps import get_current_user
 from app.core.security import get_supabase
-from app.schemas.product import Product
+from app.schemas.product import Product, PRODUCT_COLUMNS
 from typing import Any
 User = Any
 
@@ -16,6 +16,6 @@ def list_vendor_products(user: User = Depends(require_vendor_role)):
     """
     supabase = get_supabase()
     # Enforce filtering by vendor_id = user.id
-    response = supabase.table("products").select("*").eq("vendor_id", user.id).execute()
+    response = supabase.table("products").select(PRODUCT_COLUMNS).eq("vendor_id", user.id).execute()
     
     return response.data
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_POOL_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_POOL_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_POOL_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_POOL_BACKOFF_BASE", "0.05"))
+
+# Safe to replay after the request may have reached the server
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {502, 503, 504}
+# Failures raised before the request left the process: always safe to retry
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class AsyncHTTPPool:
+    """
+    Shared, lifespan-owned httpx.AsyncClient for PostgREST calls.
+    One keep-alive pool (HTTP/2 when available) replaces the throwaway
+    `async with httpx.AsyncClient()` per write, with retry + per-endpoint latency.
+    """
+    def __init__(self, max_retries: int = HTTP_MAX_RETRIES, backoff_base: float = HTTP_BACKOFF_BASE):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._client: Optional[httpx.AsyncClient] = None
+        self._endpoints: Dict[str, Dict[str, float]] = {}
+
+    # --- Lifecycle ---
+
+    async def startup(self):
+        self._get_client()
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- Requests ---
+
+    async def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Sends a request on the shared pool.
+        Retries transport errors and 502/503/504 with exponential backoff + jitter.
+        Non-idempotent methods (POST/PATCH) are only retried on connect-phase failures,
+        unless the caller marks them `idempotent=True` (e.g. upserts).
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+
+        endpoint = f"{method} {urlsplit(url).path}"
+        client = self._get_client()
+        attempt = 0
+
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self._record(endpoint, start, error=True)
+                retryable = isinstance(e, CONNECT_ERRORS) or idempotent
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            else:
+                failed = response.status_code in RETRY_STATUS_CODES
+                self._record(endpoint, start, error=response.status_code >= 500)
+                if not failed or not idempotent or attempt >= self.max_retries:
+                    return response
+
+            attempt += 1
+            self._endpoints[endpoint]["retries"] += 1
+            await asyncio.sleep(self.backoff_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    # --- Metrics ---
+
+    def metrics(self) -> Dict[str, Any]:
+        endpoints = {}
+        for name, stats in self._endpoints.items():
+            calls = stats["calls"]
+            endpoints[name] = {
+                "calls": int(calls),
+                "errors": int(stats["errors"]),
+                "retries": int(stats["retries"]),
+                "avg_ms": round(stats["total_ms"] / calls, 2) if calls else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+            }
+        return {
+            "pool_open": self._client is not None,
+            "http2": HTTP2_AVAILABLE,
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "endpoints": endpoints,
+        }
+
+    # --- Internals ---
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    def _record(self, endpoint: str, start: float, error: bool = False):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stats = self._endpoints.setdefault(
+            endpoint, {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if error:
+            stats["errors"] += 1
+
+
+http_pool = AsyncHTTPPool()
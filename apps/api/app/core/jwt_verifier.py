@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import jwt
+
+from app.schemas.user import AuthenticatedUser
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET") or os.getenv("JWT_SECRET")
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_CACHE_SECONDS = int(os.getenv("SUPABASE_JWKS_CACHE_SECONDS", "600"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens without a round trip to the Auth API.
+    - HS256 tokens: checked against the project JWT secret.
+    - RS256/ES256 tokens: checked against the project JWKS (keys cached by PyJWKClient).
+    Resolved principals are kept in a bounded TTL cache keyed by sha256(token),
+    never past the token's own `exp`.
+    """
+    def __init__(
+        self,
+        secret: Optional[str],
+        jwks_url: Optional[str],
+        audience: str = JWT_AUDIENCE,
+        ttl: float = AUTH_CACHE_TTL,
+        maxsize: int = AUTH_CACHE_SIZE,
+    ):
+        self.secret = secret
+        self.audience = audience
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._jwks = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=JWKS_CACHE_SECONDS) if jwks_url else None
+        self._cache: "OrderedDict[str, tuple[float, AuthenticatedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "local": 0, "remote": 0}
+
+    # --- Cache ---
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def cached(self, token: str) -> Optional[AuthenticatedUser]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._cache[key]
+                self.stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return user
+
+    def remember(self, token: str, user: AuthenticatedUser, exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._cache[self._key(token)] = (expires_at, user)
+            self._cache.move_to_end(self._key(token))
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def forget(self, token: str):
+        with self._lock:
+            self._cache.pop(self._key(token), None)
+
+    # --- Verification ---
+
+    def verify_local(self, token: str) -> Optional[AuthenticatedUser]:
+        """
+        Returns the verified principal, or None when no key material is available
+        for this token (caller should fall back to remote validation).
+        Raises jwt.InvalidTokenError for bad signatures, expiry or audience.
+        """
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+
+        if alg == "HS256":
+            if not self.secret:
+                return None
+            key = self.secret
+            algorithms = ["HS256"]
+        elif alg in ASYMMETRIC_ALGORITHMS:
+            if self._jwks is None:
+                return None
+            try:
+                key = self._jwks.get_signing_key_from_jwt(token).key
+            except jwt.PyJWKClientError:
+                return None
+            algorithms = ASYMMETRIC_ALGORITHMS
+        else:
+            raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {alg}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+        user = self.user_from_claims(claims)
+        self.stats["local"] += 1
+        self.remember(token, user, exp=claims.get("exp"))
+        return user
+
+    @staticmethod
+    def user_from_claims(claims: Dict[str, Any]) -> AuthenticatedUser:
+        return AuthenticatedUser(
+            id=claims["sub"],
+            email=claims.get("email"),
+            role=claims.get("role"),
+            aud=claims.get("aud") if isinstance(claims.get("aud"), str) else None,
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+        )
+
+    @staticmethod
+    def user_from_supabase(user: Any) -> AuthenticatedUser:
+        return AuthenticatedUser(
+            id=str(user.id),
+            email=getattr(user, "email", None),
+            role=getattr(user, "role", None),
+            aud=getattr(user, "aud", None),
+            app_metadata=getattr(user, "app_metadata", None) or {},
+            user_metadata=getattr(user, "user_metadata", None) or {},
+        )
+
+    @staticmethod
+    def unverified_exp(token: str) -> Optional[float]:
+        try:
+            return jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.InvalidTokenError:
+            return None
+
+
+token_verifier = TokenVerifier(
+    secret=SUPABASE_JWT_SECRET,
+    jwks_url=f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None,
+)
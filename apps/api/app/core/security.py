@@ -1,8 +1,12 @@
 from fastapi import Security, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import Client, create_client
+from supabase import Client
 import os
 from typing import Annotated
+from app.core.supabase_pool import supabase_registry
+from app.core.jwt_verifier import token_verifier
+from app.schemas.user import AuthenticatedUser
+import jwt
 
 # Placeholder env load - ideally use a proper config loader
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -11,29 +15,61 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 security = HTTPBearer()
 
 def get_supabase() -> Client:
+    """
+    Returns the process-wide Supabase client (shared keep-alive pool).
+    """
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise HTTPException(status_code=500, detail="Supabase credentials not configured")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    return supabase_registry.client("default")
 
-def get_current_user(credentials: Annotated[HTTPAuthorizationCredentials, Security(security)]):
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _validate_remote(token: str) -> AuthenticatedUser:
     """
-    Validates the Bearer token using Supabase Auth.
+    Round trip to Supabase Auth. Catches revoked sessions / deleted users
+    that a still-unexpired JWT cannot reveal.
     """
-    token = credentials.credentials
     supabase = get_supabase()
-    
     try:
         user = supabase.auth.get_user(token)
-        if not user or not user.user:
-             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user.user
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Could not validate credentials: {str(e)}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized(f"Could not validate credentials: {str(e)}")
+    if not user or not user.user:
+        raise _unauthorized("Invalid authentication credentials")
+
+    principal = token_verifier.user_from_supabase(user.user)
+    token_verifier.stats["remote"] += 1
+    token_verifier.remember(token, principal, exp=token_verifier.unverified_exp(token))
+    return principal
+
+def get_current_user(credentials: Annotated[HTTPAuthorizationCredentials, Security(security)]) -> AuthenticatedUser:
+    """
+    Validates the Bearer token.
+    Verified locally (JWT secret / cached JWKS) with a short TTL cache;
+    falls back to Supabase Auth only when no key material is configured.
+    """
+    token = credentials.credentials
+
+    cached = token_verifier.cached(token)
+    if cached is not None:
+        return cached
+
+    try:
+        user = token_verifier.verify_local(token)
+    except jwt.InvalidTokenError as e:
+        raise _unauthorized(f"Could not validate credentials: {str(e)}")
+
+    if user is not None:
+        return user
+    return _validate_remote(token)
+
+def get_current_user_remote(credentials: Annotated[HTTPAuthorizationCredentials, Security(security)]) -> AuthenticatedUser:
+    """
+    Opt-in for revocation-sensitive routes: always re-checks the session with Supabase Auth.
+    """
+    return _validate_remote(credentials.credentials)
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+from supabase import Client, ClientOptions
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+
+# Role -> API key. "default" preserves the historical SUPABASE_KEY client used by get_supabase().
+ROLE_KEYS = {
+    "default": os.getenv("SUPABASE_KEY"),
+    "anon": os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY"),
+    "service": os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY"),
+}
+
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "50"))
+POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+POOL_TIMEOUT = float(os.getenv("SUPABASE_POOL_TIMEOUT", "10"))
+USER_CLIENT_CACHE_SIZE = int(os.getenv("SUPABASE_USER_CLIENT_CACHE_SIZE", "256"))
+
+
+class SupabaseClientRegistry:
+    """
+    Process-wide registry of Supabase clients.
+    Every client (anon, service, user-scoped) shares one keep-alive httpx pool,
+    so handlers stop paying a TLS handshake + auth setup per request.
+    """
+    def __init__(self, url: Optional[str], role_keys: Dict[str, Optional[str]]):
+        self.url = url
+        self.role_keys = role_keys
+        self._http: Optional[httpx.Client] = None
+        self._clients: Dict[str, Client] = {}
+        self._user_clients: "OrderedDict[str, Client]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "clients_built": 0,
+            "user_client_hits": 0,
+            "user_client_misses": 0,
+        }
+
+    # --- Lifecycle ---
+
+    def startup(self):
+        """Eagerly opens the pool. Safe to skip: clients are also built lazily."""
+        if self.url:
+            self._get_http()
+
+    def shutdown(self):
+        with self._lock:
+            self._clients.clear()
+            self._user_clients.clear()
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+
+    # --- Clients ---
+
+    def client(self, role: str = "default") -> Client:
+        """Returns the shared client for a key role ('default', 'anon', 'service')."""
+        key = self.role_keys.get(role)
+        if not self.url or not key:
+            raise RuntimeError(f"Supabase credentials not configured for role '{role}'")
+
+        client = self._clients.get(role)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(role)
+            if client is None:
+                client = self._build(key)
+                self._clients[role] = client
+        return client
+
+    def anon(self) -> Client:
+        return self.client("anon")
+
+    def service(self) -> Client:
+        return self.client("service")
+
+    def for_user(self, access_token: str) -> Client:
+        """
+        Returns a client acting as the end user (RLS applies).
+        Cached per token in a bounded LRU; still rides the shared pool.
+        """
+        key = self.role_keys.get("anon")
+        if not self.url or not key:
+            raise RuntimeError("Supabase credentials not configured for role 'anon'")
+
+        token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+        with self._lock:
+            client = self._user_clients.get(token_hash)
+            if client is not None:
+                self._user_clients.move_to_end(token_hash)
+                self._stats["user_client_hits"] += 1
+                return client
+            self._stats["user_client_misses"] += 1
+
+        client = self._build(key, access_token=access_token)
+
+        with self._lock:
+            self._user_clients[token_hash] = client
+            while len(self._user_clients) > USER_CLIENT_CACHE_SIZE:
+                self._user_clients.popitem(last=False)
+        return client
+
+    # --- Metrics ---
+
+    def metrics(self) -> Dict[str, Any]:
+        pool_connections = None
+        transport = getattr(self._http, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        if pool is not None:
+            pool_connections = len(getattr(pool, "connections", []))
+
+        return {
+            **self._stats,
+            "pool_open": self._http is not None,
+            "pool_connections": pool_connections,
+            "pool_max_connections": POOL_MAX_CONNECTIONS,
+            "pool_max_keepalive": POOL_MAX_KEEPALIVE,
+            "role_clients": sorted(self._clients.keys()),
+            "user_clients_cached": len(self._user_clients),
+        }
+
+    # --- Internals ---
+
+    def _get_http(self) -> httpx.Client:
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    self._http = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=POOL_MAX_CONNECTIONS,
+                            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                        ),
+                        timeout=POOL_TIMEOUT,
+                        follow_redirects=True,
+                        event_hooks={
+                            "request": [self._on_request],
+                            "response": [self._on_response],
+                        },
+                    )
+        return self._http
+
+    def _build(self, key: str, access_token: Optional[str] = None) -> Client:
+        options = ClientOptions(
+            httpx_client=self._get_http(),
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+        if access_token:
+            options.headers["Authorization"] = f"Bearer {access_token}"
+
+        client = Client(self.url, key, options)
+        self._stats["clients_built"] += 1
+        return client
+
+    def _on_request(self, request: httpx.Request):
+        self._stats["requests"] += 1
+
+    def _on_response(self, response: httpx.Response):
+        if response.status_code >= 500:
+            self._stats["errors"] += 1
+
+
+supabase_registry = SupabaseClientRegistry(SUPABASE_URL, ROLE_KEYS)
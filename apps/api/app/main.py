@@ -1,16 +1,49 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.supabase_pool import supabase_registry
+from app.core.http_pool import http_pool
+from app.core.jwt_verifier import token_verifier
+from app.services.catalog_cache import catalog_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.vector_index import product_vector_index
+from app.services.prompt_cache import prompt_cache
+from app.services.stream_metrics import stream_metrics
+from app.services.product_search import product_search
+from app.services.signal_buffer import signal_buffer
+from app.services.dna_generator import dna_engine
+from app.services.crdt_service import crdt_service
+from app.services.spanner_ledger import spanner_service
+from app.services.consistency_service import ConsistencyLevel, consistency_service
 # from app.api.v1.endpoints import products, vendors, auth, students
 # Note: In a real migration, we would move existing routers to app/api/v1/endpoints/
 # For now, we assume these modules are being created or we import from existing locations and re-alias
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Process-wide clients: opened once, closed on shutdown
+    supabase_registry.startup()
+    await http_pool.startup()
+    await signal_buffer.start()
+    await dna_engine.start()
+    yield
+    # Drain buffered signals and pending DNA folds while the HTTP pool is still open
+    await signal_buffer.stop()
+    await dna_engine.stop()
+    crdt_service.close()
+    # Let straggler review writes, read repairs and hint handoffs land
+    await consistency_service.drain()
+    await http_pool.shutdown()
+    supabase_registry.shutdown()
+
 app = FastAPI(
     title="Amazon-Alpha API", 
     version="1.0.0",
-    description="High-Performance E-Commerce API with Multi-Vendor & Student Discount Logic"
+    description="High-Performance E-Commerce API with Multi-Vendor & Student Discount Logic",
+    lifespan=lifespan
 )
 
 # CORS Setup
@@ -25,6 +58,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.get("/")
@@ -35,6 +69,25 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/pools")
+def pool_metrics():
+    return {
+        "supabase": supabase_registry.metrics(),
+        "postgrest_http": http_pool.metrics(),
+        "auth_cache": token_verifier.stats,
+        "catalog_cache": catalog_cache.stats,
+        "embedding_cache": embedding_cache.metrics(),
+        "vector_index": product_vector_index.metrics(),
+        "gemini_prompt_cache": prompt_cache.metrics(),
+        "ai_streams": stream_metrics.metrics(),
+        "product_search": product_search.metrics(),
+        "signal_buffer": signal_buffer.metrics(),
+        "dna_engine": dna_engine.metrics(),
+        "crdt_inventory": crdt_service.metrics(),
+        "flash_sale_ledger": spanner_service.metrics(),
+        "review_quorum": consistency_service.metrics()
+    }
+
 # --- V1 API Router Registration ---
 # Assuming we will move routers here gradually. 
 # For meeting the prompt's request, I will stub/import the structure.
@@ -132,6 +185,10 @@ app.include_router(workflow.router, prefix="/api/v1/workflow", tags=["Durable As
 from app.routers import spatial_search
 app.include_router(spatial_search.router, prefix="/api/v1/spatial-search", tags=["Spatial Intelligence"])
 
+# Recommendations (Vector Similarity)
+from app.routers import recommendations
+app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["AI Engine"])
+
 # Global CDN & Cache
 from app.middleware.telemetry import TelemetryMiddleware
 from app.middleware.entra_auth import EntraAuthMiddleware
@@ -139,12 +196,15 @@ from app.middleware.entra_auth import EntraAuthMiddleware
 app.add_middleware(TelemetryMiddleware)
 app.add_middleware(EntraAuthMiddleware)
 
-from app.services.consistency_service import consistency_service
 from app.services.prefetch_service import prefetch_service
 
 @app.post("/api/v1/reviews/global")
-async def write_global_review(product_id: str, review: dict):
-    return await consistency_service.write_review(product_id, review)
+async def write_global_review(product_id: str, review: dict, consistency_level: ConsistencyLevel = "QUORUM"):
+    return await consistency_service.write_review(product_id, review, consistency_level)
+
+@app.get("/api/v1/reviews/global")
+async def read_global_review(product_id: str, consistency_level: ConsistencyLevel = "QUORUM"):
+    return await consistency_service.read_review(product_id, consistency_level)
 
 @app.get("/api/v1/cdn/prefetch")
 async def trigger_prefetch(user_id: str, category: str):
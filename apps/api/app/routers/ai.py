@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from supabase import create_client
+import asyncio
+import json
 import os
+import time
 from app.services.gemini import GeminiService
+from app.services.stream_metrics import stream_metrics
+from app.services.product_search import product_search
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
 router = APIRouter()
 
@@ -17,6 +23,8 @@ if not url or not key:
 else:
     supabase = create_client(url, key)
 
+ASK_TOP_K = 5
+
 class ProductSimple(BaseModel):
     id: str
     name: str
@@ -60,35 +68,52 @@ async def process_ingestion():
     # Stub for ingestion logic
     print("Ingestion Stub")
 
+# Offline demo fallback while the catalog index is empty (no database configured)
+MOCK_PRODUCTS = [
+    {"id": "prod_1", "name": "Sony WH-1000XM5 Wireless Noise Canceling Headphones", "price": 348.00, "image": "https://images.unsplash.com/photo-1618366712010-f4ae9c647dcb", "category": "Electronics"},
+    {"id": "prod_2", "name": "MacBook Pro 14-inch M3 Pro", "price": 1999.00, "image": "https://images.unsplash.com/photo-1592919933511-ea9d487c85e4", "category": "Electronics"},
+    {"id": "prod_3", "name": "Herman Miller Aeron Chair", "price": 1250.00, "image": "https://images.unsplash.com/photo-1505843490538-5133c6c7d0e1", "category": "Home"},
+]
+
+def _mock_matches(query: str) -> List[dict]:
+    lower_q = query.lower()
+    return [
+        p for p in MOCK_PRODUCTS
+        if p["name"].lower() in lower_q or p["category"].lower() in lower_q or ("headphone" in lower_q and "Electronics" in p["category"])
+    ][:2]
+
+def _as_simple(doc: dict) -> dict:
+    return {
+        "id": doc["id"],
+        "name": doc.get("title") or "",
+        "price": float(doc.get("price") or 0),
+        "image": (doc.get("images") or [""])[0],
+        "category": doc.get("category") or "",
+    }
+
+async def _ask_context(query: str) -> Tuple[str, List[str], List[dict]]:
+    """Hybrid retrieval (BM25 + vectors + knowledge passages), top-k fed into the prompt."""
+    result = await product_search.retrieve(query, k=ASK_TOP_K)
+    recommended_products = [_as_simple(doc) for doc in result.products] if product_search.docs else _mock_matches(query)
+    sources = [str((row.get("metadata") or {}).get("source") or row["id"]) for row in result.knowledge]
+
+    context_text = "\n\n".join(row["content"] for row in result.knowledge)
+    if recommended_products:
+        lines = [f"- {p['name']} ({p['category']}, ${p['price']:.2f})" for p in recommended_products]
+        context_text += "\nFound products:\n" + "\n".join(lines)
+
+    return context_text, sources, recommended_products
+
 @router.post("/ask", response_model=SearchResponse)
 async def ask_ai(payload: SearchRequest):
     """
     Original Semantic Search Endpoint
     """
     query = payload.query
-    context_text = ""
-    sources = []
-    recommended_products = []
-
-    # Mock Products for fallback
-    mock_products = [
-        {"id": "prod_1", "name": "Sony WH-1000XM5 Wireless Noise Canceling Headphones", "price": 348.00, "image": "https://images.unsplash.com/photo-1618366712010-f4ae9c647dcb", "category": "Electronics"},
-        {"id": "prod_2", "name": "MacBook Pro 14-inch M3 Pro", "price": 1999.00, "image": "https://images.unsplash.com/photo-1592919933511-ea9d487c85e4", "category": "Electronics"},
-        {"id": "prod_3", "name": "Herman Miller Aeron Chair", "price": 1250.00, "image": "https://images.unsplash.com/photo-1505843490538-5133c6c7d0e1", "category": "Home"},
-    ]
-    
-    # Simple Keyword Match
-    lower_q = query.lower()
-    for p in mock_products:
-        if p["name"].lower() in lower_q or p["category"].lower() in lower_q or ("headphone" in lower_q and "Electronics" in p["category"]):
-             if len(recommended_products) < 2:
-                recommended_products.append(p)
+    context_text, sources, recommended_products = await _ask_context(query)
     
     # AI Answer Generation
     try:
-        if recommended_products:
-             context_text += f"\nFound products: {', '.join([p['name'] for p in recommended_products])}"
-
         answer = await GeminiService.generate_chat_response(query, context_text)
         
         if "Offline Mode" in answer and recommended_products:
@@ -112,6 +137,70 @@ async def chat_with_assistant(request: VoiceChatRequest):
     response_text = await GeminiService.generate_chat_response(request.message, request.context)
     return {"response": response_text}
 
+# --- Streaming (Server-Sent Events) ---
+# Events: optional `products` preamble, then `data: {"delta": "..."}` per chunk,
+# then `event: done` with the request's TTFT. Jarvis voice mode can start speaking
+# on the first delta instead of waiting for the whole generation.
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _stream_answer(request: Request, endpoint: str, tokens: AsyncIterator[str], preamble: Optional[dict] = None) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    ttft_ms = None
+    cancelled = False
+    try:
+        if preamble is not None:
+            yield _sse(preamble, "products")
+        async for token in tokens:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            yield _sse({"delta": token})
+            if await request.is_disconnected():
+                cancelled = True
+                break
+        if not cancelled:
+            total_ms = (time.perf_counter() - started) * 1000
+            yield _sse({"ttft_ms": round(ttft_ms or total_ms, 1), "total_ms": round(total_ms, 1)}, "done")
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        # Stops pulling from Gemini as soon as the client is gone
+        await tokens.aclose()
+        total_ms = (time.perf_counter() - started) * 1000
+        stream_metrics.record(endpoint, ttft_ms if ttft_ms is not None else total_ms, total_ms, cancelled)
+
+@router.post("/chat/stream")
+async def chat_with_assistant_stream(payload: VoiceChatRequest, request: Request):
+    if not payload.message:
+        raise HTTPException(status_code=400, detail="Message is required")
+
+    tokens = GeminiService.stream_chat_response(payload.message, payload.context)
+    return StreamingResponse(_stream_answer(request, "chat", tokens), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/ask/stream")
+async def ask_ai_stream(payload: SearchRequest, request: Request):
+    query = payload.query
+    context_text, sources, recommended_products = await _ask_context(query)
+
+    async def tokens() -> AsyncIterator[str]:
+        stream = GeminiService.stream_chat_response(query, context_text)
+        try:
+            async for token in stream:
+                if "Offline Mode" in token and recommended_products:
+                    token = f"I found some great products for you based on '{query}'."
+                yield token
+        finally:
+            await stream.aclose()
+
+    # Product cards are known before generation starts: ship them first
+    preamble = {"sources": sources, "recommended_products": recommended_products}
+    return StreamingResponse(_stream_answer(request, "ask", tokens(), preamble), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.post("/generate_desc", response_model=GenerateResponse)
 async def generate_product_description(request: GenerateRequest):
     if not request.title:
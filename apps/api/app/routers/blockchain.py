@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from pydantic import BaseModel
 from app.services.blockchain_service import blockchain_service
-import httpx
+from app.core.http_pool import http_pool
 import os
 from datetime import datetime
 
@@ -34,15 +34,14 @@ class BlockchainRouter:
             "status": "minted"
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                await client.post(
-                    f"{SUPABASE_URL}/rest/v1/nft_registry",
-                    headers=HEADERS,
-                    json=payload
-                )
-            except Exception as e:
-                print(f"Registry Update Failed: {e}")
+        try:
+            await http_pool.post(
+                f"{SUPABASE_URL}/rest/v1/nft_registry",
+                headers=HEADERS,
+                json=payload
+            )
+        except Exception as e:
+            print(f"Registry Update Failed: {e}")
 
 @router.post("/mint")
 async def mint_nft(req: MintRequest, background_tasks: BackgroundTasks):
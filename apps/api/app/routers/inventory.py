@@ -1,15 +1,38 @@
-from fastapi import APIRouter
-from app.services.spanner_ledger import spanner_service
+from fastapi import APIRouter, HTTPException, Query
+from app.services.spanner_ledger import spanner_service, RESERVATION_TTL, RESERVATION_MAX_TTL
 
 router = APIRouter()
 
 @router.post("/flash-sale/buy")
-async def buy_flash_item(sku: str = "SKU-EXCLUSIVE-B", quantity: int = 1):
+async def buy_flash_item(sku: str = "SKU-EXCLUSIVE-B", quantity: int = Query(1, ge=1)):
     """
     High-Concurrency endpoint using Spanner OCC.
     """
     return await spanner_service.execute_flash_sale_order(sku, quantity)
 
+@router.post("/flash-sale/reserve")
+async def reserve_flash_item(
+    sku: str = "SKU-EXCLUSIVE-B",
+    quantity: int = Query(1, ge=1),
+    ttl_seconds: float = Query(RESERVATION_TTL, gt=0, le=RESERVATION_MAX_TTL, allow_inf_nan=False),
+):
+    """
+    Holds stock for a checkout; confirm it before `ttl_seconds` or it returns to the pool.
+    async like every ledger route: ledger state is only ever touched on the event loop.
+    """
+    try:
+        return spanner_service.reserve(sku, quantity, ttl_seconds)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"SKU {sku} not found")
+
+@router.post("/flash-sale/reservations/{token}/confirm")
+async def confirm_flash_reservation(token: str):
+    return await spanner_service.confirm_reservation(token)
+
+@router.delete("/flash-sale/reservations/{token}")
+async def release_flash_reservation(token: str):
+    return spanner_service.release_reservation(token)
+
 @router.get("/{sku}")
-def get_inventory(sku: str):
-    return {"sku": sku, "stock": spanner_service.get_stock(sku)}
+async def get_inventory(sku: str):
+    return {"sku": sku, "stock": spanner_service.get_stock(sku), "reserved": spanner_service.get_reserved(sku)}
@@ -1,81 +1,85 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Body
-from supabase import create_client, Client
-import os
-from app.services.gemini import GeminiService
+from app.core.supabase_pool import supabase_registry
+from app.services.embedding_backfill import embedding_backfill
+from app.services.vector_index import product_vector_index, parse_vector, normalize_rows, recency_weighted_centroid
+from app.schemas.product import PRODUCT_COLUMNS
 from pydantic import BaseModel
-from typing import List
+from typing import List, Tuple
+import numpy as np
 
 router = APIRouter()
 
-# Initialize Supabase
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_SERVICE_KEY")
-supabase: Client = create_client(url, key)
-
 class ProductIDs(BaseModel):
     product_ids: List[str]
 
 @router.post("/generate-embeddings")
-async def generate_embeddings_background(background_tasks: BackgroundTasks):
+async def generate_embeddings_background(background_tasks: BackgroundTasks, resume: bool = True):
     """
-    Background Task: Fetches products without embeddings and generates them using Gemini.
+    Background Task: Backfills embeddings for every product missing one (batched, checkpointed).
+    Pass resume=false to rescan from the start instead of continuing after the last checkpoint.
     """
-    background_tasks.add_task(process_embeddings)
-    return {"status": "started", "message": "Embedding generation started in background"}
+    if embedding_backfill.running:
+        return {"status": "running", "message": "Embedding backfill already in progress", **embedding_backfill.status()}
+    background_tasks.add_task(embedding_backfill.run, resume)
+    return {"status": "started", "message": "Embedding backfill started in background"}
+
+@router.get("/generate-embeddings/status")
+async def embedding_backfill_status():
+    return embedding_backfill.status()
 
-async def process_embeddings():
-    # 1. Fetch products missing embeddings
-    # Note: 'is' null check might vary in Supabase py client, using filter logic
-    response = supabase.table("products").select("id, name, description").is_("embedding", "null").limit(10).execute()
-    products = response.data
-    
-    if not products:
-        print("No products need embeddings.")
-        return
+RECOMMEND_COUNT = 5
+MATCH_THRESHOLD = 0.5
 
-    for product in products:
-        text_to_embed = f"{product['name']}: {product['description']}"
-        embedding = GeminiService.generate_embedding(text_to_embed)
-        
-        # 2. Update Product
-        supabase.table("products").update({"embedding": embedding}).eq("id", product['id']).execute()
-        print(f"Updated embedding for {product['name']}")
+def _hydrate(supabase, matches: List[Tuple[str, float]]) -> List[dict]:
+    """One projected fetch for the matched ids, returned in similarity order."""
+    if not matches:
+        return []
+    rows = supabase.table("products").select(PRODUCT_COLUMNS).in_("id", [pid for pid, _ in matches]).execute().data
+    by_id = {row["id"]: row for row in rows}
+    return [{**by_id[pid], "similarity": score} for pid, score in matches if pid in by_id]
 
 @router.post("/recommend")
 async def get_recommendations(payload: ProductIDs):
     """
-    Returns recommended products based on the viewed history (product_ids).
+    Returns recommended products based on the viewed history (product_ids, most recent first).
+    1. In-process index: recency-weighted centroid + exact/IVF search over the float32 matrix.
+    2. Fallback while the index loads (or misses the history): pgvector `match_products` RPC.
+    3. Last resort: a plain product page.
     """
     if not payload.product_ids:
         return []
 
+    supabase = supabase_registry.service()
+    product_vector_index.ensure_fresh()
+    matches = product_vector_index.recommend(payload.product_ids, RECOMMEND_COUNT)
+    if matches is not None:
+        return _hydrate(supabase, matches)
+
     try:
         # 1. Fetch embeddings of viewed products
-        response = supabase.table("products").select("embedding").in_("id", payload.product_ids).execute()
-        embeddings = [item['embedding'] for item in response.data if item.get('embedding')]
-        
+        response = supabase.table("products").select("id, embedding").in_("id", payload.product_ids).execute()
+        by_id = {item["id"]: parse_vector(item["embedding"]) for item in response.data if item.get("embedding")}
+        embeddings = [by_id[pid] for pid in payload.product_ids if pid in by_id]
+
         if not embeddings:
             return []
 
-        # 2. Calculate average vector (Centroid)
-        # Zip them together to sum each dimension, then divide by count
-        avg_vector = [sum(col) / len(col) for col in zip(*embeddings)]
+        # 2. Recency-weighted centroid (history is most recent first)
+        centroid = recency_weighted_centroid(normalize_rows(np.stack(embeddings)))
 
-        # 3. RPC Call for Similarity Search
-        # We assume a postgres function `match_products` exists or we simulate
-        # For this prototype, if RPC isn't set up, we might not get results.
-        # Let's try calling a standard RPC "match_products"
-        
+        # 3. HNSW-backed similarity search; over-fetch so viewed products can be dropped
         rpc_response = supabase.rpc("match_products", {
-            "query_embedding": avg_vector,
-            "match_threshold": 0.5,
-            "match_count": 5
+            "query_embedding": centroid.tolist(),
+            "match_threshold": MATCH_THRESHOLD,
+            "match_count": RECOMMEND_COUNT + len(payload.product_ids)
         }).execute()
-        
-        return rpc_response.data
+
+        viewed = set(payload.product_ids)
+        matches = [(row["id"], row["similarity"]) for row in rpc_response.data if row["id"] not in viewed]
+        return _hydrate(supabase, matches[:RECOMMEND_COUNT])
 
     except Exception as e:
         print(f"Rec Error: {e}")
         # Fallback: Return random or popular products
-        fallback = supabase.table("products").select("*").limit(5).execute()
+        fallback = supabase.table("products").select(PRODUCT_COLUMNS).limit(RECOMMEND_COUNT).execute()
         return fallback.data
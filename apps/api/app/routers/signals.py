@@ -1,41 +1,30 @@
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from pydantic import BaseModel
-import httpx
-import os
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
 from datetime import datetime
+from app.services.signal_buffer import signal_buffer
+from app.services.dna_generator import dna_engine
 
 # In a real app, we'd import this from a shared deps module
 # from app.api.deps import get_current_user
 
 router = APIRouter()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-
-HEADERS = {
-    "apikey": SUPABASE_KEY or "",
-    "Authorization": f"Bearer {SUPABASE_KEY or ''}",
-    "Content-Type": "application/json",
-    "Prefer": "return=representation"
-}
-
 class BrowsingSignal(BaseModel):
     product_id: Optional[str] = None
     event_type: str # 'view', 'scroll', 'click'
     metadata: Dict[str, Any] = {}
 
+class SignalBatch(BaseModel):
+    signals: List[BrowsingSignal] = Field(..., min_length=1, max_length=500)
+
+# Returned when the ingestion buffer is full (DB can't keep up): clients should back off
+BACKPRESSURE = {"status_code": 429, "detail": "Signal buffer full, retry later", "headers": {"Retry-After": "1"}}
+
 class SignalIngestionService:
     @staticmethod
-    async def log_signal(user_id: str, signal: BrowsingSignal):
-        """
-        Async log signal to Supabase.
-        """
-        if not SUPABASE_URL:
-            print("Skipping signal log (No DB URL)")
-            return
-
-        payload = {
+    def to_row(user_id: str, signal: BrowsingSignal) -> Dict[str, Any]:
+        return {
             "user_id": user_id,
             "product_id": signal.product_id,
             "event_type": signal.event_type,
@@ -43,40 +32,53 @@ class SignalIngestionService:
             "created_at": datetime.utcnow().isoformat()
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                # We use the Service Role key here to ensure we can write even if RLS is strict,
-                # though ideally we flow the user's JWT. For ingestion service, service role is often safer for reliability.
-                await client.post(
-                    f"{SUPABASE_URL}/rest/v1/browsing_signals",
-                    headers=HEADERS,
-                    json=payload
-                )
-            except Exception as e:
-                print(f"Failed to log signal: {e}")
+    @staticmethod
+    def log_signal(user_id: str, signal: BrowsingSignal) -> bool:
+        """
+        Enqueues the signal; the buffer bulk-inserts into Supabase in the background.
+        Returns False when the buffer is full.
+        """
+        row = SignalIngestionService.to_row(user_id, signal)
+        if not signal_buffer.offer(row):
+            return False
+        SignalIngestionService.trigger_dna_update(user_id, row)
+        return True
 
     @staticmethod
-    async def trigger_dna_update(user_id: str):
+    def trigger_dna_update(user_id: str, row: Dict[str, Any]):
         """
-        Placeholder for DNA Generator trigger.
-        In a real system, this might run only after every 10th signal or via Cron.
+        Feeds the incremental DNA engine: it folds every Nth signal per user (debounced)
+        and batch-upserts user_dna, so no per-event recompute happens here.
         """
-        pass
+        dna_engine.observe(user_id, row)
 
 @router.post("/signals")
 async def capture_signal(
     signal: BrowsingSignal,
-    background_tasks: BackgroundTasks,
     # current_user: dict = Depends(get_current_user) # Uncomment in real app
 ):
     # Mock User ID for now since we don't have the full auth context in this snippet
     user_id = "mock-user-id" 
     # if current_user: user_id = current_user.get("id")
 
-    # Fire and forget
-    background_tasks.add_task(SignalIngestionService.log_signal, user_id, signal)
-    
-    # Optionally trigger DNA update check
-    background_tasks.add_task(SignalIngestionService.trigger_dna_update, user_id)
+    # Buffered: no DB round trip on the request path (DNA update is folded in incrementally)
+    if not SignalIngestionService.log_signal(user_id, signal):
+        raise HTTPException(**BACKPRESSURE)
 
     return {"status": "captured"}
+
+@router.post("/signals/batch")
+async def capture_signals(batch: SignalBatch):
+    """
+    Client-side batching (scroll/view bursts): many signals per request.
+    """
+    user_id = "mock-user-id"
+
+    rows = [SignalIngestionService.to_row(user_id, s) for s in batch.signals]
+    accepted = signal_buffer.offer_many(rows)
+    if accepted == 0:
+        raise HTTPException(**BACKPRESSURE)
+
+    for row in rows[:accepted]:
+        SignalIngestionService.trigger_dna_update(user_id, row)
+    return {"status": "captured", "accepted": accepted, "dropped": len(batch.signals) - accepted}
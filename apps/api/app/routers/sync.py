@@ -1,11 +1,76 @@
-from fastapi import APIRouter
-from app.services.crdt_service import crdt_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+from app.api.admin_deps import require_admin_role
+from app.services.crdt_service import crdt_service, MAX_SYNC_SKUS
 
 router = APIRouter()
 
+class SkuDelta(BaseModel):
+    p: Dict[str, int] = {}      # changed increment entries (node -> count)
+    n: Dict[str, int] = {}      # changed decrement entries
+    since: Dict[str, int] = {}  # version vector from the previous reply for this SKU
+
+class DeltaSyncRequest(BaseModel):
+    node_id: str
+    timestamp: Dict[str, Any]
+    skus: Dict[str, SkuDelta] = Field(..., max_length=MAX_SYNC_SKUS)
+    epoch: int = 0  # last compaction epoch applied by the client (0 = new device)
+
+def _converged(reply: Dict[str, Any]) -> Dict[str, Any]:
+    if reply["status"] == "RESET_REQUIRED":
+        # Retired device: its entries were folded into the base. Re-register under a new node_id
+        # and re-submit whatever the local entries hold beyond `folded` (offline, unsynced changes);
+        # with `folded` null the record has expired and the local entries can only be dropped.
+        message = (
+            "Device retired; re-submit local changes beyond `folded` under a new node_id"
+            if reply["folded"] is not None
+            else "Device retired; drop local entries and re-register under a new node_id"
+        )
+        raise HTTPException(status_code=409, detail={"message": message, "folded": reply["folded"]})
+    return reply
+
 @router.post("/inventory/sync")
-async def sync_inventory(node_id: str, p_deltas: dict, n_deltas: dict, timestamp: dict):
+async def sync_inventory(node_id: str, p_deltas: dict, n_deltas: dict, timestamp: dict, epoch: int = 0):
     """
     Receives CRDT Deltas from client and merges them.
     """
-    return crdt_service.handle_sync(node_id, p_deltas, n_deltas, timestamp)
+    return _converged(crdt_service.handle_sync(node_id, p_deltas, n_deltas, timestamp, epoch))
+
+@router.post("/inventory/sync/delta")
+async def sync_inventory_delta(payload: DeltaSyncRequest):
+    """
+    Delta-state sync: many SKUs per call, replies carry only entries newer than `since`.
+    """
+    return _converged(crdt_service.sync_deltas(
+        payload.node_id,
+        payload.timestamp,
+        {sku: delta.model_dump() for sku, delta in payload.skus.items()},
+        payload.epoch
+    ))
+
+@router.get("/inventory/stock")
+async def stock_levels(sku: List[str] = Query(...)):
+    """
+    Current values for many SKUs (cached totals, no lock, O(1) per SKU).
+    """
+    if len(sku) > MAX_SYNC_SKUS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYNC_SKUS} SKUs per call")
+    return crdt_service.stock_levels(sku)
+
+@router.post("/inventory/devices/{node_id}/retire", dependencies=[Depends(require_admin_role)])
+async def retire_device(node_id: str):
+    """
+    Decommissions a device and folds its counter entries into the server base.
+    Admin only; the fold loads cold SKUs and fsyncs metadata, so it runs off the event loop.
+    """
+    crdt_service.retire_device(node_id)
+    return await run_in_threadpool(crdt_service.compact)
+
+@router.post("/inventory/compact", dependencies=[Depends(require_admin_role)])
+async def compact_inventory():
+    """
+    Retires devices idle for longer than CRDT_DEVICE_TTL_SECONDS and frees acknowledged IDs.
+    """
+    return await run_in_threadpool(crdt_service.compact)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 import os
-import httpx
+from app.core.http_pool import http_pool
 
 router = APIRouter()
 
@@ -38,20 +38,20 @@ async def update_user_profile(
             "Content-Type": "application/json"
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                # This assumes a 'profiles' table exists and row security allows updates
-                # or we are using service role key to bypass (which we are here for simplicity)
-                response = await client.patch(
-                    f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{x_user_id}",
-                    headers=headers,
-                    json={"wallet_address": user_data.wallet_address}
-                )
-                if response.status_code >= 400:
-                    print(f"Supabase update failed: {response.text}")
-                    # Fallback to mock if API fails (optional, helps dev flow)
-            except Exception as e:
-                print(f"Supabase connection error: {e}")
+        try:
+            # This assumes a 'profiles' table exists and row security allows updates
+            # or we are using service role key to bypass (which we are here for simplicity)
+            response = await http_pool.patch(
+                f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{x_user_id}",
+                headers=headers,
+                json={"wallet_address": user_data.wallet_address},
+                idempotent=True
+            )
+            if response.status_code >= 400:
+                print(f"Supabase update failed: {response.text}")
+                # Fallback to mock if API fails (optional, helps dev flow)
+        except Exception as e:
+            print(f"Supabase connection error: {e}")
 
     # 2. Local Mock Persistence (for dev/demo consistency)
     MOCK_USER_DB[x_user_id] = {
@@ -80,16 +80,15 @@ async def get_user_profile(
             "apikey": SUPABASE_KEY,
             "Authorization": f"Bearer {SUPABASE_KEY}",
         }
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{x_user_id}&select=*",
-                    headers=headers
-                )
-                if response.status_code == 200 and response.json():
-                    return response.json()[0]
-            except Exception:
-                pass
+        try:
+            response = await http_pool.get(
+                f"{SUPABASE_URL}/rest/v1/profiles?id=eq.{x_user_id}&select=*",
+                headers=headers
+            )
+            if response.status_code == 200 and response.json():
+                return response.json()[0]
+        except Exception:
+            pass
 
     # 2. Return Mock Data
     user_data = MOCK_USER_DB.get(x_user_id, {"id": x_user_id, "wallet_address": None})
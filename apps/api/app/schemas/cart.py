@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 from typing import List, Optional
 from app.schemas.product import Product
@@ -10,6 +10,9 @@ class CartItemBase(BaseModel):
 class CartItemCreate(CartItemBase):
     pass
 
+class CartItemsBatchCreate(BaseModel):
+    items: List[CartItemCreate] = Field(..., min_length=1, max_length=100)
+
 class CartItemUpdate(BaseModel):
     quantity: int
 
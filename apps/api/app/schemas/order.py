@@ -28,5 +28,6 @@ class Order(OrderBase):
     user_id: UUID
     created_at: datetime
     items: List[OrderItem] = []
+    item_count: Optional[int] = None # Populated in summary listings instead of items
 
     model_config = ConfigDict(from_attributes=True)
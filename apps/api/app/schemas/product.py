@@ -29,3 +29,7 @@ class Product(ProductBase):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+# Explicit projection for product reads: exactly the fields Product serializes.
+# Never `select("*")` on products - that ships the pgvector `embedding` column with every row.
+PRODUCT_COLUMNS = ",".join(Product.model_fields)
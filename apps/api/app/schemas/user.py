@@ -1,7 +1,7 @@
 from pydantic import BaseModel, ConfigDict
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any
 
 class UserProfileBase(BaseModel):
     full_name: Optional[str] = None
@@ -17,3 +17,15 @@ class UserProfile(UserProfileBase):
     updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+class AuthenticatedUser(BaseModel):
+    """
+    Principal resolved from a Supabase access token (locally verified claims or Auth API).
+    Exposes the same attributes handlers read from supabase's User (id, app_metadata, ...).
+    """
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    aud: Optional[str] = None
+    app_metadata: Dict[str, Any] = {}
+    user_metadata: Dict[str, Any] = {}
@@ -1,8 +1,8 @@
-import httpx
 import os
 import uuid
 import datetime
 from typing import Dict, Any, Optional
+from app.core.http_pool import http_pool
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -110,17 +110,16 @@ class BuyerAgentService:
             print(f"[Log Mock] {sender}: {message}")
             return
 
-        async with httpx.AsyncClient() as client:
-            try:
-                await client.post(
-                    f"{SUPABASE_URL}/rest/v1/negotiation_logs",
-                    headers=HEADERS,
-                    json={
-                        "negotiation_id": negotiation_id,
-                        "sender": sender,
-                        "message": message,
-                        "timestamp": datetime.datetime.utcnow().isoformat()
-                    }
-                )
-            except Exception as e:
-                print(f"Failed to log negotiation: {e}")
+        try:
+            await http_pool.post(
+                f"{SUPABASE_URL}/rest/v1/negotiation_logs",
+                headers=HEADERS,
+                json={
+                    "negotiation_id": negotiation_id,
+                    "sender": sender,
+                    "message": message,
+                    "timestamp": datetime.datetime.utcnow().isoformat()
+                }
+            )
+        except Exception as e:
+            print(f"Failed to log negotiation: {e}")
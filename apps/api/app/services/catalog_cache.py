@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+try:
+    import redis as redis_lib
+except ImportError:
+    redis_lib = None
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "60"))
+CATALOG_CACHE_REDIS_URL = os.getenv("CATALOG_CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+SHARED_PREFIX = "catalog:"
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    etag: str
+    expires_at: float
+
+
+def compute_etag(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.blake2b(payload.encode(), digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+class SharedRedisTier:
+    """Optional shared tier so every API worker sees the same entries and invalidations."""
+    def __init__(self, url: str, ttl: float):
+        self.client = redis_lib.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        raw = self.client.get(SHARED_PREFIX + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CacheEntry(data["v"], data["e"], time.time() + self.ttl)
+
+    def set(self, key: str, entry: CacheEntry):
+        self.client.set(
+            SHARED_PREFIX + key,
+            json.dumps({"v": entry.value, "e": entry.etag}, default=str),
+            ex=max(1, int(self.ttl)),
+        )
+
+    def delete(self, key: str):
+        self.client.delete(SHARED_PREFIX + key)
+
+    def generation(self, tag: str) -> int:
+        return int(self.client.get(SHARED_PREFIX + "gen:" + tag) or 0)
+
+    def bump(self, tag: str):
+        self.client.incr(SHARED_PREFIX + "gen:" + tag)
+
+
+class CatalogCache:
+    """
+    Read-through cache for catalog reads: in-process LRU + TTL, optionally backed by Redis.
+    - Entries are namespaced by per-tag generation numbers: items by their own product tag,
+      lists by all / category / vendor, so a write only retires what it can affect. Generations
+      live in the shared tier, so a bump also retires the other workers' local copies.
+    Shared-tier failures degrade to local-only; they never fail the request.
+    """
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL, shared: Optional[SharedRedisTier] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0, "shared_errors": 0}
+
+    # --- Entries ---
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry
+                del self._entries[key]
+
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception:
+                self.stats["shared_errors"] += 1
+                entry = None
+            if entry is not None:
+                self._store_local(key, entry)
+                self.stats["shared_hits"] += 1
+                return entry
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any) -> CacheEntry:
+        entry = CacheEntry(value, compute_etag(value), time.time() + self.ttl)
+        self._store_local(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, entry)
+            except Exception:
+                self.stats["shared_errors"] += 1
+        return entry
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception:
+                self.stats["shared_errors"] += 1
+        self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    # --- Generations (list invalidation) ---
+
+    def generation(self, tag: str) -> int:
+        if self.shared is not None:
+            try:
+                return self.shared.generation(tag)
+            except Exception:
+                self.stats["shared_errors"] += 1
+        return self._generations.get(tag, 0)
+
+    def bump(self, tags: Iterable[str]):
+        for tag in set(tags):
+            with self._lock:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            if self.shared is not None:
+                try:
+                    self.shared.bump(tag)
+                except Exception:
+                    self.stats["shared_errors"] += 1
+            self.stats["invalidations"] += 1
+
+    def _store_local(self, key: str, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# --- Product catalog keys ---
+
+def product_tag(product_id: Any) -> str:
+    return f"product:{product_id}"
+
+
+def product_key(product_id: Any) -> str:
+    """Item key for the product's current generation; read it once, before the fetch."""
+    return f"product:{product_id}:{catalog_cache.generation(product_tag(product_id))}"
+
+
+def product_list_tags(category: Optional[str] = None, vendor_id: Optional[Any] = None) -> list:
+    """Tags a list page depends on: its filters, or the whole catalog when unfiltered."""
+    tags = []
+    if category:
+        tags.append(f"products:category:{category}")
+    if vendor_id:
+        tags.append(f"products:vendor:{vendor_id}")
+    return tags or ["products:all"]
+
+
+def product_list_key(category: Optional[str], vendor_id: Optional[Any], limit: int, cursor: Optional[str]) -> str:
+    generations = ".".join(str(catalog_cache.generation(tag)) for tag in product_list_tags(category, vendor_id))
+    return f"products:list:{generations}:{category or ''}:{vendor_id or ''}:{limit}:{cursor or ''}"
+
+
+def invalidate_product(product_id: Optional[Any] = None, categories: Iterable[Optional[str]] = (), vendor_id: Optional[Any] = None):
+    """Retires the item entry and every list page the product could be listed on."""
+    tags = ["products:all"]
+    if product_id is not None:
+        tags.append(product_tag(product_id))
+    tags += [f"products:category:{c}" for c in categories if c]
+    if vendor_id:
+        tags.append(f"products:vendor:{vendor_id}")
+    catalog_cache.bump(tags)
+
+
+def _build_shared_tier() -> Optional[SharedRedisTier]:
+    if not CATALOG_CACHE_REDIS_URL:
+        return None
+    if redis_lib is None:
+        print("[CatalogCache] REDIS_URL set but `redis` is not installed. Using in-process tier only.")
+        return None
+    return SharedRedisTier(CATALOG_CACHE_REDIS_URL, CATALOG_CACHE_TTL)
+
+
+catalog_cache = CatalogCache(shared=_build_shared_tier())
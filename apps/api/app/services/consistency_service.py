@@ -1,57 +1,226 @@
 import asyncio
-import time
-from typing import Dict, Any, List
+import os
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from app.services.hlc import HybridLogicalClock
 
 # Simulating 3 Nodes in different regions
 NODES = ["US-EAST", "EU-WEST", "AP-SOUTH"]
 
+# One-way replica latency in seconds; override with e.g. REVIEW_NODE_LATENCY_MS="US-EAST=50,EU-WEST=150"
+NODE_LATENCY = {"US-EAST": 0.05, "EU-WEST": 0.15, "AP-SOUTH": 0.15}
+for _pair in filter(None, os.getenv("REVIEW_NODE_LATENCY_MS", "").split(",")):
+    _node, _, _ms = _pair.partition("=")
+    NODE_LATENCY[_node.strip()] = float(_ms) / 1000.0
+
+ConsistencyLevel = Literal["ONE", "QUORUM", "ALL"]
+
+class NodeUnavailable(ConnectionError):
+    pass
+
 class ConsistencyService:
-    def __init__(self):
+    """
+    Dynamo-style quorum coordinator over N replicas with last-write-wins on HLC timestamps.
+    Writes return as soon as W replicas ack; the stragglers finish in the background and a
+    replica that cannot be reached gets a hint, handed off once it is back. Reads return
+    after R replies with the newest version and repair the stale replicas in the background.
+    Latency and outages are injectable per node (`set_latency`, `set_down`).
+    """
+    def __init__(self, nodes: List[str] = NODES, latency: Optional[Dict[str, float]] = None):
+        self.nodes = list(nodes)
+        self.latency = {node: (latency or NODE_LATENCY).get(node, 0.15) for node in self.nodes}
+        self.down: set = set()
+        self.clock = HybridLogicalClock("review-coordinator")
         # Mock Data Store per Node: Node -> {Key -> (Value, Timestamp)}
         self._distributed_store: Dict[str, Dict[str, tuple]] = {
-            node: {} for node in NODES
+            node: {} for node in self.nodes
+        }
+        # Hinted handoff: Node -> {Key -> (Value, Timestamp)}, newest version per key only
+        self._hints: Dict[str, Dict[str, tuple]] = {node: {} for node in self.nodes}
+        self._background: set = set()  # strong refs to straggler writes / repairs / handoffs
+        self._handing_off: set = set()
+        self.stats = {
+            "writes": 0, "reads": 0, "quorum_failures": 0, "background_acks": 0,
+            "hints_stored": 0, "hints_delivered": 0, "read_repairs": 0,
         }
 
-    async def write_review(self, product_id: str, review_data: Dict, consistency_level: str = "QUORUM") -> Dict:
+    def quorum(self, consistency_level: ConsistencyLevel) -> int:
+        n = len(self.nodes)
+        levels = {"ONE": 1, "QUORUM": n // 2 + 1, "ALL": n}
+        if consistency_level not in levels:
+            raise ValueError(f"Unknown consistency level {consistency_level!r}; expected one of {', '.join(levels)}")
+        return levels[consistency_level]
+
+    # --- Fault injection ---
+
+    def set_latency(self, node: str, seconds: float):
+        self.latency[node] = seconds
+
+    def set_down(self, node: str, down: bool = True):
+        self.down.add(node) if down else self.down.discard(node)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def drain(self):
+        """Waits for every background write, repair and handoff (tests, shutdown)."""
+        while self._background:
+            await asyncio.gather(*list(self._background), return_exceptions=True)
+
+    # --- Writes ---
+
+    async def write_review(self, product_id: str, review_data: Dict, consistency_level: ConsistencyLevel = "QUORUM") -> Dict:
         """
         Writes data to nodes based on Consistency Level.
-        QUORUM: W = (N/2) + 1 = 2
+        QUORUM: W = (N/2) + 1 = 2, so the slowest region is off the critical path.
         """
-        N = len(NODES)
-        W = 2 if consistency_level == "QUORUM" else 1
-        
-        timestamp = time.time()
-        success_count = 0
-        
-        # Simulate Parallel Writes
-        results = await asyncio.gather(*[
-            self._write_to_node(node, product_id, review_data, timestamp) for node in NODES
-        ])
-        
-        success_count = sum(1 for res in results if res)
-        
-        if success_count >= W:
+        N = len(self.nodes)
+        W = self.quorum(consistency_level)
+        timestamp = self.clock.now_packed()
+        self.stats["writes"] += 1
+        self._handoff()
+
+        pending = {self._spawn(self._replicate(node, product_id, review_data, timestamp)) for node in self.nodes}
+        acked: List[str] = []
+        while pending and len(acked) < W:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            acked.extend(node for node, ok in (task.result() for task in done) if ok)
+            if len(acked) + len(pending) < W:
+                break  # quorum is out of reach; stragglers keep going (and hinting) anyway
+
+        # Stragglers finish in the background; their acks are counted, failures become hints
+        for task in pending:
+            task.add_done_callback(self._count_background_ack)
+
+        if len(acked) >= W:
             return {
-                "status": "SUCCESS", 
-                "message": f"Persisted to {success_count}/{N} nodes (Quorum Met).",
-                "consistency": consistency_level
+                "status": "SUCCESS",
+                "message": f"Persisted to {len(acked)}/{N} nodes (Quorum Met).",
+                "consistency": consistency_level,
+                "acked": acked,
+                "version": timestamp,
             }
-        else:
-            return {"status": "FAILURE", "message": "Quorum Write Failed"}
+        self.stats["quorum_failures"] += 1
+        return {"status": "FAILURE", "message": "Quorum Write Failed", "acked": acked}
+
+    def _count_background_ack(self, task: asyncio.Task):
+        if not task.cancelled() and task.result()[1]:
+            self.stats["background_acks"] += 1
 
-    async def _write_to_node(self, node: str, key: str, value: Any, timestamp: float) -> bool:
+    async def _replicate(self, node: str, key: str, value: Any, timestamp: int) -> Tuple[str, bool]:
+        """One replica write; an unreachable replica leaves a hint instead of an ack."""
+        try:
+            return node, await self._write_to_node(node, key, value, timestamp)
+        except NodeUnavailable:
+            self._hint(node, key, value, timestamp)
+            return node, False
+
+    def _hint(self, node: str, key: str, value: Any, timestamp: int):
+        existing = self._hints[node].get(key)
+        if existing is None or existing[1] < timestamp:
+            self._hints[node][key] = (value, timestamp)
+            self.stats["hints_stored"] += 1
+
+    def _handoff(self):
+        # Opportunistic: any request notices a recovered replica with hints and starts its handoff
+        for node, hints in self._hints.items():
+            if hints and node not in self.down and node not in self._handing_off:
+                self._handing_off.add(node)
+                self._spawn(self.deliver_hints(node)).add_done_callback(lambda _, n=node: self._handing_off.discard(n))
+
+    async def deliver_hints(self, node: str) -> int:
+        """Hands a recovered replica the writes it missed; returns how many landed."""
+        delivered = 0
+        for key, (value, timestamp) in list(self._hints[node].items()):
+            try:
+                await self._write_to_node(node, key, value, timestamp)
+            except NodeUnavailable:
+                break  # down again: keep the rest for next time
+            if self._hints[node].get(key, (None, None))[1] == timestamp:
+                del self._hints[node][key]
+            delivered += 1
+        self.stats["hints_delivered"] += delivered
+        return delivered
+
+    async def _write_to_node(self, node: str, key: str, value: Any, timestamp: int) -> bool:
         # Simulate Network Latency
-        latency = 0.05 if node == "US-EAST" else 0.15 # Further nodes slower
-        await asyncio.sleep(latency)
-        
+        await asyncio.sleep(self.latency[node])
+        if node in self.down:
+            raise NodeUnavailable(node)
+
         # Last-Write-Wins Logic (LWW)
         existing = self._distributed_store[node].get(key)
         if existing:
             _, old_ts = existing
             if old_ts > timestamp:
                 return False # Stale write
-        
+
         self._distributed_store[node][key] = (value, timestamp)
         return True
 
+    # --- Reads ---
+
+    async def _read_from_node(self, node: str, key: str) -> Tuple[str, Optional[tuple]]:
+        await asyncio.sleep(self.latency[node])
+        if node in self.down:
+            raise NodeUnavailable(node)
+        return node, self._distributed_store[node].get(key)
+
+    async def read_review(self, product_id: str, consistency_level: ConsistencyLevel = "QUORUM") -> Dict:
+        """Returns the newest version among the first R replies; stale replicas are repaired afterwards."""
+        R = self.quorum(consistency_level)
+        self.stats["reads"] += 1
+        self._handoff()
+        pending = {self._spawn(self._read_from_node(node, product_id)) for node in self.nodes}
+        replies: Dict[str, Optional[tuple]] = {}
+        while pending and len(replies) < R:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    node, version = task.result()
+                    replies[node] = version
+            if len(replies) + len(pending) < R:
+                break
+
+        newest = max((v for v in replies.values() if v is not None), key=lambda v: v[1], default=None)
+        self._spawn(self._read_repair(product_id, dict(replies), pending))
+        if len(replies) < R:
+            self.stats["quorum_failures"] += 1
+            return {"status": "FAILURE", "message": "Quorum Read Failed", "replied": sorted(replies)}
+
+        return {
+            "status": "SUCCESS",
+            "consistency": consistency_level,
+            "review": newest[0] if newest else None,
+            "version": newest[1] if newest else None,
+            "replied": sorted(replies),
+        }
+
+    async def _read_repair(self, key: str, replies: Dict[str, Optional[tuple]], pending: set):
+        # Let the slower replicas answer too, so they get compared (and repaired) as well
+        for task in asyncio.as_completed(pending):
+            try:
+                node, version = await task
+            except NodeUnavailable:
+                continue
+            replies[node] = version
+        newest = max((v for v in replies.values() if v is not None), key=lambda v: v[1], default=None)
+        if newest is None:
+            return
+        stale = [node for node, version in replies.items() if version is None or version[1] < newest[1]]
+        results = await asyncio.gather(
+            *[self._write_to_node(node, key, newest[0], newest[1]) for node in stale], return_exceptions=True
+        )
+        self.stats["read_repairs"] += sum(1 for ok in results if ok is True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "pending_hints": {node: len(hints) for node, hints in self._hints.items() if hints},
+            "in_flight": len(self._background),
+            "down": sorted(self.down),
+        }
+
 consistency_service = ConsistencyService()
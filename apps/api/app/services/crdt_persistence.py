@@ -0,0 +1,412 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CRDT_DATA_DIR = os.getenv("CRDT_DATA_DIR")  # unset: inventory state is in-memory only
+CRDT_SNAPSHOT_LOG_BYTES = int(os.getenv("CRDT_SNAPSHOT_LOG_BYTES", str(32 * 1024 * 1024)))
+CRDT_LOG_FSYNC = os.getenv("CRDT_LOG_FSYNC", "0") == "1"  # fsync every record (power-loss safe, slower)
+
+# (side "P"|"N", node_id, value, dot or None)
+Entry = Tuple[str, str, int, Optional[Tuple[str, int]]]
+
+SNAPSHOT_MAGIC = b"CRDTSNP1"
+_HEADER = struct.Struct("<8sQQI")       # magic, generation, directory offset, sku count
+_ENTRY = struct.Struct("<BqHQ")         # side, value, replica index, seq (after the node bytes)
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_DIR = struct.Struct("<QI")             # block offset, block length (after the sku bytes)
+_NO_DOT = 0xFFFF
+_SEGMENT = re.compile(r"^(delta|snapshot)-(\d{8})\.(log|bin)$")
+
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return _U16.pack(len(raw)) + raw
+
+
+def _unpack_str(buf, offset: int) -> Tuple[str, int]:
+    (length,) = _U16.unpack_from(buf, offset)
+    offset += _U16.size
+    return bytes(buf[offset:offset + length]).decode("utf-8"), offset + length
+
+
+class SnapshotReader:
+    """
+    Read-only view of a snapshot file through mmap.
+    Opening it only parses the SKU directory; a SKU's entries are decoded on first access,
+    so startup cost and resident memory don't grow with SKUs nobody touches.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, dir_offset, count = _HEADER.unpack_from(self._buf, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a CRDT snapshot")
+
+        offset = _HEADER.size
+        (replicas,) = _U16.unpack_from(self._buf, offset)
+        offset += _U16.size
+        self.replicas: List[str] = []
+        self.max_seqs: Dict[str, int] = {}  # highest dot per replica, so recovery needn't scan blocks
+        for _ in range(replicas):
+            name, offset = _unpack_str(self._buf, offset)
+            (self.max_seqs[name],) = _U64.unpack_from(self._buf, offset)
+            offset += _U64.size
+            self.replicas.append(name)
+
+        (squad,) = _U32.unpack_from(self._buf, offset)
+        offset += _U32.size
+        self.squad: Dict[str, int] = {}
+        for _ in range(squad):
+            node, offset = _unpack_str(self._buf, offset)
+            (self.squad[node],) = struct.unpack_from("<q", self._buf, offset)
+            offset += 8
+
+        self.directory: Dict[str, Tuple[int, int]] = {}
+        offset = dir_offset
+        for _ in range(count):
+            sku, offset = _unpack_str(self._buf, offset)
+            self.directory[sku] = _DIR.unpack_from(self._buf, offset)
+            offset += _DIR.size
+
+    def __contains__(self, sku_id: str) -> bool:
+        return sku_id in self.directory
+
+    def __len__(self) -> int:
+        return len(self.directory)
+
+    def skus(self) -> Iterable[str]:
+        return self.directory.keys()
+
+    def raw(self, sku_id: str) -> bytes:
+        start, length = self.directory[sku_id]
+        return self._buf[start:start + length]
+
+    def load(self, sku_id: str) -> Optional[List[Entry]]:
+        if sku_id not in self.directory:
+            return None
+        start, length = self.directory[sku_id]
+        entries: List[Entry] = []
+        offset, end = start, start + length
+        while offset < end:
+            node, offset = _unpack_str(self._buf, offset)
+            side, value, replica, seq = _ENTRY.unpack_from(self._buf, offset)
+            offset += _ENTRY.size
+            dot = None if replica == _NO_DOT else (self.replicas[replica], seq)
+            entries.append(("P" if side == 0 else "N", node, value, dot))
+        return entries
+
+
+class SnapshotWriter:
+    """
+    Streams SKU blocks into `<path>.tmp`, then fsyncs and renames it into place, so a
+    crash mid-write leaves the previous snapshot intact. Blocks copied from an older
+    snapshot keep their replica indexes valid because the replica table only grows.
+    """
+    def __init__(self, path: str, generation: int, max_seqs: Dict[str, int], squad: Dict[str, int]):
+        self.path = path
+        self.generation = generation
+        self.replicas = list(max_seqs)
+        self.max_seqs = dict(max_seqs)
+        self._replica_index = {name: i for i, name in enumerate(self.replicas)}
+        self._squad = dict(squad)
+        self._directory: List[Tuple[str, int, int]] = []
+        self._blocks = open(f"{path}.blocks", "wb")
+
+    def _replica(self, name: str) -> int:
+        index = self._replica_index.get(name)
+        if index is None:
+            index = self._replica_index[name] = len(self.replicas)
+            self.replicas.append(name)
+            self.max_seqs[name] = 0
+        return index
+
+    def add(self, sku_id: str, entries: Iterable[Entry]):
+        block = bytearray()
+        for side, node, value, dot in entries:
+            block += _pack_str(node)
+            replica, seq = (self._replica(dot[0]), dot[1]) if dot else (_NO_DOT, 0)
+            if dot and seq > self.max_seqs[dot[0]]:
+                self.max_seqs[dot[0]] = seq
+            block += _ENTRY.pack(0 if side == "P" else 1, value, replica, seq)
+        self.add_raw(sku_id, bytes(block))
+
+    def add_raw(self, sku_id: str, block: bytes):
+        self._directory.append((sku_id, self._blocks.tell(), len(block)))
+        self._blocks.write(block)
+
+    def commit(self) -> int:
+        self._blocks.close()
+        preamble = bytearray(_HEADER.size)
+        preamble += _U16.pack(len(self.replicas))
+        for name in self.replicas:
+            preamble += _pack_str(name) + _U64.pack(self.max_seqs[name])
+        preamble += _U32.pack(len(self._squad))
+        for node, value in self._squad.items():
+            preamble += _pack_str(node) + struct.pack("<q", value)
+
+        base = len(preamble)
+        directory = bytearray()
+        for sku_id, offset, length in self._directory:
+            directory += _pack_str(sku_id) + _DIR.pack(base + offset, length)
+
+        blocks_path = f"{self.path}.blocks"
+        dir_offset = base + os.path.getsize(blocks_path)
+        _HEADER.pack_into(preamble, 0, SNAPSHOT_MAGIC, self.generation, dir_offset, len(self._directory))
+
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as out, open(blocks_path, "rb") as blocks:
+            out.write(preamble)
+            while True:
+                chunk = blocks.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+            out.write(directory)
+            out.flush()
+            os.fsync(out.fileno())
+        os.remove(blocks_path)
+        os.replace(tmp, self.path)
+        return dir_offset + len(directory)
+
+    def abort(self):
+        self._blocks.close()
+        for path in (f"{self.path}.blocks", f"{self.path}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def encode_record(sku_id: Optional[str], entries: Any, removed: Optional[List[Any]] = None) -> bytes:
+    """
+    One log line: crc32 of the JSON payload, then the payload. `sku_id` None = squad counter.
+    `removed` lists keys folded away by compaction; replay drops them after applying `entries`.
+    """
+    if sku_id is None:
+        body = entries
+    else:
+        body = [[side, node, value, dot[0] if dot else None, dot[1] if dot else 0] for side, node, value, dot in entries]
+    record = [sku_id, body, removed] if removed else [sku_id, body]
+    raw = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return b"%08x " % zlib.crc32(raw) + raw + b"\n"
+
+
+def decode_records(path: str) -> Iterator[Tuple[int, Optional[str], Any, List[Any]]]:
+    """Yields (end offset, sku, entries, removed) until EOF or the first torn/corrupt line."""
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+                return
+            raw = line[9:-1]
+            try:
+                if int(line[:8], 16) != zlib.crc32(raw):
+                    return
+                record = json.loads(raw)
+            except ValueError:
+                return
+            offset += len(line)
+            sku_id, body = record[0], record[1]
+            removed = record[2] if len(record) > 2 else []
+            if sku_id is None:
+                yield offset, None, body, removed
+            else:
+                entries = [(side, node, value, (replica, seq) if replica else None) for side, node, value, replica, seq in body]
+                yield offset, sku_id, entries, [tuple(key) for key in removed]
+
+
+class CRDTPersistence:
+    """
+    Durable inventory state as snapshot + append-only delta log.
+    - Every accepted change appends the new absolute value (and dot) of each changed entry.
+      Merges are max-based, so replaying a record twice, or over a snapshot that already
+      holds it, is harmless.
+    - `checkpoint()` rotates to a new log segment, then writes a compacted snapshot of the
+      live state. Snapshot N covers every segment below N, which is then deleted. It runs
+      in a background thread once `snapshot_log_bytes` have been logged.
+    - Recovery (`load_snapshot` + `replay`) maps the newest snapshot (SKUs decode lazily) and
+      replays only the segments written after it. A torn last record is truncated away.
+    """
+    def __init__(self, directory: str, snapshot_log_bytes: int = CRDT_SNAPSHOT_LOG_BYTES, fsync: bool = CRDT_LOG_FSYNC):
+        self.directory = directory
+        self.snapshot_log_bytes = snapshot_log_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._log = None
+        self.generation = 0
+        self.snapshot: Optional[SnapshotReader] = None
+        self._checkpoint_thread: Optional[threading.Thread] = None
+        self._checkpoint_lock = threading.Lock()
+        self._recovery_started = time.perf_counter()
+        self.on_checkpoint: Optional[Callable[[], None]] = None  # set by the owner: rotate() + write_snapshot()
+        self.stats = {
+            "records": 0, "log_bytes": 0, "snapshots": 0, "snapshot_bytes": 0,
+            "last_snapshot_ms": 0.0, "recovery_ms": 0.0, "replayed_records": 0, "truncated_bytes": 0,
+        }
+
+    def _path(self, kind: str, generation: int) -> str:
+        ext = "log" if kind == "delta" else "bin"
+        return os.path.join(self.directory, f"{kind}-{generation:08d}.{ext}")
+
+    def _files(self, kind: str) -> List[int]:
+        generations = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT.match(name)
+            if match and match.group(1) == kind:
+                generations.append(int(match.group(2)))
+        return sorted(generations)
+
+    # --- Recovery ---
+
+    def load_snapshot(self) -> Optional[SnapshotReader]:
+        """Maps the newest snapshot (if any). Call before `replay`."""
+        self._recovery_started = time.perf_counter()
+        snapshots = self._files("snapshot")
+        if snapshots:
+            self.snapshot = SnapshotReader(self._path("snapshot", snapshots[-1]))
+            self.generation = self.snapshot.generation
+        return self.snapshot
+
+    def replay(self, apply: Callable[[str, List[Entry], List[Any]], None], apply_squad: Callable[[Dict[str, int], List[str]], None]):
+        """
+        Replays the segments written after the snapshot through `apply(sku, entries, removed)` /
+        `apply_squad(p, removed)`. Afterwards new records go to a fresh segment.
+        """
+        segments = [g for g in self._files("delta") if g >= self.generation]
+        for generation in segments:
+            path = self._path("delta", generation)
+            good = 0
+            for good, sku_id, entries, removed in decode_records(path):
+                if sku_id is None:
+                    apply_squad(entries, removed)
+                else:
+                    apply(sku_id, entries, removed)
+                self.stats["replayed_records"] += 1
+            size = os.path.getsize(path)
+            if good < size:
+                print(f"[CRDTPersistence] Truncating {size - good} torn bytes from {os.path.basename(path)}")
+                self.stats["truncated_bytes"] += size - good
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+            self.stats["log_bytes"] += good
+
+        self._open_segment((segments[-1] + 1) if segments else self.generation)
+        self.stats["recovery_ms"] = round((time.perf_counter() - self._recovery_started) * 1000, 1)
+
+    def _open_segment(self, generation: int):
+        self._log_generation = generation
+        self._log = open(self._path("delta", generation), "ab")
+
+    # --- Write path ---
+
+    def append(self, sku_id: Optional[str], entries: Any, removed: Optional[List[Any]] = None):
+        record = encode_record(sku_id, entries, removed)
+        with self._lock:
+            self._log.write(record)
+            self._log.flush()  # in the OS page cache: survives a process crash
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self.stats["records"] += 1
+            self.stats["log_bytes"] += len(record)
+            due = self.stats["log_bytes"] >= self.snapshot_log_bytes
+        if due:
+            self.checkpoint_async()
+
+    # --- Compaction ---
+
+    def rotate(self) -> int:
+        """Starts a new segment; returns its generation (the snapshot about to be written)."""
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+            self._open_segment(self._log_generation + 1)
+            self.stats["log_bytes"] = 0
+            return self._log_generation
+
+    def write_snapshot(self, generation: int, squad: Dict[str, int], blocks: Iterable[Tuple[str, Any]]):
+        """
+        `blocks` yields (sku, entries) for live counters or (sku, bytes) for blocks copied
+        verbatim from the current snapshot. Installs the result and drops covered files.
+        """
+        started = time.perf_counter()
+        path = self._path("snapshot", generation)
+        writer = SnapshotWriter(path, generation, self.snapshot.max_seqs if self.snapshot else {}, squad)
+        try:
+            for sku_id, block in blocks:
+                if isinstance(block, bytes):
+                    writer.add_raw(sku_id, block)
+                else:
+                    writer.add(sku_id, block)
+            size = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+        # The old mapping is left to the GC: a reader may still be decoding from it
+        self.snapshot = SnapshotReader(path)
+        self.generation = generation
+        for old in self._files("snapshot"):
+            if old < generation:
+                os.remove(self._path("snapshot", old))
+        for old in self._files("delta"):
+            if old < generation:
+                os.remove(self._path("delta", old))
+        self.stats["snapshots"] += 1
+        self.stats["snapshot_bytes"] = size
+        self.stats["last_snapshot_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def checkpoint_async(self):
+        if self.on_checkpoint is None:
+            return
+        with self._checkpoint_lock:
+            if self._checkpoint_thread is not None and self._checkpoint_thread.is_alive():
+                return
+            self._checkpoint_thread = threading.Thread(target=self._safe_checkpoint, name="crdt-checkpoint", daemon=True)
+            self._checkpoint_thread.start()
+
+    def _safe_checkpoint(self):
+        try:
+            self.on_checkpoint()
+        except Exception as e:
+            print(f"[CRDTPersistence] Snapshot failed: {e}")
+
+    # --- Compaction metadata ---
+
+    def load_meta(self) -> Dict[str, Any]:
+        path = os.path.join(self.directory, "compaction.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_meta(self, meta: Dict[str, Any]):
+        """Small, rarely written state (retired device IDs, replica acks): atomic rewrite."""
+        path = os.path.join(self.directory, "compaction.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def close(self):
+        thread = self._checkpoint_thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+                self._log = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "generation": self.generation, "snapshot_skus": len(self.snapshot) if self.snapshot else 0}
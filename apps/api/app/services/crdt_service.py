@@ -1,74 +1,159 @@
+import itertools
+import os
+import sys
 import time
 import threading
-from typing import Dict, Any, List
+import zlib
+from typing import Dict, Any, List, Callable, Optional, Set, Tuple
 
-class HybridLogicalClock:
-    """
-    Hybrid Logical Clock (HLC).
-    Captures causality across distributed systems.
-    Structure: (physical_time, logical_counter, node_id)
-    """
-    def __init__(self, node_id: str):
-        self.node_id = node_id
-        self.latest_phys = 0
-        self.latest_logical = 0
-        self._lock = threading.Lock()
-
-    def now(self) -> Dict[str, Any]:
-        """Generates a new timestamp for a local event."""
-        with self._lock:
-            phys = time.time_ns()
-            if phys > self.latest_phys:
-                self.latest_phys = phys
-                self.latest_logical = 0
-            else:
-                self.latest_logical += 1
-            return {"p": self.latest_phys, "l": self.latest_logical, "n": self.node_id}
-
-    def update(self, remote_ts: Dict[str, Any]):
-        """Updates local clock based on a received message timestamp."""
-        with self._lock:
-            phys = time.time_ns()
-            
-            # HLC Algorithm: max(local, remote, phys)
-            self.latest_phys = max(self.latest_phys, remote_ts["p"], phys)
-            
-            if self.latest_phys == remote_ts["p"]:
-                 self.latest_logical = max(self.latest_logical, remote_ts["l"]) + 1
-            elif self.latest_phys == self.latest_phys: # unchanged (local was higher)
-                 self.latest_logical += 1
-            else:
-                 self.latest_logical = 0
+from app.services.crdt_persistence import CRDTPersistence, CRDT_DATA_DIR, Entry
+from app.services.hlc import HLCTimestamp, HybridLogicalClock
+
+# A dot tags the latest change of one counter entry with the server replica that accepted
+# it and that replica's sequence number. Version vectors ({replica: seq}) summarise which
+# dots a client has already seen, so their size is bounded by server replicas, not devices.
+Dot = Tuple[str, int]
+Stamp = Callable[[], Dot]
+
+# Server-owned entry that the counts of retired devices are folded into (see CRDTService.compact)
+BASE_NODE = "~base"
+_DICT_SLOT_BYTES = 24  # hash + key + value pointers per dict entry (64-bit CPython)
+
+def _entry_bytes(side: str, node: str, value: int, dot: Optional[Dot]) -> int:
+    """Approximate heap held by one counter entry (its node string is shared, not counted)."""
+    size = _DICT_SLOT_BYTES + sys.getsizeof(value)
+    if dot:
+        size += _DICT_SLOT_BYTES + sys.getsizeof(dot) + sys.getsizeof((side, node))
+    return size
 
 class InventoryCRDT:
     """
     PN-Counter (Positive-Negative Counter) CRDT.
     Allows concurrent increments (+) and decrements (-) without conflicts.
+    When given a `stamp`, changed entries are dotted so deltas can be served by version vector.
     """
     def __init__(self):
         # Maps NodeID -> Count
         self.P: Dict[str, int] = {} # Increments (Stock Added)
         self.N: Dict[str, int] = {} # Decrements (Purchased)
+        self.dots: Dict[Tuple[str, str], Dot] = {} # ("P"|"N", NodeID) -> dot of last change
+        # Running totals, maintained on every write so value() is O(1) instead of O(devices)
+        self.p_total = 0
+        self.n_total = 0
     
-    def inc(self, node_id: str, amount: int = 1):
+    def inc(self, node_id: str, amount: int = 1, stamp: Optional[Stamp] = None):
         self.P[node_id] = self.P.get(node_id, 0) + amount
+        self.p_total += amount
+        if stamp:
+            self.dots[("P", node_id)] = stamp()
     
-    def dec(self, node_id: str, amount: int = 1):
+    def dec(self, node_id: str, amount: int = 1, stamp: Optional[Stamp] = None):
         self.N[node_id] = self.N.get(node_id, 0) + amount
+        self.n_total += amount
+        if stamp:
+            self.dots[("N", node_id)] = stamp()
         
     def value(self) -> int:
-        return sum(self.P.values()) - sum(self.N.values())
+        return self.p_total - self.n_total
 
-    def merge(self, other_p: Dict, other_n: Dict):
+    def merge(self, other_p: Dict, other_n: Dict, stamp: Optional[Stamp] = None) -> List[Tuple[str, str]]:
         """
         Merge State: Max(Local, Remote) for every node key.
-        Idempotent & Commutative.
+        Idempotent & Commutative. Only entries that actually grew get a new dot.
+        Returns the (side, node) keys that changed.
         """
+        changed = []
         for k, v in other_p.items():
-            self.P[k] = max(self.P.get(k, 0), v)
+            current = self.P.get(k, 0)
+            if v > current:
+                self.P[k] = v
+                self.p_total += v - current
+                changed.append(("P", k))
+                if stamp:
+                    self.dots[("P", k)] = stamp()
         
         for k, v in other_n.items():
-            self.N[k] = max(self.N.get(k, 0), v)
+            current = self.N.get(k, 0)
+            if v > current:
+                self.N[k] = v
+                self.n_total += v - current
+                changed.append(("N", k))
+                if stamp:
+                    self.dots[("N", k)] = stamp()
+        return changed
+
+    def apply(self, entries: List[Entry]):
+        """Restores persisted entries (absolute values + their original dots)."""
+        for side, node, value, dot in entries:
+            counts = self.P if side == "P" else self.N
+            current = counts.get(node, 0)
+            if value > current:
+                counts[node] = value
+                if side == "P":
+                    self.p_total += value - current
+                else:
+                    self.n_total += value - current
+                if dot:
+                    self.dots[(side, node)] = dot
+
+    def remove(self, keys: List[Tuple[str, str]]):
+        """Drops folded entries during replay (the matching base increase is logged with them)."""
+        for side, node in keys:
+            counts = self.P if side == "P" else self.N
+            value = counts.pop(node, 0)
+            if side == "P":
+                self.p_total -= value
+            else:
+                self.n_total -= value
+            self.dots.pop((side, node), None)
+
+    def fold(
+        self, nodes: Set[str], stamp: Optional[Stamp] = None, folded: Optional[Dict[str, List[int]]] = None
+    ) -> Tuple[List[Entry], List[Tuple[str, str]], int]:
+        """
+        Moves the entries of `nodes` into BASE_NODE; value() is unchanged.
+        Returns (changed base entries, removed keys, approx bytes freed); if given, `folded`
+        receives each node's moved [P, N] values.
+        """
+        changed, removed, freed = [], [], 0
+        for side, counts in (("P", self.P), ("N", self.N)):
+            candidates = nodes if len(nodes) < len(counts) else list(counts)
+            moved = 0
+            for node in candidates:
+                if node in counts and node in nodes:
+                    value = counts.pop(node)
+                    freed += _entry_bytes(side, node, value, self.dots.pop((side, node), None))
+                    moved += value
+                    removed.append((side, node))
+                    if folded is not None:
+                        folded.setdefault(node, [0, 0])[side == "N"] = value
+            if moved:
+                counts[BASE_NODE] = counts.get(BASE_NODE, 0) + moved
+                if stamp:
+                    self.dots[(side, BASE_NODE)] = stamp()
+                changed.append((side, BASE_NODE))
+        return self.entries(changed), removed, freed
+
+    def entries(self, keys: Optional[List[Tuple[str, str]]] = None) -> List[Entry]:
+        if keys is None:
+            keys = [("P", k) for k in self.P] + [("N", k) for k in self.N]
+        return [(side, node, (self.P if side == "P" else self.N)[node], self.dots.get((side, node))) for side, node in keys]
+
+    def delta_since(self, version_vector: Dict[str, int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Entries whose last change the holder of `version_vector` has not seen."""
+        p: Dict[str, int] = {}
+        n: Dict[str, int] = {}
+        for (side, node), (replica, seq) in self.dots.items():
+            if seq > version_vector.get(replica, 0):
+                (p if side == "P" else n)[node] = (self.P if side == "P" else self.N)[node]
+        return p, n
+
+    def version_vector(self) -> Dict[str, int]:
+        vv: Dict[str, int] = {}
+        for replica, seq in self.dots.values():
+            if seq > vv.get(replica, 0):
+                vv[replica] = seq
+        return vv
 
 class GCounter:
     """
@@ -88,32 +173,476 @@ class GCounter:
         for k, v in other_p.items():
             self.P[k] = max(self.P.get(k, 0), v)
 
-class CRDTService:
+    def fold(self, nodes: Set[str]) -> List[str]:
+        """Moves the counts of `nodes` into BASE_NODE; returns the removed keys."""
+        removed = [node for node in nodes if node in self.P]
+        if removed:
+            self.P[BASE_NODE] = self.P.get(BASE_NODE, 0) + sum(self.P.pop(node) for node in removed)
+        return removed
+
+DEFAULT_SKU = "default"
+MAX_SYNC_SKUS = 500
+CRDT_SHARDS = int(os.getenv("CRDT_SHARDS", "64"))
+CRDT_DEVICE_TTL = float(os.getenv("CRDT_DEVICE_TTL_SECONDS", str(30 * 86400)))  # inactive devices are retired after this
+CRDT_META_SAVE_INTERVAL = float(os.getenv("CRDT_META_SAVE_INTERVAL_SECONDS", "60"))  # lazy persistence of replica `seen`
+
+class InventoryShard:
+    __slots__ = ("lock", "counters")
+
     def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, InventoryCRDT] = {}
+
+class InventoryStore:
+    """
+    SKU -> PN-counter map split across `shards` independently locked shards.
+    Writers on different shards never contend; a multi-SKU call takes each shard lock
+    once, in shard order, for all of its SKUs on that shard.
+    """
+    def __init__(self, shards: int = CRDT_SHARDS, stamp: Optional[Stamp] = None):
+        self.shards = [InventoryShard() for _ in range(shards)]
+        self.stamp = stamp
+        # Optional persistence hooks: `base` is a snapshot SKUs are lazily loaded from,
+        # `journal(sku, entries)` is called under the shard lock with every change
+        self.base = None
+        self.journal: Optional[Callable[..., None]] = None
+        # Node IDs whose entries were folded away: incoming values for them are ignored, and
+        # BASE_NODE is only ever written by the server
+        self.retired: Set[str] = set()
+
+    def _admit(self, counts: Dict[str, int]) -> Dict[str, int]:
+        if not counts or (BASE_NODE not in counts and self.retired.isdisjoint(counts)):
+            return counts
+        return {k: v for k, v in counts.items() if k != BASE_NODE and k not in self.retired}
+
+    def _shard(self, sku_id: str) -> InventoryShard:
+        return self.shards[zlib.crc32(sku_id.encode()) % len(self.shards)]
+
+    def _by_shard(self, sku_ids) -> List[Tuple[InventoryShard, List[str]]]:
+        groups: Dict[int, List[str]] = {}
+        for sku_id in sku_ids:
+            groups.setdefault(zlib.crc32(sku_id.encode()) % len(self.shards), []).append(sku_id)
+        return [(self.shards[i], groups[i]) for i in sorted(groups)]
+
+    def _materialize(self, shard: InventoryShard, sku_id: str) -> InventoryCRDT:
+        """Caller holds `shard.lock`."""
+        crdt = shard.counters.get(sku_id)
+        if crdt is None:
+            crdt = shard.counters[sku_id] = InventoryCRDT()
+            if self.base is not None and sku_id in self.base:
+                crdt.apply(self.base.load(sku_id))
+        return crdt
+
+    def counter(self, sku_id: str) -> InventoryCRDT:
+        """Returns (creating if needed) the SKU's counter. Mutate it only under `locked`."""
+        shard = self._shard(sku_id)
+        with shard.lock:
+            return self._materialize(shard, sku_id)
+
+    def locked(self, sku_id: str) -> threading.Lock:
+        return self._shard(sku_id).lock
+
+    def __len__(self) -> int:
+        live = sum(len(shard.counters) for shard in self.shards)
+        if self.base is None:
+            return live
+        return live + sum(1 for sku_id in self.base.skus() if sku_id not in self._shard(sku_id).counters)
+
+    def __contains__(self, sku_id: str) -> bool:
+        return sku_id in self._shard(sku_id).counters or (self.base is not None and sku_id in self.base)
+
+    # --- Single SKU ---
+
+    def value(self, sku_id: str) -> int:
+        crdt = self._shard(sku_id).counters.get(sku_id)
+        if crdt is None:
+            if self.base is None or sku_id not in self.base:
+                return 0
+            crdt = self.counter(sku_id)
+        return crdt.value()
+
+    def inc(self, sku_id: str, node_id: str, amount: int = 1):
+        shard = self._shard(sku_id)
+        with shard.lock:
+            crdt = self._materialize(shard, sku_id)
+            crdt.inc(node_id, amount, stamp=self.stamp)
+            if self.journal:
+                self.journal(sku_id, crdt.entries([("P", node_id)]))
+
+    def dec(self, sku_id: str, node_id: str, amount: int = 1):
+        shard = self._shard(sku_id)
+        with shard.lock:
+            crdt = self._materialize(shard, sku_id)
+            crdt.dec(node_id, amount, stamp=self.stamp)
+            if self.journal:
+                self.journal(sku_id, crdt.entries([("N", node_id)]))
+
+    # --- Bulk ---
+
+    def values(self, sku_ids: List[str]) -> Dict[str, int]:
+        # Totals are cached ints: reads need no lock
+        return {sku_id: self.value(sku_id) for sku_id in sku_ids}
+
+    def merge_many(self, states: Dict[str, Tuple[Dict[str, int], Dict[str, int]]]) -> Dict[str, int]:
+        """Merges {sku: (P, N)} for many SKUs; returns the new values."""
+        result = {}
+        for shard, sku_ids in self._by_shard(states):
+            with shard.lock:
+                for sku_id in sku_ids:
+                    crdt = self._materialize(shard, sku_id)
+                    p, n = states[sku_id]
+                    changed = crdt.merge(self._admit(p), self._admit(n), stamp=self.stamp)
+                    if changed and self.journal:
+                        self.journal(sku_id, crdt.entries(changed))
+                    result[sku_id] = crdt.value()
+        return result
+
+    def sync_many(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Merge + delta-since for many SKUs (see CRDTService.sync_deltas)."""
+        result = {}
+        for shard, sku_ids in self._by_shard(requests):
+            with shard.lock:
+                for sku_id in sku_ids:
+                    req = requests[sku_id]
+                    crdt = self._materialize(shard, sku_id)
+                    sent_p, sent_n = self._admit(req.get("p") or {}), self._admit(req.get("n") or {})
+                    changed = crdt.merge(sent_p, sent_n, stamp=self.stamp)
+                    if changed and self.journal:
+                        self.journal(sku_id, crdt.entries(changed))
+
+                    p, n = crdt.delta_since(req.get("since") or {})
+                    # Don't echo the client's own writes back to it
+                    p = {k: v for k, v in p.items() if sent_p.get(k) != v}
+                    n = {k: v for k, v in n.items() if sent_n.get(k) != v}
+                    result[sku_id] = {"value": crdt.value(), "p": p, "n": n, "vv": crdt.version_vector()}
+        return result
+
+    # --- Persistence ---
+
+    def restore(self, sku_id: str, entries: List[Entry], removed: List[Tuple[str, str]] = ()):
+        """Replays logged entries without stamping or journaling them again."""
+        shard = self._shard(sku_id)
+        with shard.lock:
+            crdt = self._materialize(shard, sku_id)
+            crdt.apply(entries)
+            if removed:
+                crdt.remove(removed)
+
+    def fold_many(self, nodes: Set[str], folded: Optional[Dict[str, Dict[str, List[int]]]] = None) -> Dict[str, int]:
+        """
+        Folds `nodes` into BASE_NODE in every SKU, one shard lock at a time. SKUs still only
+        in the snapshot are loaded first, since any of them may hold entries of `nodes`.
+        `folded`, if given, receives {node: {sku: [P, N]}} of what was moved.
+        """
+        report = {"skus_touched": 0, "entries_reclaimed": 0, "approx_bytes_reclaimed": 0}
+        cold = {id(shard): sku_ids for shard, sku_ids in self._by_shard(self.base.skus())} if self.base is not None else {}
+        for shard in self.shards:
+            with shard.lock:
+                for sku_id in cold.get(id(shard), ()):
+                    self._materialize(shard, sku_id)
+                for sku_id, crdt in shard.counters.items():
+                    values: Optional[Dict[str, List[int]]] = {} if folded is not None else None
+                    changed, removed, freed = crdt.fold(nodes, stamp=self.stamp, folded=values)
+                    if not removed:
+                        continue
+                    for node, pn in (values or {}).items():
+                        folded.setdefault(node, {})[sku_id] = pn
+                    if self.journal:
+                        self.journal(sku_id, changed, removed)
+                    report["skus_touched"] += 1
+                    report["entries_reclaimed"] += len(removed)
+                    report["approx_bytes_reclaimed"] += freed
+        return report
+
+    def snapshot_blocks(self):
+        """
+        Yields (sku, entries) for live counters and (sku, raw bytes) for SKUs still only in
+        `base`, one shard lock at a time. Copying under the lock keeps a SKU from being
+        loaded and changed between the two checks.
+        """
+        base = self.base
+        cold = {id(shard): sku_ids for shard, sku_ids in self._by_shard(base.skus())} if base is not None else {}
+        for shard in self.shards:
+            with shard.lock:
+                blocks = [(sku_id, crdt.entries()) for sku_id, crdt in shard.counters.items()]
+                blocks.extend((sku_id, base.raw(sku_id)) for sku_id in cold.get(id(shard), ()) if sku_id not in shard.counters)
+            yield from blocks
+
+class CRDTService:
+    def __init__(self, shards: int = CRDT_SHARDS, data_dir: Optional[str] = CRDT_DATA_DIR, device_ttl: float = CRDT_DEVICE_TTL):
         self.clock = HybridLogicalClock(node_id="server-virginia")
-        self.inventory = InventoryCRDT()
+        self.replica_id = self.clock.node_id
+        self.store = InventoryStore(shards, stamp=self._stamp)
         self.squad_tracker = GCounter() # New: for Squads
+        self.persistence: Optional[CRDTPersistence] = None
+
+        # Device-ID garbage collection (see compact()). Epochs start at 1 so a device that
+        # has never talked to this server (epoch 0) can be told apart from a returning one.
+        self.device_ttl = device_ttl
+        self.epoch = 1
+        self.replicas: Dict[str, Dict[str, float]] = {}  # node -> {"seen": unix ts, "epoch": acked}
+        self.retired: Dict[str, int] = {}                # node -> epoch it was folded in, until every replica acks it
+        # Every node ID ever folded, kept for good: a device or a relayed copy carrying one of
+        # these IDs would re-add counts that already live in the base
+        self.tombstones: Set[str] = set()
+        # What was folded per retired device, so a returning one can re-submit unsynced changes
+        # under a new node_id; kept for `device_ttl` after retirement (outlives `retired`)
+        self.folded: Dict[str, Dict[str, Any]] = {}      # node -> {"epoch", "at", "skus": {sku: [P, N]}}
+        self.forgotten_epoch = 0                         # highest epoch whose retired IDs were forgotten
+        self._retiring: Set[str] = set()
+        self._meta_lock = threading.Lock()
+        self._meta_dirty = False
+        self._meta_saved = 0.0
+        self._compact_lock = threading.Lock()
+        self.gc_stats = {"compactions": 0, "devices_retired": 0, "entries_reclaimed": 0, "approx_bytes_reclaimed": 0, "ids_forgotten": 0}
+        # itertools.count is atomic under the GIL: dots stay unique across shard locks
+        self._seq = itertools.count(1)
+        if data_dir:
+            self._recover(data_dir)
+        self.inventory = self.store.counter(DEFAULT_SKU)
         
-        # Init stock
-        self.inventory.inc("server-virginia", 100) # Initial Stock
+        # Init stock (only on a fresh store: a recovered one already holds it)
+        if not self.inventory.P:
+            self.store.inc(DEFAULT_SKU, "server-virginia", 100) # Initial Stock
+
+    # --- Persistence ---
+
+    def _recover(self, data_dir: str):
+        persistence = CRDTPersistence(data_dir)
+        max_seq = 0
+
+        def apply(sku_id: str, entries: List[Entry], removed: List[Tuple[str, str]]):
+            nonlocal max_seq
+            for _, _, _, dot in entries:
+                if dot and dot[0] == self.replica_id and dot[1] > max_seq:
+                    max_seq = dot[1]
+            self.store.restore(sku_id, entries, removed)
+
+        def apply_squad(p: Dict[str, int], removed: List[str]):
+            self.squad_tracker.merge(p)
+            for node in removed:
+                self.squad_tracker.P.pop(node, None)
 
-    def handle_sync(self, node_id: str, p_deltas: Dict, n_deltas: Dict, timestamp: Dict):
+        meta = persistence.load_meta()
+        self.epoch = meta.get("epoch", self.epoch)
+        self.retired = meta.get("retired", {})
+        self.replicas = meta.get("replicas", {})
+        self.folded = meta.get("folded", {})
+        self.forgotten_epoch = meta.get("forgotten_epoch", 0)
+        self.tombstones = set(meta.get("tombstones", ())) | set(self.retired) | set(self.folded)
+        self.store.retired = set(self.tombstones)
+
+        snapshot = persistence.load_snapshot()
+        if snapshot is not None:
+            # Replayed SKUs must start from their snapshot state, so install the base first
+            self.store.base = snapshot
+            self.squad_tracker.merge(snapshot.squad)
+            max_seq = snapshot.max_seqs.get(self.replica_id, 0)
+        persistence.replay(apply, apply_squad)
+        # Continue after every dot a client may already hold in its version vector
+        self._seq = itertools.count(max_seq + 1)
+
+        persistence.on_checkpoint = self.checkpoint
+        self.store.journal = persistence.append
+        self.persistence = persistence
+        print(f"[CRDT] Recovered {len(self.store)} SKUs in {persistence.stats['recovery_ms']}ms")
+
+    def checkpoint(self):
+        """Compacts the delta log into a new snapshot (runs off the request path)."""
+        if self.persistence is None:
+            return
+        generation = self.persistence.rotate()
+        self.persistence.write_snapshot(generation, dict(self.squad_tracker.P), self.store.snapshot_blocks())
+        self.store.base = self.persistence.snapshot
+        if self._meta_dirty:
+            self._save_meta()
+
+    def close(self):
+        if self.persistence is not None:
+            if self._meta_dirty:
+                self._save_meta()
+            self.persistence.close()
+
+    def _save_meta(self):
+        if self.persistence is None:
+            return
+        with self._meta_lock:
+            self._meta_dirty = False
+            self._meta_saved = time.time()
+            self.persistence.save_meta({
+                "epoch": self.epoch,
+                "retired": dict(self.retired),
+                "replicas": {node: dict(replica) for node, replica in list(self.replicas.items())},
+                "folded": dict(self.folded),
+                "forgotten_epoch": self.forgotten_epoch,
+                "tombstones": sorted(self.tombstones),
+            })
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "skus": len(self.store),
+            "shards": len(self.store.shards),
+            "persistence": self.persistence.metrics() if self.persistence else None,
+            "device_gc": {**self.gc_stats, "epoch": self.epoch, "replicas": len(self.replicas), "retired_pending_ack": len(self.retired), "tombstones": len(self.tombstones)},
+        }
+
+    # --- Device-ID garbage collection ---
+
+    def _observe(self, node_id: str, epoch: int) -> bool:
+        """
+        Records a sync from `node_id` and the compaction epoch it has applied.
+        False if the device must reset because its entries were folded: its ID is tombstoned, or
+        it is unknown and claims an epoch from before IDs were forgotten. Any other unknown
+        device (e.g. after an in-memory server restart, which also lost every count) is
+        registered and its state accepted.
+        """
+        if node_id in self.tombstones:
+            return False
+        now = time.time()
+        replica = self.replicas.get(node_id)
+        if replica is None:
+            if 0 < epoch < self.forgotten_epoch:
+                return False
+            # A new device holds no entries of anything retired so far; a re-registering one
+            # still has to acknowledge every epoch after the one it claims
+            replica = self.replicas[node_id] = {"seen": now, "epoch": min(epoch, self.epoch) if epoch else self.epoch}
+            self._save_meta()
+        replica["seen"] = now
+        if epoch > replica["epoch"]:
+            replica["epoch"] = min(epoch, self.epoch)
+        self._meta_dirty = True
+        if self.persistence is not None and now - self._meta_saved > CRDT_META_SAVE_INTERVAL:
+            self._save_meta()
+        return True
+
+    def _reset_reply(self, node_id: str) -> Dict[str, Any]:
+        """
+        RESET_REQUIRED plus the device's folded entries: local value minus these is unsynced.
+        `folded` is None once the record expired; the device can then only drop its entries.
+        """
+        record = self.folded.get(node_id)
+        return {
+            "status": "RESET_REQUIRED",
+            "server_ts": self.clock.now().to_dict(),
+            "folded": {sku: {"p": pn[0], "n": pn[1]} for sku, pn in record["skus"].items()} if record else None,
+        }
+
+    def _compaction_notice(self, epoch: int) -> Optional[Dict[str, Any]]:
+        """Tells a device which IDs to drop locally before it acknowledges `epoch`."""
+        if epoch >= self.epoch:
+            return None
+        # compact() may be updating `retired` from a worker thread: iterate a snapshot
+        return {"epoch": self.epoch, "retired": [node for node, e in list(self.retired.items()) if e > epoch]}
+
+    def retire_device(self, node_id: str):
+        """Marks a decommissioned device; its entries are folded at the next compact()."""
+        if node_id not in (self.replica_id, BASE_NODE):
+            self._retiring.add(node_id)
+
+    def compact(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Folds the entries of retired devices (explicitly retired, or not seen for `device_ttl`)
+        into BASE_NODE, so P/N width tracks active devices rather than every device ever seen.
+
+        Causal safety:
+        1. Retired IDs go into a new epoch and are filtered from every later merge before the
+           fold, so a stale copy relayed by another client can't be re-added on top of the base.
+        2. Syncs carry the epoch a device has applied; replies list the IDs it still has to drop.
+        3. An ID leaves the compaction notices only once every live replica has acknowledged
+           its epoch. Replicas that stop syncing are themselves retired after `device_ttl`.
+        4. Its tombstone is never dropped, so the ID stays filtered and a device returning
+           with it is reset, however long it was away.
+        """
+        with self._compact_lock:
+            now = time.time() if now is None else now
+            # Syncs keep registering replicas on the event loop while this runs in a worker thread
+            stale = {node for node, replica in list(self.replicas.items()) if now - replica["seen"] > self.device_ttl}
+            retiring = (self._retiring | stale) - {self.replica_id, BASE_NODE}
+            self._retiring.clear()
+
+            report: Dict[str, Any] = {"retired": len(retiring), "skus_touched": 0, "entries_reclaimed": 0, "approx_bytes_reclaimed": 0}
+            if retiring:
+                self.epoch += 1
+                for node in retiring:
+                    self.retired[node] = self.epoch
+                    self.replicas.pop(node, None)
+                self.tombstones |= retiring
+                # Filter first, then fold; persist the filter before the fold is logged
+                self.store.retired = set(self.tombstones)
+                self._save_meta()
+                folded: Dict[str, Dict[str, List[int]]] = {}
+                report.update(self.store.fold_many(retiring, folded))
+                for node in retiring:
+                    self.folded[node] = {"epoch": self.epoch, "at": now, "skus": folded.get(node, {})}
+                removed = self.squad_tracker.fold(retiring)
+                if removed and self.persistence is not None:
+                    self.persistence.append(None, {BASE_NODE: self.squad_tracker.P[BASE_NODE]}, removed)
+
+            floor = min((replica["epoch"] for replica in list(self.replicas.values())), default=self.epoch)
+            forgotten = [node for node, epoch in self.retired.items() if epoch <= floor]
+            for node in forgotten:
+                self.forgotten_epoch = max(self.forgotten_epoch, self.retired.pop(node))
+            expired = [node for node, record in self.folded.items() if now - record["at"] > self.device_ttl and node not in self.retired]
+            for node in expired:
+                del self.folded[node]
+            if retiring or forgotten or expired:
+                self._save_meta()
+
+            report.update({"epoch": self.epoch, "forgotten": len(forgotten), "pending_ack": len(self.retired)})
+            self.gc_stats["compactions"] += 1
+            self.gc_stats["devices_retired"] += len(retiring)
+            self.gc_stats["entries_reclaimed"] += report["entries_reclaimed"]
+            self.gc_stats["approx_bytes_reclaimed"] += report["approx_bytes_reclaimed"]
+            self.gc_stats["ids_forgotten"] += len(forgotten)
+            print(
+                f"[CRDT] Compaction epoch {self.epoch}: retired {len(retiring)} devices, "
+                f"reclaimed {report['entries_reclaimed']} entries (~{report['approx_bytes_reclaimed']} bytes)"
+            )
+            return report
+
+    def _stamp(self) -> Dot:
+        return (self.replica_id, next(self._seq))
+
+    def handle_sync(self, node_id: str, p_deltas: Dict, n_deltas: Dict, timestamp: Dict, epoch: int = 0):
         """
         Receives sync from offline client (Samsung Tab).
+        Legacy full-state protocol: returns every entry of the default SKU on each call.
         """
         # 1. Update Clock
         self.clock.update(timestamp)
+        if not self._observe(node_id, epoch):
+            return self._reset_reply(node_id)
         
         # 2. Merge Data
-        self.inventory.merge(p_deltas, n_deltas)
+        self.store.merge_many({DEFAULT_SKU: (p_deltas, n_deltas)})
         
         # 3. Return converged state
+        with self.store.locked(DEFAULT_SKU):
+            p_state, n_state = dict(self.inventory.P), dict(self.inventory.N)
         return {
             "status": "CONVERGED",
             "current_stock": self.inventory.value(),
-            "server_ts": self.clock.now(),
-            "p_state": self.inventory.P,
-            "n_state": self.inventory.N
+            "server_ts": self.clock.now().to_dict(),
+            "p_state": p_state,
+            "n_state": n_state,
+            "compaction": self._compaction_notice(epoch)
         }
 
+    def sync_deltas(self, node_id: str, timestamp: Dict, skus: Dict[str, Dict[str, Any]], epoch: int = 0) -> Dict[str, Any]:
+        """
+        Delta-state sync for many SKUs in one round trip.
+        Per SKU the client sends its changed entries (`p`/`n`) and the version vector it last
+        received (`since`); the reply carries only entries newer than that vector, minus the
+        ones the client just sent, plus the new vector to send next time.
+        `epoch` is the last compaction epoch the client has applied (0 for a new device).
+        """
+        self.clock.update(timestamp)
+        if not self._observe(node_id, epoch):
+            return self._reset_reply(node_id)
+        result = self.store.sync_many(skus)
+        return {"status": "CONVERGED", "server_ts": self.clock.now().to_dict(), "skus": result, "compaction": self._compaction_notice(epoch)}
+
+    def stock_levels(self, sku_ids: List[str]) -> Dict[str, int]:
+        return self.store.values(sku_ids)
+
 crdt_service = CRDTService()
@@ -1,10 +1,16 @@
-import httpx
+import json
 import os
+import re
+import time
 import asyncio
-from typing import List, Dict, Any
-
-# Mock Gemini Service import if not available
-# from app.services.gemini import GeminiService
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.core.http_pool import http_pool
+from app.services.gemini import GeminiService, EmbeddingError
+from app.services.product_search import product_search
+from app.services.vector_index import product_vector_index
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -35,46 +41,373 @@ class DNAGenerator:
         # 2. Analyze (Mocking Gemini call for now)
         summary = f"User has viewed {len(signals)} items. Prefers Electronics and fast delivery."
         
-        # 3. Embedding (Mocking 1536 dim vector)
-        fake_embedding = [0.01] * 1536 
+        # 3. Embedding (content-hash cached: an unchanged summary is not re-embedded)
+        try:
+            embedding = await asyncio.to_thread(GeminiService.generate_embedding, summary, "retrieval_query")
+            # user_dna.embedding is vector(1536); text-embedding-004 returns 768 dims
+            embedding = embedding + [0.0] * (1536 - len(embedding))
+        except EmbeddingError as e:
+            print(f"DNA embedding skipped for {user_id}: {e}")
+            embedding = None
 
         # 4. Upsert DNA
-        await DNAGenerator._upsert_dna(user_id, summary, fake_embedding)
+        await DNAGenerator._upsert_dna(user_id, summary, embedding)
         print(f"DNA updated for {user_id}")
 
     @staticmethod
     async def _fetch_recent_signals(user_id: str) -> List[Dict[str, Any]]:
         if not SUPABASE_URL: return []
         
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(
-                    f"{SUPABASE_URL}/rest/v1/browsing_signals?user_id=eq.{user_id}&order=created_at.desc&limit=50",
-                    headers=HEADERS
-                )
-                if resp.status_code == 200:
-                    return resp.json()
-            except:
-                pass
+        try:
+            resp = await http_pool.get(
+                f"{SUPABASE_URL}/rest/v1/browsing_signals?user_id=eq.{user_id}&order=created_at.desc&limit=50",
+                headers=HEADERS
+            )
+            if resp.status_code == 200:
+                return resp.json()
+        except:
+            pass
         return []
 
     @staticmethod
-    async def _upsert_dna(user_id: str, summary: str, embedding: List[float]):
+    async def _upsert_dna(user_id: str, summary: str, embedding: Optional[List[float]]):
         if not SUPABASE_URL: return
 
-        payload = {
-            "user_id": user_id,
-            "dna_summary": summary,
-            "embedding": embedding # pgvector format usually handled by library or raw string in REST
-        }
+        payload = {"user_id": user_id, "dna_summary": summary}
+        if embedding is not None:
+            # Keep the previous vector rather than overwrite it after a failed embedding call
+            payload["embedding"] = embedding # pgvector format usually handled by library or raw string in REST
         
         # Supabase REST upsert
-        async with httpx.AsyncClient() as client:
-            try:
-                await client.post(
-                    f"{SUPABASE_URL}/rest/v1/user_dna",
-                    headers={**HEADERS, "Prefer": "resolution=merge-duplicates"},
-                    json=payload
-                )
-            except Exception as e:
-                print(f"DNA Write error: {e}")
+        try:
+            # Upsert is idempotent, so it is safe to replay on transient failures
+            await http_pool.post(
+                f"{SUPABASE_URL}/rest/v1/user_dna",
+                headers={**HEADERS, "Prefer": "resolution=merge-duplicates"},
+                json=payload,
+                idempotent=True
+            )
+        except Exception as e:
+            print(f"DNA Write error: {e}")
+
+    @staticmethod
+    async def _fetch_dna_batch(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Existing `user_dna` rows for these users, keyed by user_id (raises on failure)."""
+        if not SUPABASE_URL or not user_ids:
+            return {}
+        resp = await http_pool.get(
+            f"{SUPABASE_URL}/rest/v1/user_dna?select=user_id,dna_summary,embedding,updated_at"
+            f"&user_id=in.({','.join(user_ids)})",
+            headers=HEADERS
+        )
+        resp.raise_for_status()
+        return {row["user_id"]: row for row in resp.json()}
+
+    @staticmethod
+    async def _upsert_dna_batch(rows: List[Dict[str, Any]]):
+        """One PostgREST upsert for many users (rows must share the same keys)."""
+        if not SUPABASE_URL or not rows:
+            return
+        # PostgREST bulk upserts need uniform keys: split rows with and without an embedding
+        for group in ([r for r in rows if "embedding" in r], [r for r in rows if "embedding" not in r]):
+            if not group:
+                continue
+            resp = await http_pool.post(
+                f"{SUPABASE_URL}/rest/v1/user_dna",
+                headers={**HEADERS, "Prefer": "resolution=merge-duplicates,return=minimal"},
+                json=group,
+                idempotent=True
+            )
+            resp.raise_for_status()
+
+
+# --- Incremental DNA ---
+
+DNA_DIMS = 1536                      # user_dna.embedding is vector(1536)
+DNA_RECOMPUTE_EVERY = int(os.getenv("DNA_RECOMPUTE_EVERY", "10"))          # new signals per fold
+DNA_DEBOUNCE_SECONDS = float(os.getenv("DNA_DEBOUNCE_SECONDS", "5"))       # per-user quiet period
+DNA_HALF_LIFE_SECONDS = float(os.getenv("DNA_HALF_LIFE_SECONDS", str(7 * 24 * 3600)))
+DNA_FLUSH_INTERVAL = float(os.getenv("DNA_FLUSH_INTERVAL", "2"))
+DNA_MAX_USERS = int(os.getenv("DNA_MAX_USERS", "50000"))
+DNA_SEED_MASS = float(os.getenv("DNA_SEED_MASS", "10"))  # weight of a persisted DNA row when blended in
+
+# How much one event says about taste
+EVENT_WEIGHTS = {"view": 1.0, "click": 1.5, "dwell": 2.0, "add_to_cart": 3.0, "purchase": 4.0, "scroll": 0.25}
+PRODUCT_PATH = re.compile(r"/products/([0-9a-fA-F-]{36})")
+ENGINE_SUMMARY = re.compile(r"User has interacted with (\d+) items\.(?: Prefers (.+)\.)?$")
+
+
+def signal_product_id(signal: Dict[str, Any]) -> Optional[str]:
+    if signal.get("product_id"):
+        return signal["product_id"]
+    match = PRODUCT_PATH.search(str((signal.get("metadata") or {}).get("path") or ""))
+    return match.group(1) if match else None
+
+
+def signal_weight(signal: Dict[str, Any]) -> float:
+    weight = EVENT_WEIGHTS.get(signal.get("event_type"), 0.5)
+    if signal.get("event_type") == "dwell":
+        # Longer dwell = stronger interest, saturating after a minute
+        seconds = float((signal.get("metadata") or {}).get("duration_seconds") or 0)
+        weight *= min(1.0, seconds / 60) + 0.25
+    return weight
+
+
+def _parse_vector(value: Any) -> Optional[np.ndarray]:
+    # PostgREST returns pgvector columns as "[0.1,0.2,...]"
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32) if value else None
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() if value else None
+    except ValueError:
+        return None
+
+
+class UserDNAState:
+    __slots__ = ("vector", "mass", "categories", "signals", "updated_at", "pending", "seeded", "base_summary")
+
+    def __init__(self, dims: int):
+        self.vector = np.zeros(dims, dtype=np.float32)   # decayed, weighted sum of product vectors
+        self.mass = 0.0                                  # decayed sum of weights
+        self.categories: Counter = Counter()
+        self.signals = 0
+        self.updated_at = time.time()
+        self.pending: List[Dict[str, Any]] = []
+        self.seeded = False               # persisted user_dna row blended in yet?
+        self.base_summary: Optional[str] = None
+
+    def seed(self, row: Dict[str, Any], seed_mass: float, half_life: float, now: float):
+        """
+        Blends a persisted `user_dna` row in as prior history, decayed by its age, so a
+        restart or eviction never replaces the stored DNA with post-restart signals only.
+        """
+        self.seeded = True
+        age = max(0.0, now - (_parse_time(row.get("updated_at")) or now))
+        mass = seed_mass * 0.5 ** (age / half_life)
+        prior = _parse_vector(row.get("embedding"))
+        if prior is not None and mass > 0:
+            n = min(len(prior), len(self.vector))
+            norm = np.linalg.norm(prior[:n])
+            if norm:
+                self.vector[:n] += prior[:n] / norm * mass
+                self.mass += mass
+        summary = row.get("dna_summary") or ""
+        match = ENGINE_SUMMARY.match(summary)
+        if match:
+            # Our own summary: carry the counts and preferences forward
+            self.signals += int(match.group(1))
+            for rank, category in enumerate((match.group(2) or "").split(", ")):
+                if category:
+                    self.categories[category] += mass / (rank + 1)
+        elif summary:
+            self.base_summary = summary  # a richer (e.g. LLM-written) summary is kept
+
+    def embedding(self) -> List[float]:
+        norm = np.linalg.norm(self.vector)
+        return (self.vector / norm if norm else self.vector).tolist()
+
+
+class IncrementalDNAEngine:
+    """
+    Running user DNA instead of a 50-signal refetch per update.
+    - Signals accumulate per user; after `every` new ones (and a `debounce` quiet period, so a
+      scroll burst folds once) they are folded into a decayed weighted sum:
+          v <- v * 0.5 ** (dt / half_life) + sum(w_i * product_vector_i)
+      Product vectors come from the in-process product index, so a fold is pure NumPy.
+    - Changed users are upserted to `user_dna` in one bulk request every `flush_interval`.
+    """
+    def __init__(
+        self,
+        every: int = DNA_RECOMPUTE_EVERY,
+        debounce: float = DNA_DEBOUNCE_SECONDS,
+        half_life: float = DNA_HALF_LIFE_SECONDS,
+        flush_interval: float = DNA_FLUSH_INTERVAL,
+        max_users: int = DNA_MAX_USERS,
+    ):
+        self.every = every
+        self.debounce = debounce
+        self.half_life = half_life
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+        self.users: "OrderedDict[str, UserDNAState]" = OrderedDict()
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        self._dirty: set = set()
+        # Evicted users whose folds are not persisted yet; flushed (or revived) before they go
+        self._retiring: Dict[str, UserDNAState] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"signals": 0, "folds": 0, "folded_signals": 0, "upserts": 0, "upserted_users": 0, "evicted": 0}
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        for handle in self._scheduled.values():
+            handle.cancel()
+        for user_id in list(self._scheduled):
+            self.fold(user_id)
+        self._scheduled.clear()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    # --- Ingestion ---
+
+    def observe(self, user_id: str, signal: Dict[str, Any]):
+        """O(1) on the request path: record the signal, maybe schedule a debounced fold."""
+        self.stats["signals"] += 1
+        state = self._state(user_id)
+        state.pending.append(signal)
+        if len(state.pending) >= self.every and user_id not in self._scheduled:
+            loop = asyncio.get_running_loop()
+            self._scheduled[user_id] = loop.call_later(self.debounce, self._fold_scheduled, user_id)
+            if self._flusher is None or self._flusher.done():
+                loop.create_task(self.start())
+
+    def _state(self, user_id: str) -> UserDNAState:
+        state = self.users.get(user_id)
+        if state is None:
+            state = self._retiring.pop(user_id, None) or UserDNAState(DNA_DIMS)
+            self.users[user_id] = state
+            while len(self.users) > self.max_users:
+                self._evict()
+        else:
+            self.users.move_to_end(user_id)
+        return state
+
+    def _evict(self):
+        user_id, state = self.users.popitem(last=False)
+        handle = self._scheduled.pop(user_id, None)
+        if handle is not None:
+            handle.cancel()
+        # Unfolded signals are folded now; anything unflushed waits in _retiring for flush()
+        self._fold_state(user_id, state)
+        if user_id in self._dirty:
+            self._retiring[user_id] = state
+        self.stats["evicted"] += 1
+
+    def _fold_scheduled(self, user_id: str):
+        self._scheduled.pop(user_id, None)
+        self.fold(user_id)
+
+    def fold(self, user_id: str, now: Optional[float] = None):
+        state = self.users.get(user_id)
+        if state is not None:
+            self._fold_state(user_id, state, now)
+
+    def _fold_state(self, user_id: str, state: UserDNAState, now: Optional[float] = None):
+        if not state.pending:
+            return
+        now = now or time.time()
+        pending, state.pending = state.pending, []
+
+        # 1. Decay what we knew
+        decay = 0.5 ** (max(0.0, now - state.updated_at) / self.half_life)
+        state.vector *= decay
+        state.mass *= decay
+        for category in state.categories:
+            state.categories[category] *= decay
+
+        # 2. Add the delta (signals whose product has an embedding)
+        snap = product_vector_index.snapshot
+        rows, weights = [], []
+        for signal in pending:
+            product_id = signal_product_id(signal)
+            if product_id is None or product_id not in snap.positions:
+                continue
+            rows.append(snap.positions[product_id])
+            weights.append(signal_weight(signal))
+            category = (product_search.docs.get(product_id) or {}).get("category")
+            if category:
+                state.categories[category] += weights[-1]
+
+        if rows:
+            delta = np.asarray(weights, dtype=np.float32) @ snap.matrix[rows]
+            n = min(len(delta), len(state.vector))
+            state.vector[:n] += delta[:n]
+            state.mass += float(sum(weights))
+
+        state.signals += len(pending)
+        state.updated_at = now
+        self._dirty.add(user_id)
+        self.stats["folds"] += 1
+        self.stats["folded_signals"] += len(pending)
+
+    def summary(self, state: UserDNAState) -> str:
+        if state.base_summary:
+            return state.base_summary
+        top = [c for c, _ in state.categories.most_common(3)]
+        prefers = f" Prefers {', '.join(top)}." if top else ""
+        return f"User has interacted with {state.signals} items.{prefers}"
+
+    # --- Persistence ---
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        retiring, self._retiring = self._retiring, {}
+        states = {}
+        for user_id in dirty:
+            state = self.users.get(user_id) or retiring.get(user_id)
+            if state is not None:
+                states[user_id] = state
+        try:
+            await self._seed({user_id: state for user_id, state in states.items() if not state.seeded})
+        except Exception as e:
+            print(f"DNA seed read error: {e}")
+            self._requeue(dirty, retiring)  # never upsert over a row we could not read
+            return
+
+        rows = []
+        for user_id, state in states.items():
+            row = {"user_id": user_id, "dna_summary": self.summary(state), "updated_at": datetime.utcnow().isoformat()}
+            if state.mass > 0:
+                row["embedding"] = state.embedding()
+            rows.append(row)
+        try:
+            await DNAGenerator._upsert_dna_batch(rows)
+            self.stats["upserts"] += 1
+            self.stats["upserted_users"] += len(rows)
+        except Exception as e:
+            print(f"DNA batch write error: {e}")
+            self._requeue(dirty, retiring)  # retry on the next tick
+
+    def _requeue(self, dirty: set, retiring: Dict[str, UserDNAState]):
+        self._dirty |= dirty
+        for user_id, state in retiring.items():
+            if user_id not in self.users:
+                self._retiring.setdefault(user_id, state)
+
+    async def _seed(self, states: Dict[str, UserDNAState]):
+        if not states:
+            return
+        existing = await DNAGenerator._fetch_dna_batch(list(states))
+        now = time.time()
+        for user_id, state in states.items():
+            row = existing.get(user_id)
+            if row is None:
+                state.seeded = True
+            else:
+                state.seed(row, DNA_SEED_MASS, self.half_life, now)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats, "users": len(self.users), "pending_folds": len(self._scheduled),
+            "dirty": len(self._dirty), "retiring": len(self._retiring),
+        }
+
+
+dna_engine = IncrementalDNAEngine()
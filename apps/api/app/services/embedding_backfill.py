@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.http_pool import http_pool
+from app.services.gemini import GeminiService
+from app.services.vector_index import product_vector_index
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+HEADERS = {
+    "apikey": SUPABASE_KEY or "",
+    "Authorization": f"Bearer {SUPABASE_KEY or ''}",
+    "Content-Type": "application/json"
+}
+
+BACKFILL_PAGE_SIZE = int(os.getenv("EMBEDDING_BACKFILL_PAGE_SIZE", "500"))
+BACKFILL_BATCH_SIZE = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "100")) # texts per embed call
+BACKFILL_CONCURRENCY = int(os.getenv("EMBEDDING_BACKFILL_CONCURRENCY", "4")) # embed calls in flight
+BACKFILL_CHECKPOINT = os.getenv("EMBEDDING_BACKFILL_CHECKPOINT", ".embedding_backfill.json")
+
+
+class EmbeddingBackfillJob:
+    """
+    Resumable product-embedding backfill.
+    1. Keyset-scan products with `embedding IS NULL`, ordered by id.
+    2. Embed each page in batches, several batches in flight, with the sync SDK off the event loop.
+    3. Write the page back with one bulk RPC (`bulk_set_product_embeddings`).
+    4. Checkpoint the last id so a restart resumes where it stopped.
+    """
+    def __init__(
+        self,
+        checkpoint_path: str = BACKFILL_CHECKPOINT,
+        page_size: int = BACKFILL_PAGE_SIZE,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        concurrency: int = BACKFILL_CONCURRENCY,
+    ):
+        self.checkpoint_path = checkpoint_path
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.running = False
+        self._elapsed_base = 0.0
+        self.progress: Dict[str, Any] = self._load_checkpoint()
+
+    # --- Public API ---
+
+    async def run(self, resume: bool = True) -> Dict[str, Any]:
+        if self.running:
+            return {"status": "already_running", **self.progress}
+        if not SUPABASE_URL:
+            return {"status": "skipped", "message": "SUPABASE_URL not configured"}
+
+        self.running = True
+        if not resume or self.progress.get("completed"):
+            self.progress = self._fresh_progress()
+
+        started = time.perf_counter()
+        self._elapsed_base = self.progress["elapsed_sec"]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while True:
+                products = await self._fetch_page(self.progress["last_id"])
+                if not products:
+                    self.progress["completed"] = True
+                    break
+
+                batches = [products[i:i + self.batch_size] for i in range(0, len(products), self.batch_size)]
+                results = await asyncio.gather(*[self._embed_batch(b, semaphore) for b in batches])
+
+                rows = [row for batch_rows in results for row in batch_rows]
+                if rows:
+                    await self._bulk_update(rows)
+
+                self.progress["processed"] += len(rows)
+                self.progress["failed"] += len(products) - len(rows)
+                self.progress["last_id"] = products[-1]["id"]
+                self._record_throughput(started)
+                self._save_checkpoint()
+                print(
+                    f"[Backfill] {self.progress['processed']} embedded, {self.progress['failed']} failed "
+                    f"({self.progress['products_per_sec']} products/s)"
+                )
+        finally:
+            self.running = False
+            self._record_throughput(started)
+            self._save_checkpoint()
+            if self.progress["processed"]:
+                product_vector_index.mark_stale()
+
+        return {"status": "completed", **self.progress}
+
+    def status(self) -> Dict[str, Any]:
+        return {"running": self.running, **self.progress}
+
+    # --- Pipeline stages ---
+
+    async def _fetch_page(self, after_id: Optional[str]) -> List[Dict[str, Any]]:
+        params = {
+            "select": "id,title,description",
+            "embedding": "is.null",
+            "order": "id.asc",
+            "limit": str(self.page_size),
+        }
+        if after_id:
+            params["id"] = f"gt.{after_id}"
+        resp = await http_pool.get(f"{SUPABASE_URL}/rest/v1/products", headers=HEADERS, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _embed_batch(self, products: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        texts = [f"{p.get('title') or ''}: {p.get('description') or ''}" for p in products]
+        async with semaphore:
+            try:
+                # google-generativeai is synchronous: keep it off the event loop
+                embeddings = await asyncio.to_thread(GeminiService.generate_embeddings, texts)
+            except Exception as e:
+                print(f"[Backfill] Embedding batch failed ({len(texts)} products): {e}")
+                return []
+        return [{"id": p["id"], "embedding": emb} for p, emb in zip(products, embeddings)]
+
+    async def _bulk_update(self, rows: List[Dict[str, Any]]):
+        resp = await http_pool.post(
+            f"{SUPABASE_URL}/rest/v1/rpc/bulk_set_product_embeddings",
+            headers=HEADERS,
+            json={"p_rows": rows},
+            idempotent=True
+        )
+        resp.raise_for_status()
+
+    # --- Checkpointing ---
+
+    @staticmethod
+    def _fresh_progress() -> Dict[str, Any]:
+        return {"last_id": None, "processed": 0, "failed": 0, "elapsed_sec": 0.0, "products_per_sec": 0.0, "completed": False}
+
+    def _record_throughput(self, started: float):
+        # elapsed_sec accumulates across resumed runs
+        self.progress["elapsed_sec"] = round(self._elapsed_base + time.perf_counter() - started, 2)
+        if self.progress["elapsed_sec"]:
+            self.progress["products_per_sec"] = round(self.progress["processed"] / self.progress["elapsed_sec"], 2)
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path) as f:
+                return {**self._fresh_progress(), **json.load(f)}
+        except (OSError, ValueError):
+            return self._fresh_progress()
+
+    def _save_checkpoint(self):
+        state = {**self.progress}
+        state["updated_at"] = datetime.utcnow().isoformat()
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.checkpoint_path)
+        except OSError as e:
+            print(f"[Backfill] Could not write checkpoint: {e}")
+
+
+embedding_backfill = EmbeddingBackfillJob()
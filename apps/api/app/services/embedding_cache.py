@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite3")
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_zero_vector(vector: Iterable[float]) -> bool:
+    return not any(vector)
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store keyed by (model, task_type, sha256(text)).
+    - SQLite file, so entries survive restarts and are shared by backfills, recommendations and DNA jobs.
+    - Vectors are stored as packed float32 (~3KB per 768-dim row instead of ~15KB of JSON).
+    - Only real API results are stored: failures are never cached, and all-zero vectors
+      (the old failure sentinel) are refused, so a hit is always a genuine embedding.
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "rejected": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Embedding calls run in worker threads (asyncio.to_thread), so share one
+            # connection across threads and serialize access with our own lock.
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, task_type TEXT NOT NULL, digest TEXT NOT NULL,"
+                " dims INTEGER NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, task_type, digest))"
+            )
+        return self._conn
+
+    def get_many(self, model: str, task_type: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Returns {text: vector} for the texts already cached."""
+        digests = {text_digest(t): t for t in texts}
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            db = self._db()
+            keys = list(digests)
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = db.execute(
+                    f"SELECT digest, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                    f"AND digest IN ({','.join('?' * len(chunk))})",
+                    [model, task_type, *chunk]
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digests[digest]] = array("f", blob).tolist()
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(set(texts)) - len(found)
+        return found
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, task_type, [text]).get(text)
+
+    def put_many(self, model: str, task_type: str, items: Dict[str, List[float]]):
+        rows = []
+        for text, vector in items.items():
+            if is_zero_vector(vector):
+                self.stats["rejected"] += 1
+                continue
+            rows.append((model, task_type, text_digest(text), len(vector), array("f", vector).tobytes()))
+        if not rows:
+            return
+        with self._lock:
+            db = self._db()
+            db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            db.commit()
+            self.stats["writes"] += len(rows)
+
+    def put(self, model: str, task_type: str, text: str, vector: List[float]):
+        self.put_many(model, task_type, {text: vector})
+
+    def metrics(self) -> Dict[str, float]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_cache = EmbeddingCache()
@@ -1,28 +1,110 @@
 import google.generativeai as genai
 import os
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
+from app.services.embedding_cache import embedding_cache
+from app.services.prompt_cache import prompt_cache, Completion, usage_of
 
 # Configure Gemini
 api_key = os.environ.get("GOOGLE_API_KEY")
 if api_key:
     genai.configure(api_key=api_key)
 
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+_models: Dict[str, "genai.GenerativeModel"] = {}
+
+def get_model(name: str) -> "genai.GenerativeModel":
+    """GenerativeModel instances are reused across calls instead of rebuilt per request."""
+    model = _models.get(name)
+    if model is None:
+        model = _models[name] = genai.GenerativeModel(name)
+    return model
+
+async def complete(model_name: str, prompt: str) -> str:
+    """
+    Text completion through the prompt cache: identical (model, prompt) pairs are served
+    from cache or coalesced onto the in-flight upstream call.
+    """
+    async def call() -> Completion:
+        response = await get_model(model_name).generate_content_async(prompt)
+        return Completion(response.text, *usage_of(response))
+    return await prompt_cache.complete(model_name, prompt, call)
+
+class EmbeddingError(RuntimeError):
+    """The embedding API call failed; distinct from a (cached) genuine vector."""
+
+def _embed_uncached(texts: List[str], task_type: str) -> Dict[str, List[float]]:
+    """Embeds the texts missing from the cache in one API call and caches the results."""
+    missing = list(dict.fromkeys(texts))
+    if not missing:
+        return {}
+    if not api_key:
+        raise EmbeddingError("GOOGLE_API_KEY not configured")
+    kwargs = {"title": "Product Description"} if task_type == "retrieval_document" else {}
+    try:
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=missing, task_type=task_type, **kwargs)
+    except Exception as e:
+        raise EmbeddingError(f"Gemini Embedding Error: {e}") from e
+    vectors = dict(zip(missing, result['embedding']))
+    embedding_cache.put_many(EMBEDDING_MODEL, task_type, vectors)
+    return vectors
+
+JARVIS_IDENTITY = "I am Jarvis, your AI shopping assistant."
+CHAT_ERROR_REPLY = "Create a support ticket. My AI brain is currently overloaded."
+
+def _is_identity_question(query: str) -> bool:
+    return "who are you" in query.lower() or "your name" in query.lower()
+
+def _offline_chat_reply(query: str) -> str:
+    # Simulated "Smart" AI Response for Demo/Offline Mode
+    query_lower = query.lower()
+    if "hello" in query_lower or "hi" in query_lower or "who are you" in query_lower:
+        return "Hello! I am Jarvis, your AI shopping assistant. How can I help you today?"
+    elif "search" in query_lower or "find" in query_lower:
+        return f"I can certainly help you find '{query.replace('search for', '').replace('find', '').strip()}'. Checking our inventory now..."
+    elif "order" in query_lower:
+        return "I can help you track your recent orders. Please go to the 'My Orders' section for real-time updates."
+    elif "recommend" in query_lower:
+        return "Based on popular trends, I recommend checking out our new 'Holodeck' section for immersive shopping."
+    else:
+        return "That's an interesting question. While I'm currently in 'Offline Demo Mode', I can still help you navigate the store. Try asking me to search for products or check your cart."
+
+def _chat_prompt(query: str, context: str) -> str:
+    return f"""
+            You are "Jarvis", the advanced AI shopping assistant for Amazon-Alpha.
+            You have access to the system's documentation and live data.
+            
+            CONTEXT FROM KNOWLEDGE BASE:
+            {context}
+            
+            USER QUERY:
+            {query}
+            
+            INSTRUCTIONS:
+            - You are Jarvis. If asked who you are, ALWAYS answer "I am Jarvis, your AI shopping assistant."
+            - For product questions, answer based on the provided context.
+            - If the answer is not in the context, you can use your general knowledge to be helpful.
+            - Format your response in Markdown.
+            """
+
 class GeminiService:
     @staticmethod
-    def generate_embedding(text: str) -> List[float]:
-        if not api_key:
-            return [0.0] * 768
-        try:
-            result = genai.embed_content(
-                model="models/text-embedding-004",
-                content=text,
-                task_type="retrieval_document",
-                title="Product Description"
-            )
-            return result['embedding']
-        except Exception as e:
-            print(f"Gemini Embedding Error: {e}")
-            return [0.0] * 768
+    def generate_embedding(text: str, task_type: str = "retrieval_document") -> List[float]:
+        """
+        Cached by (model, task_type, sha256(text)): unchanged product text is never re-embedded.
+        Raises EmbeddingError on failure instead of returning a zero vector.
+        """
+        return GeminiService.generate_embeddings([text], task_type)[0]
+
+    @staticmethod
+    def generate_embeddings(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+        """
+        Batch variant: cache lookup first, then one API call for the misses only.
+        Raises EmbeddingError on failure, so callers never persist zero vectors.
+        """
+        vectors = embedding_cache.get_many(EMBEDDING_MODEL, task_type, texts)
+        vectors.update(_embed_uncached([t for t in texts if t not in vectors], task_type))
+        return [vectors[t] for t in texts]
 
     @staticmethod
     async def analyze_image(image_bytes: bytes, mime_type: str) -> Dict[str, str]:
@@ -30,7 +112,7 @@ class GeminiService:
             return {"query": "red running shoes", "description": "Offline Mode: Simulated Image Analysis"}
         
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
+            model = get_model('gemini-1.5-flash')
             
             image_part = {
                 "mime_type": mime_type,
@@ -64,48 +146,52 @@ class GeminiService:
     @staticmethod
     async def generate_chat_response(query: str, context: str) -> str:
         if not api_key:
-            # Simulated "Smart" AI Response for Demo/Offline Mode
-            query_lower = query.lower()
-            if "hello" in query_lower or "hi" in query_lower or "who are you" in query_lower:
-                return "Hello! I am Jarvis, your AI shopping assistant. How can I help you today?"
-            elif "search" in query_lower or "find" in query_lower:
-                return f"I can certainly help you find '{query.replace('search for', '').replace('find', '').strip()}'. Checking our inventory now..."
-            elif "order" in query_lower:
-                return "I can help you track your recent orders. Please go to the 'My Orders' section for real-time updates."
-            elif "recommend" in query_lower:
-                return "Based on popular trends, I recommend checking out our new 'Holodeck' section for immersive shopping."
-            else:
-                return "That's an interesting question. While I'm currently in 'Offline Demo Mode', I can still help you navigate the store. Try asking me to search for products or check your cart."
+            return _offline_chat_reply(query)
         
         try:
             # deterministic guardrail for identity
-            if "who are you" in query.lower() or "your name" in query.lower():
-                return "I am Jarvis, your AI shopping assistant."
+            if _is_identity_question(query):
+                return JARVIS_IDENTITY
 
-            model = genai.GenerativeModel('gemini-pro')
-            
-            prompt = f"""
-            You are "Jarvis", the advanced AI shopping assistant for Amazon-Alpha.
-            You have access to the system's documentation and live data.
-            
-            CONTEXT FROM KNOWLEDGE BASE:
-            {context}
-            
-            USER QUERY:
-            {query}
-            
-            INSTRUCTIONS:
-            - You are Jarvis. If asked who you are, ALWAYS answer "I am Jarvis, your AI shopping assistant."
-            - For product questions, answer based on the provided context.
-            - If the answer is not in the context, you can use your general knowledge to be helpful.
-            - Format your response in Markdown.
-            """
-            
-            response = await model.generate_content_async(prompt)
-            return response.text
+            return await complete('gemini-pro', _chat_prompt(query, context))
         except Exception as e:
             print(f"Gemini Chat Error: {e}")
-            return "Create a support ticket. My AI brain is currently overloaded."
+            return CHAT_ERROR_REPLY
+
+    @staticmethod
+    async def stream_chat_response(query: str, context: str) -> AsyncIterator[str]:
+        """
+        Same answer as generate_chat_response, yielded as Gemini produces it.
+        A cached answer is yielded in one piece; a completed stream is cached for next time.
+        Closing the generator (client disconnect) stops consuming the upstream stream.
+        """
+        if not api_key:
+            yield _offline_chat_reply(query)
+            return
+        if _is_identity_question(query):
+            yield JARVIS_IDENTITY
+            return
+
+        prompt = _chat_prompt(query, context)
+        cached = prompt_cache.peek('gemini-pro', prompt)
+        if cached is not None:
+            yield cached
+            return
+
+        parts: List[str] = []
+        try:
+            response = await get_model('gemini-pro').generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            print(f"Gemini Chat Stream Error: {e}")
+            if not parts:
+                yield CHAT_ERROR_REPLY
+            return
+        prompt_cache.store('gemini-pro', prompt, Completion("".join(parts), *usage_of(response)))
 
     @staticmethod
     async def generate_consultant_response(query: str, data_context: Dict[str, Any]) -> str:
@@ -113,8 +199,6 @@ class GeminiService:
             return "AI Consultant Offline. Configure GOOGLE_API_KEY."
         
         try:
-            model = genai.GenerativeModel('gemini-1.5-pro') # Using 1.5 Pro as requested
-            
             prompt = f"""
             You are an Expert E-Commerce Business Consultant for a specific vendor on Amazon-Alpha.
             You have access to the vendor's real-time performance data.
@@ -134,14 +218,11 @@ class GeminiService:
             - Format response in Markdown.
             """
             
-            response = await model.generate_content_async(prompt)
-            return response.text
+            return await complete('gemini-1.5-pro', prompt) # Using 1.5 Pro as requested
         except Exception as e:
             print(f"Gemini Consultant Error: {e}")
             # Fallback to standard model if 1.5-pro not available in tier
             try:
-                model = genai.GenerativeModel('gemini-pro')
-                response = await model.generate_content_async(prompt)
-                return response.text
+                return await complete('gemini-pro', prompt)
             except:
                 return "I'm having trouble analyzing your business data right now."
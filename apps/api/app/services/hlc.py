@@ -0,0 +1,151 @@
+import os
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Union
+
+HLC_MAX_OFFSET_MS = int(os.getenv("HLC_MAX_OFFSET_MS", "500"))  # remote clocks further ahead are not adopted
+
+LOGICAL_BITS = 16
+LOGICAL_MASK = (1 << LOGICAL_BITS) - 1
+_NS_PER_MS = 1_000_000
+_PACKED = struct.Struct(">Q")  # big-endian: byte order == timestamp order
+_tuple_new = tuple.__new__  # skips NamedTuple's Python-level __new__ on the hot path
+
+
+class HLCTimestamp(NamedTuple):
+    """
+    Immutable HLC timestamp: `packed` holds 48 bits of wall-clock milliseconds and a 16-bit
+    logical counter, so (packed, node) compares as the HLC total order with plain int/str
+    comparisons. A logical overflow simply carries into the next millisecond.
+    """
+    packed: int
+    node: str = ""
+
+    @property
+    def wall_ms(self) -> int:
+        return self.packed >> LOGICAL_BITS
+
+    @property
+    def logical(self) -> int:
+        return self.packed & LOGICAL_MASK
+
+    @classmethod
+    def of(cls, wall_ms: int, logical: int = 0, node: str = "") -> "HLCTimestamp":
+        return cls((wall_ms << LOGICAL_BITS) | logical, node)
+
+    # --- Binary: 8-byte big-endian packed value + UTF-8 node (bytewise sortable) ---
+
+    def to_bytes(self) -> bytes:
+        return _PACKED.pack(self.packed) + self.node.encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "HLCTimestamp":
+        return _tuple_new(cls, (_PACKED.unpack_from(raw)[0], raw[8:].decode("utf-8")))
+
+    # --- String: 16 hex digits + "@node" (lexicographically sortable) ---
+
+    def __str__(self) -> str:
+        return f"{self.packed:016x}@{self.node}"
+
+    @classmethod
+    def parse(cls, text: str) -> "HLCTimestamp":
+        packed, _, node = text.partition("@")
+        return _tuple_new(cls, (int(packed, 16), node))
+
+    # --- Legacy JSON shape {"p": ns, "l": logical, "n": node} used by sync clients ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"p": self.wall_ms * _NS_PER_MS, "l": self.logical, "n": self.node}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HLCTimestamp":
+        packed = (int(data.get("p", 0)) // _NS_PER_MS << LOGICAL_BITS) | min(int(data.get("l", 0)), LOGICAL_MASK)
+        return _tuple_new(cls, (packed, data.get("n", "")))
+
+    @classmethod
+    def coerce(cls, value: Union["HLCTimestamp", Dict[str, Any], str, bytes, int]) -> "HLCTimestamp":
+        if isinstance(value, HLCTimestamp):
+            return value
+        if isinstance(value, dict):
+            return cls.from_dict(value)
+        if isinstance(value, str):
+            return cls.parse(value)
+        if isinstance(value, (bytes, bytearray)):
+            return cls.from_bytes(bytes(value))
+        return cls(int(value))
+
+
+class HybridLogicalClock:
+    """
+    Hybrid Logical Clock (HLC).
+    Captures causality across distributed systems.
+    Works on the packed (wall_ms << 16 | logical) value, where both HLC rules reduce to a max:
+      send/local: max(last + 1, now << 16)
+      receive:    max(last + 1, remote + 1, now << 16)
+    The critical section is those few int ops: plain acquire()/release() (nothing in between
+    can raise), no allocation under the lock. `clock` returns nanoseconds (injectable for tests).
+    """
+    def __init__(self, node_id: str, clock: Callable[[], int] = time.time_ns, max_offset_ms: int = HLC_MAX_OFFSET_MS):
+        self.node_id = node_id
+        self._clock = clock
+        self.max_offset_ms = max_offset_ms
+        self._last = 0
+        self._lock = threading.Lock()
+        self.rejected_remote = 0
+
+    @property
+    def latest_phys(self) -> int:
+        return self._last >> LOGICAL_BITS
+
+    @property
+    def latest_logical(self) -> int:
+        return self._last & LOGICAL_MASK
+
+    def now_packed(self) -> int:
+        """Next timestamp as a bare int (hot paths that don't need the node)."""
+        physical = self._clock() // _NS_PER_MS << LOGICAL_BITS
+        lock = self._lock
+        lock.acquire()
+        last = self._last + 1
+        self._last = last = physical if physical > last else last
+        lock.release()
+        return last
+
+    def now(self) -> HLCTimestamp:
+        """Generates a new timestamp for a local event."""
+        physical = self._clock() // _NS_PER_MS << LOGICAL_BITS
+        lock = self._lock
+        lock.acquire()
+        last = self._last + 1
+        self._last = last = physical if physical > last else last
+        lock.release()
+        return _tuple_new(HLCTimestamp, (last, self.node_id))
+
+    def now_range(self, count: int) -> int:
+        """Reserves `count` consecutive timestamps in one step (batch commits); returns the first."""
+        physical = self._clock() // _NS_PER_MS << LOGICAL_BITS
+        lock = self._lock
+        lock.acquire()
+        first = self._last + 1
+        if physical > first:
+            first = physical
+        self._last = first + count - 1
+        lock.release()
+        return first
+
+    def update(self, remote_ts: Union[HLCTimestamp, Dict[str, Any], str, bytes, int]) -> HLCTimestamp:
+        """Updates local clock based on a received message timestamp; returns the receive event's timestamp."""
+        remote = remote_ts.packed if type(remote_ts) is HLCTimestamp else HLCTimestamp.coerce(remote_ts).packed
+        wall = self._clock() // _NS_PER_MS
+        if (remote >> LOGICAL_BITS) - wall > self.max_offset_ms:
+            # A clock this far ahead would drag ours with it for good: count it, don't adopt it
+            self.rejected_remote += 1
+            remote = 0
+        physical = wall << LOGICAL_BITS
+        lock = self._lock
+        lock.acquire()
+        last = (self._last if self._last > remote else remote) + 1
+        self._last = last = physical if physical > last else last
+        lock.release()
+        return _tuple_new(HLCTimestamp, (last, self.node_id))
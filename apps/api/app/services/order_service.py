@@ -1,8 +1,8 @@
 from typing import Dict, Any, List
 from fastapi import BackgroundTasks
-import httpx
 import os
 import asyncio
+from app.core.http_pool import http_pool
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -49,20 +49,19 @@ class OrderService:
 
         # 2. Async DB Insert
         if SUPABASE_URL:
-            async with httpx.AsyncClient() as client:
-                try:
-                    response = await client.post(
-                        f"{SUPABASE_URL}/rest/v1/orders",
-                        headers=HEADERS,
-                        json=final_order
-                    )
-                    response.raise_for_status()
-                    # If successful, use the returned data
-                    created_record = response.json()[0]
-                except Exception as e:
-                    print(f"Async DB Error: {e}")
-                    # In production, we'd raise HTTPException(500)
-                    created_record = final_order 
+            try:
+                response = await http_pool.post(
+                    f"{SUPABASE_URL}/rest/v1/orders",
+                    headers=HEADERS,
+                    json=final_order
+                )
+                response.raise_for_status()
+                # If successful, use the returned data
+                created_record = response.json()[0]
+            except Exception as e:
+                print(f"Async DB Error: {e}")
+                # In production, we'd raise HTTPException(500)
+                created_record = final_order 
         else:
             created_record = final_order # Mock return
 
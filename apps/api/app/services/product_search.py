@@ -0,0 +1,275 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.http_pool import http_pool
+from app.services.gemini import GeminiService
+from app.services.vector_index import product_vector_index
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+HEADERS = {
+    "apikey": SUPABASE_KEY or "",
+    "Authorization": f"Bearer {SUPABASE_KEY or ''}",
+    "Content-Type": "application/json"
+}
+
+SEARCH_INDEX_TTL = int(os.getenv("SEARCH_INDEX_TTL", "600"))
+# Per-stage budgets (ms). A stage that overruns is dropped from this request, not awaited.
+LEXICAL_BUDGET_MS = float(os.getenv("RETRIEVAL_LEXICAL_BUDGET_MS", "10"))
+EMBED_BUDGET_MS = float(os.getenv("RETRIEVAL_EMBED_BUDGET_MS", "35"))
+KNOWLEDGE_BUDGET_MS = float(os.getenv("RETRIEVAL_KNOWLEDGE_BUDGET_MS", "45"))
+RRF_K = 60
+
+SEARCH_COLUMNS = "id,title,description,category,price,images"
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("a an and are for i in is it me of on or show the to with what which find".split())
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        # Cheap plural folding so "headphones" matches "headphone"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+    Documents can be added, replaced and removed one at a time; corpus statistics
+    (N, average length) are maintained incrementally, so updates never trigger a rebuild.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        self.doc_len[doc_id] = sum(terms.values())
+        self.total_len += self.doc_len[doc_id]
+
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(*rankings: List[Tuple[str, float]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """BM25 and cosine scores live on different scales; RRF only uses ranks."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class RetrievalResult(NamedTuple):
+    products: List[Dict[str, Any]]
+    knowledge: List[Dict[str, Any]]
+    timings_ms: Dict[str, float]
+
+
+class HybridProductSearch:
+    """
+    Retrieval stage for /ask: BM25 over product title/description/category fused (RRF)
+    with vector similarity from the in-process product index, plus `match_knowledge`
+    passages. Each remote stage runs under its own budget; a miss degrades the result
+    (lexical-only, no passages) instead of slowing the assistant down.
+    """
+    RETRY_EMPTY = 30
+
+    def __init__(self, ttl: int = SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self.lexical = BM25Index()
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.loaded_at = 0.0
+        self._last_attempt = float("-inf")
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.stats = {"queries": 0, "lexical_only": 0, "budget_overruns": {"lexical": 0, "embed": 0, "knowledge": 0}}
+        self._stage_ms: Dict[str, float] = {}  # cumulative per-stage time, averaged in metrics()
+
+    # --- Incremental maintenance ---
+
+    def upsert(self, product: Dict[str, Any]):
+        doc = {k: product.get(k) for k in SEARCH_COLUMNS.split(",")}
+        doc["id"] = str(doc["id"])
+        self.docs[doc["id"]] = doc
+        self.lexical.add(doc["id"], " ".join(str(doc.get(f) or "") for f in ("title", "title", "category", "description")))
+
+    def remove(self, product_id: str):
+        self.docs.pop(str(product_id), None)
+        self.lexical.remove(str(product_id))
+
+    async def refresh(self, page_size: int = 1000):
+        if not SUPABASE_URL:
+            return
+        last_id = None
+        seen = set()
+        while True:
+            params = {"select": SEARCH_COLUMNS, "order": "id.asc", "limit": str(page_size)}
+            if last_id:
+                params["id"] = f"gt.{last_id}"
+            resp = await http_pool.get(f"{SUPABASE_URL}/rest/v1/products", headers=HEADERS, params=params)
+            resp.raise_for_status()
+            rows = resp.json()
+            if not rows:
+                break
+            for row in rows:
+                self.upsert(row)
+                seen.add(row["id"])
+            last_id = rows[-1]["id"]
+            await asyncio.sleep(0)  # let requests interleave with a large reload
+        for stale_id in set(self.docs) - seen:
+            self.remove(stale_id)
+        self.loaded_at = time.monotonic()
+        print(f"[ProductSearch] Indexed {len(self.docs)} products")
+
+    def ensure_fresh(self):
+        interval = self.ttl if self.docs else self.RETRY_EMPTY
+        if time.monotonic() - self._last_attempt < interval:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_attempt = time.monotonic()
+            self._refresh_task = asyncio.create_task(self._safe_refresh())
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"[ProductSearch] Refresh failed: {e}")
+
+    # --- Query path ---
+
+    async def retrieve(self, query: str, k: int = 5, passages: int = 3) -> RetrievalResult:
+        self.stats["queries"] += 1
+        self.ensure_fresh()
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        # 1. Lexical (in-process, synchronous)
+        lexical = self.lexical.search(query, k * 4)
+        timings["lexical"] = (time.perf_counter() - started) * 1000
+        if timings["lexical"] > LEXICAL_BUDGET_MS:
+            self.stats["budget_overruns"]["lexical"] += 1
+
+        # 2. Query embedding -> vector ranking + knowledge passages. On overrun the embedding
+        #    thread still finishes and lands in the embedding cache, so a repeat query is fast.
+        query_vector = await self._within_budget(
+            "embed", EMBED_BUDGET_MS, asyncio.to_thread(GeminiService.generate_embedding, query, "retrieval_query"), timings
+        )
+
+        vector: List[Tuple[str, float]] = []
+        knowledge: List[Dict[str, Any]] = []
+        if query_vector is not None:
+            t0 = time.perf_counter()
+            vector = self._vector_rank(query_vector, k * 4)
+            timings["vector"] = (time.perf_counter() - t0) * 1000
+            knowledge = await self._within_budget(
+                "knowledge", KNOWLEDGE_BUDGET_MS, self._match_knowledge(query_vector, passages), timings
+            ) or []
+        else:
+            self.stats["lexical_only"] += 1
+
+        ranked = reciprocal_rank_fusion(lexical, vector) if vector else lexical
+        products = [self.docs[pid] for pid, _ in ranked if pid in self.docs][:k]
+        timings["total"] = (time.perf_counter() - started) * 1000
+        for stage, ms in timings.items():
+            self._stage_ms[stage] = self._stage_ms.get(stage, 0.0) + ms
+        return RetrievalResult(products, knowledge, {stage: round(ms, 2) for stage, ms in timings.items()})
+
+    async def _within_budget(self, stage: str, budget_ms: float, awaitable, timings: Dict[str, float]):
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget_ms / 1000)
+        except asyncio.TimeoutError:
+            self.stats["budget_overruns"][stage] += 1
+            return None
+        except Exception as e:
+            print(f"[ProductSearch] {stage} stage failed: {e}")
+            return None
+        finally:
+            timings[stage] = (time.perf_counter() - t0) * 1000
+
+    @staticmethod
+    def _vector_rank(query_vector: List[float], k: int) -> List[Tuple[str, float]]:
+        snap = product_vector_index.snapshot
+        if not snap.ids:
+            return []
+        query = np.zeros(snap.matrix.shape[1], dtype=np.float32)
+        # Product vectors are zero-padded to vector(1536); padding doesn't change cosine
+        n = min(len(query_vector), len(query))
+        query[:n] = query_vector[:n]
+        norm = np.linalg.norm(query)
+        return product_vector_index.search(query / norm if norm else query, k, snapshot=snap)
+
+    @staticmethod
+    async def _match_knowledge(query_vector: List[float], count: int) -> List[Dict[str, Any]]:
+        if not SUPABASE_URL:
+            return []
+        resp = await http_pool.post(
+            f"{SUPABASE_URL}/rest/v1/rpc/match_knowledge",
+            headers=HEADERS,
+            json={"query_embedding": query_vector, "match_threshold": 0.5, "match_count": count},
+            idempotent=True
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def metrics(self) -> Dict[str, Any]:
+        queries = self.stats["queries"] or 1
+        return {
+            **self.stats,
+            "documents": len(self.docs),
+            "terms": len(self.lexical.postings),
+            "avg_stage_ms": {stage: round(ms / queries, 2) for stage, ms in self._stage_ms.items()},
+        }
+
+
+product_search = HybridProductSearch()
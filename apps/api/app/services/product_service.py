@@ -1,6 +1,7 @@
 from typing import Optional, Dict, Any, List
 import httpx
 import os
+from app.core.http_pool import http_pool
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -40,18 +41,17 @@ class ProductService:
              # Fallback/Mock for local devs without env vars
             return []
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{SUPABASE_URL}/rest/v1/products",
-                    headers=HEADERS,
-                    params={"select": "*", "limit": str(limit)}
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Async DB Error: {e}")
-                return []
+        try:
+            response = await http_pool.get(
+                f"{SUPABASE_URL}/rest/v1/products",
+                headers=HEADERS,
+                params={"select": "*", "limit": str(limit)}
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            print(f"Async DB Error: {e}")
+            return []
 
     @staticmethod
     def format_product_response(product: Dict[str, Any], user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
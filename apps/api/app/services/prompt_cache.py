@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "600"))
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+class CachedCompletion(NamedTuple):
+    completion: Completion
+    expires_at: float
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Indentation and line wrapping of f-string templates should not split cache entries
+    return " ".join(prompt.split())
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+def usage_of(response: Any) -> Tuple[int, int]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+class PromptCache:
+    """
+    Response cache + single-flight for LLM completions, keyed by (model, normalized prompt).
+    - Hit: served from the in-process LRU (TTL-bounded).
+    - Miss with an identical call already in flight: awaits that call instead of issuing another.
+    - Failures are shared with the waiters of that flight but never cached.
+    """
+    def __init__(self, maxsize: int = PROMPT_CACHE_SIZE, ttl: float = PROMPT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedCompletion]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0, "misses": 0, "coalesced": 0, "errors": 0,
+            "upstream_calls": 0, "prompt_tokens": 0, "output_tokens": 0, "tokens_saved": 0,
+        }
+
+    async def complete(self, model: str, prompt: str, call: Callable[[], Awaitable[Completion]]) -> str:
+        key = prompt_key(model, prompt)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["tokens_saved"] += entry.completion.prompt_tokens + entry.completion.output_tokens
+                return entry.completion.text
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._call_upstream(key, call))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        # shield: one caller disconnecting must not cancel the flight the others are waiting on
+        completion = await asyncio.shield(task)
+        return completion.text
+
+    async def _call_upstream(self, key: str, call: Callable[[], Awaitable[Completion]]) -> Completion:
+        self.stats["upstream_calls"] += 1
+        try:
+            completion = await call()
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["prompt_tokens"] += completion.prompt_tokens
+        self.stats["output_tokens"] += completion.output_tokens
+        self._put(key, completion)
+        return completion
+
+    def peek(self, model: str, prompt: str) -> Optional[str]:
+        """Cached text without starting a flight (used by streaming callers)."""
+        key = prompt_key(model, prompt)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        self.stats["tokens_saved"] += entry.completion.prompt_tokens + entry.completion.output_tokens
+        return entry.completion.text
+
+    def store(self, model: str, prompt: str, completion: Completion):
+        self.stats["upstream_calls"] += 1
+        self.stats["prompt_tokens"] += completion.prompt_tokens
+        self.stats["output_tokens"] += completion.output_tokens
+        self._put(prompt_key(model, prompt), completion)
+
+    def _put(self, key: str, completion: Completion):
+        self._entries[key] = CachedCompletion(completion, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter has gone away
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        served_without_call = self.stats["hits"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(served_without_call / lookups, 3) if lookups else 0.0,
+        }
+
+
+prompt_cache = PromptCache()
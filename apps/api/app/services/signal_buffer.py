@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.http_pool import http_pool
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+HEADERS = {
+    "apikey": SUPABASE_KEY or "",
+    "Authorization": f"Bearer {SUPABASE_KEY or ''}",
+    "Content-Type": "application/json",
+    "Prefer": "return=minimal"
+}
+
+SIGNAL_BUFFER_CAPACITY = int(os.getenv("SIGNAL_BUFFER_CAPACITY", "20000"))
+SIGNAL_FLUSH_SIZE = int(os.getenv("SIGNAL_FLUSH_SIZE", "500"))            # rows per bulk insert
+SIGNAL_FLUSH_INTERVAL = float(os.getenv("SIGNAL_FLUSH_INTERVAL", "1.0"))  # seconds
+SIGNAL_FLUSH_RETRIES = int(os.getenv("SIGNAL_FLUSH_RETRIES", "3"))
+SIGNAL_DRAIN_TIMEOUT = float(os.getenv("SIGNAL_DRAIN_TIMEOUT", "10"))
+
+
+class SignalBuffer:
+    """
+    Bounded in-process buffer in front of `browsing_signals`.
+    - `offer()` is O(1) and never awaits the database; it returns False when the buffer is full
+      (the caller answers 429 so clients back off) and the row is counted as dropped.
+    - One flusher task drains it with bulk inserts of up to `flush_size` rows, as soon as a
+      batch is full or `flush_interval` has passed. While the DB is slow the buffer absorbs
+      the backlog; a batch that keeps failing is re-queued once, then dropped and counted.
+    - `stop()` drains what is left (bounded by `drain_timeout`) on shutdown.
+    """
+    def __init__(
+        self,
+        capacity: int = SIGNAL_BUFFER_CAPACITY,
+        flush_size: int = SIGNAL_FLUSH_SIZE,
+        flush_interval: float = SIGNAL_FLUSH_INTERVAL,
+        max_retries: int = SIGNAL_FLUSH_RETRIES,
+        drain_timeout: float = SIGNAL_DRAIN_TIMEOUT,
+        backoff_base: float = 0.1,
+    ):
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.drain_timeout = drain_timeout
+        self.backoff_base = backoff_base
+        self._rows: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {
+            "accepted": 0, "flushed": 0, "batches": 0, "flush_errors": 0,
+            "requeued": 0, "dropped_full": 0, "dropped_failed": 0, "last_flush_ms": 0.0,
+        }
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            self.stats["dropped_failed"] += len(self._rows)
+            print(f"[SignalBuffer] Drain timed out, {len(self._rows)} signals lost")
+            self._rows.clear()
+        self._task = None
+
+    # --- Producer side ---
+
+    def offer(self, row: Dict[str, Any]) -> bool:
+        if len(self._rows) >= self.capacity:
+            self.stats["dropped_full"] += 1
+            return False
+        self._rows.append(row)
+        self.stats["accepted"] += 1
+        if self._task is None or self._task.done():
+            # Not started by the lifespan (e.g. scripts/tests): start lazily on this loop
+            asyncio.get_running_loop().create_task(self.start())
+        elif len(self._rows) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def offer_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Returns how many rows were accepted (a prefix of `rows`)."""
+        accepted = 0
+        for row in rows:
+            if not self.offer(row):
+                self.stats["dropped_full"] += len(rows) - accepted - 1
+                break
+            accepted += 1
+        return accepted
+
+    # --- Flusher ---
+
+    async def _run(self):
+        while True:
+            if len(self._rows) < self.flush_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            while self._rows:
+                await self._flush_batch()
+                if len(self._rows) < self.flush_size and not self._stopping:
+                    break  # partial batch: wait for more rows or the next interval
+
+            if self._stopping and not self._rows:
+                return
+
+    async def _flush_batch(self):
+        batch = [self._rows.popleft() for _ in range(min(self.flush_size, len(self._rows)))]
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._insert(batch)
+                self.stats["flushed"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                print(f"[SignalBuffer] Bulk insert of {len(batch)} failed (attempt {attempt + 1}): {e}")
+                if self._stopping:
+                    break
+                await asyncio.sleep(min(2.0, self.backoff_base * 2 ** attempt))
+
+        # Put it back at the front if there is room, otherwise shed it
+        room = self.capacity - len(self._rows)
+        if not self._stopping and room >= len(batch) and not batch[0].get("_requeued"):
+            for row in reversed(batch):
+                row["_requeued"] = True
+                self._rows.appendleft(row)
+            self.stats["requeued"] += len(batch)
+        else:
+            self.stats["dropped_failed"] += len(batch)
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        if not SUPABASE_URL:
+            return
+        payload = [{k: v for k, v in row.items() if k != "_requeued"} for row in batch]
+        # One PostgREST call inserts the whole array
+        resp = await http_pool.post(f"{SUPABASE_URL}/rest/v1/browsing_signals", headers=HEADERS, json=payload)
+        resp.raise_for_status()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "buffered": len(self._rows), "capacity": self.capacity}
+
+
+signal_buffer = SignalBuffer()
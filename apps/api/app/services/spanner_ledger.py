@@ -1,94 +1,411 @@
 import asyncio
+import heapq
+import math
+import os
 import time
 import random
 import uuid
-from typing import Dict, Any
-from app.services.crdt_service import HybridLogicalClock
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+from app.services.hlc import HLCTimestamp, HybridLogicalClock
+
+FLASH_SALE_SLABS = int(os.getenv("FLASH_SALE_SLABS", "8"))
+FLASH_SALE_BATCH_MAX = int(os.getenv("FLASH_SALE_BATCH_MAX", "256"))   # decrements per combined commit
+RESERVATION_TTL = float(os.getenv("FLASH_SALE_RESERVATION_TTL", "120"))  # seconds
+RESERVATION_MAX_TTL = float(os.getenv("FLASH_SALE_RESERVATION_MAX_TTL", "900"))  # longest hold a caller may ask for
+LEDGER_GROUP_COMMIT = os.getenv("LEDGER_GROUP_COMMIT", "1") == "1"
+LEDGER_GROUP_WINDOW_MS = float(os.getenv("LEDGER_GROUP_WINDOW_MS", "1"))   # collection window, capped at epsilon
+LEDGER_LOG_SYNC_MS = float(os.getenv("LEDGER_LOG_SYNC_MS", "0"))           # simulated replicated-log write per commit
+LEDGER_MAX_UNCERTAINTY_MS = float(os.getenv("LEDGER_MAX_UNCERTAINTY_MS", "50"))  # server-side cap on a caller's epsilon
+
+class PendingOrder(NamedTuple):
+    quantity: int
+    uncertainty_ms: Optional[float]
+    future: asyncio.Future
+    enqueued_at: float
+
+class Slab:
+    """One sub-counter of a SKU's stock, with its own queue of combined orders."""
+    __slots__ = ("stock", "version", "queue", "committing")
+
+    def __init__(self, stock: int):
+        self.stock = stock
+        self.version = 1
+        self.queue: Deque[PendingOrder] = deque()
+        self.committing = False
+
+class Reservation(NamedTuple):
+    token: str
+    sku: str
+    quantity: int
+    expires_at: float
+
+class SkuLedger:
+    """
+    Stock of one SKU split across `slabs` sub-counters. Orders spread over the slabs, so
+    concurrent buyers queue behind different committers; a slab that runs dry borrows
+    from the others, so the SKU only sells out when its total does.
+    Stock held by live reservations is outside the slabs until confirmed or expired.
+    """
+    def __init__(self, sku: str, stock: int, slabs: int = FLASH_SALE_SLABS):
+        self.sku = sku
+        share, extra = divmod(stock, slabs)
+        self.slabs = [Slab(share + (1 if i < extra else 0)) for i in range(slabs)]
+        self.reservations: Dict[str, Reservation] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self.ts = 0
+
+    @property
+    def stock(self) -> int:
+        return sum(slab.stock for slab in self.slabs)
+
+    @property
+    def reserved(self) -> int:
+        return sum(r.quantity for r in self.reservations.values())
+
+    @property
+    def version(self) -> int:
+        return sum(slab.version for slab in self.slabs)
+
+    def pick_slab(self, quantity: int) -> Slab:
+        # Prefer slabs that can cover the order, then the shortest queue
+        return min(self.slabs, key=lambda s: (s.stock < quantity, len(s.queue) + s.committing))
+
+    def take(self, slab: Slab, quantity: int) -> bool:
+        """Decrements `quantity` from `slab`, borrowing from the richest slabs if it is short."""
+        if slab.stock < quantity:
+            if self.stock < quantity:
+                return False
+            for donor in sorted(self.slabs, key=lambda s: s.stock, reverse=True):
+                if donor is slab:
+                    continue
+                moved = min(donor.stock, quantity - slab.stock)
+                donor.stock -= moved
+                donor.version += 1
+                slab.stock += moved
+                if slab.stock >= quantity:
+                    break
+        slab.stock -= quantity
+        slab.version += 1
+        return True
+
+    def give_back(self, quantity: int):
+        min(self.slabs, key=lambda s: s.stock).stock += quantity
+
+    def hold(self, quantity: int, ttl: float) -> Optional[Reservation]:
+        if self.stock < quantity:
+            return None
+        self.take(max(self.slabs, key=lambda s: s.stock), quantity)
+        reservation = Reservation(uuid.uuid4().hex, self.sku, quantity, time.monotonic() + ttl)
+        self.reservations[reservation.token] = reservation
+        heapq.heappush(self._expiry, (reservation.expires_at, reservation.token))
+        return reservation
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Returns the stock of lapsed reservations to the slabs; lazy, called on access."""
+        now = time.monotonic() if now is None else now
+        released = []
+        while self._expiry and self._expiry[0][0] <= now:
+            _, token = heapq.heappop(self._expiry)
+            reservation = self.reservations.pop(token, None)
+            if reservation is not None:
+                self.give_back(reservation.quantity)
+                released.append(token)
+        return released
+
+class CommitGroup:
+    __slots__ = ("size", "commit_wait", "done")
+
+    def __init__(self, done: asyncio.Future, commit_wait: float = 0.0):
+        self.size = 0
+        self.commit_wait = commit_wait
+        self.done = done
+
+class GroupCommitScheduler:
+    """
+    Amortizes TrueTime commit-wait across concurrent commits.
+    Commits are grouped by epsilon (rounded up to the millisecond), so a long wait never
+    holds back a short one. The first commit opens a group; others with the same epsilon
+    join for up to `window_ms` (never longer than the epsilon itself). The group then takes
+    one consecutive block of HLC timestamps, writes one log record, waits out its epsilon
+    once and releases every member together. The next group collects while this one
+    waits, so groups pipeline.
+    """
+    def __init__(self, clock: HybridLogicalClock, replicate, window_ms: float = LEDGER_GROUP_WINDOW_MS):
+        self.clock = clock
+        self.replicate = replicate
+        self.window_ms = window_ms
+        self._open: Dict[float, CommitGroup] = {}  # epsilon bucket -> collecting group
+        self._tasks: set = set()
+        self.stats = {"groups": 0, "commits": 0, "max_group": 0}
+
+    async def commit(self, commit_wait: float) -> HLCTimestamp:
+        bucket = math.ceil(commit_wait * 1000) / 1000.0
+        group = self._open.get(bucket)
+        if group is None:
+            group = self._open[bucket] = CommitGroup(asyncio.get_running_loop().create_future(), commit_wait=bucket)
+            task = asyncio.create_task(self._close(bucket, group, min(self.window_ms / 1000.0, bucket)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        index = group.size
+        group.size += 1
+        # shield: a caller going away must not cancel the group the others are waiting on
+        first = await asyncio.shield(group.done)
+        return HLCTimestamp(first + index, self.clock.node_id)
+
+    async def _close(self, bucket: float, group: CommitGroup, window: float):
+        try:
+            await asyncio.sleep(window)
+            del self._open[bucket]
+            # Timestamps are fixed before the wait (Spanner: pick s, then wait until TT.after(s))
+            first = self.clock.now_range(group.size)
+            await self.replicate()
+            await asyncio.sleep(group.commit_wait)
+            self.stats["groups"] += 1
+            self.stats["commits"] += group.size
+            self.stats["max_group"] = max(self.stats["max_group"], group.size)
+            group.done.set_result(first)
+        except BaseException as e:
+            if self._open.get(bucket) is group:
+                del self._open[bucket]
+            if not group.done.done():
+                group.done.set_exception(e if isinstance(e, Exception) else RuntimeError("group commit cancelled"))
+            raise
+
+    def metrics(self) -> Dict[str, Any]:
+        groups = self.stats["groups"]
+        return {**self.stats, "avg_group": round(self.stats["commits"] / groups, 2) if groups else 0.0}
 
 class SpannerLedgerService:
     """
     Simulates Google Cloud Spanner features:
     1. TrueTime (Commit Wait + HLC)
     2. Paxos Replication (Multi-Region)
-    3. Optimistic Concurrency Control (OCC)
+    3. Contention-aware commits: slabbed stock + request combining
+       (replaces the per-order OCC read/commit-wait/validate/retry loop, where nearly every
+       concurrent buyer of a hot SKU conflicted and retried)
     """
-    def __init__(self):
-        # Ledger Data: SKU -> {stock, version, timestamp}
-        self._ledger = {
-            "SKU-EXCLUSIVE-B": {"stock": 500, "version": 1, "ts": 0}
-        }
+    def __init__(
+        self,
+        slabs: int = FLASH_SALE_SLABS,
+        batch_max: int = FLASH_SALE_BATCH_MAX,
+        group_commit: bool = LEDGER_GROUP_COMMIT,
+        log_sync_ms: float = LEDGER_LOG_SYNC_MS,
+    ):
+        self.slab_count = slabs
+        self.batch_max = batch_max
+        # Ledger Data: SKU -> slabbed stock, reservations, last commit timestamp
+        self._ledger: Dict[str, SkuLedger] = {}
+        self._tokens: Dict[str, SkuLedger] = {}  # live reservation token -> its SKU's ledger
+        self.add_sku("SKU-EXCLUSIVE-B", 500)
         self.regions = ["us-east1 (Leader)", "asia-south1 (Follower)"]
         self.clock = HybridLogicalClock("cloud-leader-us-east1")
+        self._committers: set = set()  # strong refs to running slab committers
+        self.log_sync_ms = log_sync_ms
+        self._log_lock = asyncio.Lock()
+        self.group_commit = GroupCommitScheduler(self.clock, self._replicate) if group_commit else None
+        self.stats = {"orders": 0, "sold_out": 0, "commits": 0, "combined_orders": 0, "max_batch": 0,
+                      "reservations": 0, "confirmed": 0, "released": 0, "expired": 0}
+
+    def add_sku(self, sku: str, stock: int):
+        self._ledger[sku] = SkuLedger(sku, stock, self.slab_count)
+
+    def _sku(self, sku: str) -> SkuLedger:
+        ledger = self._ledger.get(sku)
+        if ledger is None:
+            raise KeyError(f"SKU {sku} not found")
+        self._expire(ledger)
+        return ledger
+
+    def _expire(self, ledger: SkuLedger):
+        for token in ledger.expire():
+            self._tokens.pop(token, None)
+            self.stats["expired"] += 1
+
+    # --- TrueTime ---
+
+    @staticmethod
+    def _commit_wait_seconds(uncertainty_ms: Optional[float]) -> float:
+        # We wait out the uncertainty window (~4ms usually, or configurable)
+        # This ensures external consistency across regions
+        if uncertainty_ms is not None:
+            return min(max(uncertainty_ms, 0.0), LEDGER_MAX_UNCERTAINTY_MS) / 1000.0
+        return random.uniform(0.002, 0.008)
+
+    async def _replicate(self):
+        """One write to the leader's replicated log; serialized, like a Paxos leader's log."""
+        if self.log_sync_ms:
+            async with self._log_lock:
+                await asyncio.sleep(self.log_sync_ms / 1000.0)
+
+    async def _commit_wait(self, commit_wait: float) -> HLCTimestamp:
+        if self.group_commit is not None:
+            return await self.group_commit.commit(commit_wait)
+        commit_ts = self.clock.now()
+        await self._replicate()
+        await asyncio.sleep(commit_wait)
+        return commit_ts
+
+    # --- Orders ---
 
     async def execute_flash_sale_order(self, sku: str, quantity: int, uncertainty_ms: float = None) -> Dict[str, Any]:
         """
-        Attempts to buy item using OCC loop.
+        Buys `quantity` of `sku`. Orders queue on a slab; the slab's committer applies every
+        queued decrement after a single commit-wait, so a hot SKU's throughput grows with
+        the number of concurrent buyers instead of collapsing into retries.
         uncertainty_ms: Simulated Clock Uncertainty (Epsilon). If None, random jitter.
         """
-        max_retries = 3
-        
-        for attempt in range(max_retries):
-            try:
-                # 1. READ Phase (Snapshot)
-                current_data = self._ledger.get(sku)
-                if not current_data:
-                    raise ValueError(f"SKU {sku} not found")
-                
-                start_version = current_data["version"]
-                start_stock = current_data["stock"]
-                
-                if start_stock < quantity:
-                    return {"status": "SOLD_OUT", "message": "Insufficient stock."}
-                
-                # 2. COMMIT WAIT (TrueTime Simulation)
-                # We wait out the uncertainty window (~4ms usually, or configurable)
-                # This ensures external consistency across regions
-                if uncertainty_ms is not None:
-                     # Spanner Rule: Wait out 2 * Epsilon (avg error)
-                     commit_wait = (uncertainty_ms / 1000.0)
-                else:
-                     commit_wait = random.uniform(0.002, 0.008) 
-                     
-                await asyncio.sleep(commit_wait) 
-                
-                # 3. WRITE Phase (Validation)
-                # Check if version changed since read
-                if self._ledger[sku]["version"] != start_version:
-                    # Conflict! Someone else bought it.
-                    # Backoff and Retry
-                    backoff = random.uniform(0.01, 0.05)
-                    await asyncio.sleep(backoff)
-                    continue 
-
-                # 4. COMMIT
-                self._ledger[sku]["stock"] -= quantity
-                self._ledger[sku]["version"] += 1
-                
-                # Assign TrueTime Timestamp (HLC)
-                commit_ts = self.clock.now() # {p: phys, l: log, n: node}
-                self._ledger[sku]["ts"] = commit_ts["p"]
-                
-                # Simulate Replication Latency
-                repl_latency = 0.045 # 45ms to Asia
-                
-                return {
-                    "status": "SUCCESS",
-                    "tx_id": str(uuid.uuid4()),
-                    "metrics": {
-                        "commit_wait_ms": round(commit_wait * 1000, 2),
-                        "replication_latency_ms": round(repl_latency * 1000, 2),
-                        "consistency_mode": "EXTERNAL_CONSISTENCY (TrueTime)",
-                        "uncertainty_window_ms": uncertainty_ms if uncertainty_ms else "DYNAMIC",
-                        "attempts": attempt + 1
-                    }
+        try:
+            ledger = self._sku(sku)
+        except KeyError as e:
+            return {"status": "FAILURE", "message": str(e)}
+        if quantity <= 0:
+            return {"status": "INVALID", "message": "Quantity must be positive."}
+        self.stats["orders"] += 1
+        if ledger.stock < quantity:
+            self.stats["sold_out"] += 1
+            return {"status": "SOLD_OUT", "message": "Insufficient stock."}
+
+        slab = ledger.pick_slab(quantity)
+        future = asyncio.get_running_loop().create_future()
+        slab.queue.append(PendingOrder(quantity, uncertainty_ms, future, time.perf_counter()))
+        if not slab.committing:
+            slab.committing = True
+            task = asyncio.create_task(self._run_slab(ledger, slab))
+            self._committers.add(task)
+            task.add_done_callback(self._committers.discard)
+        return await future
+
+    async def _run_slab(self, ledger: SkuLedger, slab: Slab):
+        try:
+            while slab.queue:
+                batch = [slab.queue.popleft() for _ in range(min(self.batch_max, len(slab.queue)))]
+                await self._commit_batch(ledger, slab, batch)
+        finally:
+            slab.committing = False
+
+    async def _commit_batch(self, ledger: SkuLedger, slab: Slab, batch: List[PendingOrder]):
+        uncertainties = [o.uncertainty_ms for o in batch if o.uncertainty_ms is not None]
+        # The batch waits out its largest epsilon, which _commit_wait_seconds caps server-side
+        commit_wait = self._commit_wait_seconds(max(uncertainties) if uncertainties else None)
+        try:
+            commit_ts = await self._commit_wait(commit_wait)
+        except Exception as e:
+            for order in batch:
+                if not order.future.done():
+                    order.future.set_exception(e)
+            return
+
+        # Apply every decrement at the commit timestamp; no await between check and write
+        results = []
+        for order in batch:
+            results.append(ledger.take(slab, order.quantity))
+        ledger.ts = commit_ts.packed
+        self.stats["commits"] += 1
+        self.stats["combined_orders"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+        # Simulate Replication Latency
+        repl_latency = 0.045 # 45ms to Asia
+        committed_at = time.perf_counter()
+        for order, ok in zip(batch, results):
+            if order.future.done():
+                continue
+            if not ok:
+                self.stats["sold_out"] += 1
+                order.future.set_result({"status": "SOLD_OUT", "message": "Insufficient stock."})
+                continue
+            order.future.set_result({
+                "status": "SUCCESS",
+                "tx_id": str(uuid.uuid4()),
+                "commit_ts": str(commit_ts),
+                "metrics": {
+                    "commit_wait_ms": round(commit_wait * 1000, 2),
+                    "queue_ms": round((committed_at - order.enqueued_at) * 1000, 2),
+                    "replication_latency_ms": round(repl_latency * 1000, 2),
+                    "consistency_mode": "EXTERNAL_CONSISTENCY (TrueTime)",
+                    "uncertainty_window_ms": order.uncertainty_ms if order.uncertainty_ms else "DYNAMIC",
+                    "batch_size": len(batch),
+                    "attempts": 1
                 }
-                
-            except Exception as e:
-                print(f"Spanner Tx Error: {e}")
-                
-        return {"status": "FAILURE", "message": "High contention. Please retry."}
+            })
+
+    # --- Reservations ---
+
+    def reserve(self, sku: str, quantity: int, ttl: float = RESERVATION_TTL) -> Dict[str, Any]:
+        """Holds stock for a checkout; it returns to the slabs unless confirmed within `ttl` seconds."""
+        ledger = self._sku(sku)
+        if quantity <= 0:
+            return {"status": "INVALID", "message": "Quantity must be positive."}
+        reservation = ledger.hold(quantity, ttl)
+        if reservation is None:
+            self.stats["sold_out"] += 1
+            return {"status": "SOLD_OUT", "message": "Insufficient stock."}
+        self._tokens[reservation.token] = ledger
+        self.stats["reservations"] += 1
+        return {"status": "RESERVED", "token": reservation.token, "quantity": quantity, "expires_in_sec": ttl}
+
+    def _reservation(self, token: str) -> Optional[Tuple[SkuLedger, Reservation]]:
+        ledger = self._tokens.get(token)
+        if ledger is None:
+            return None
+        self._expire(ledger)
+        reservation = ledger.reservations.get(token)
+        return (ledger, reservation) if reservation is not None else None
+
+    async def confirm_reservation(self, token: str, uncertainty_ms: float = None) -> Dict[str, Any]:
+        found = self._reservation(token)
+        if found is None:
+            return {"status": "EXPIRED", "message": "Reservation expired or unknown."}
+        ledger, reservation = found
+        commit_wait = self._commit_wait_seconds(uncertainty_ms)
+        commit_ts = await self._commit_wait(commit_wait)
+        # The hold may have lapsed during the commit wait
+        self._tokens.pop(token, None)
+        if ledger.reservations.pop(token, None) is None:
+            return {"status": "EXPIRED", "message": "Reservation expired or unknown."}
+        ledger.ts = commit_ts.packed
+        self.stats["confirmed"] += 1
+        return {
+            "status": "SUCCESS",
+            "tx_id": str(uuid.uuid4()),
+            "commit_ts": str(commit_ts),
+            "quantity": reservation.quantity,
+            "metrics": {"commit_wait_ms": round(commit_wait * 1000, 2)}
+        }
+
+    def release_reservation(self, token: str) -> Dict[str, Any]:
+        found = self._reservation(token)
+        if found is None:
+            return {"status": "EXPIRED", "message": "Reservation expired or unknown."}
+        ledger, reservation = found
+        del ledger.reservations[token]
+        del self._tokens[token]
+        ledger.give_back(reservation.quantity)
+        self.stats["released"] += 1
+        return {"status": "RELEASED", "quantity": reservation.quantity}
+
+    # --- Reads ---
 
     def get_stock(self, sku: str) -> int:
-        return self._ledger.get(sku, {}).get("stock", 0)
+        ledger = self._ledger.get(sku)
+        if ledger is None:
+            return 0
+        self._expire(ledger)
+        return ledger.stock
+
+    def get_reserved(self, sku: str) -> int:
+        ledger = self._ledger.get(sku)
+        return ledger.reserved if ledger else 0
+
+    def metrics(self) -> Dict[str, Any]:
+        commits = self.stats["commits"]
+        return {
+            **self.stats,
+            "avg_batch": round(self.stats["combined_orders"] / commits, 2) if commits else 0.0,
+            "skus": len(self._ledger),
+            "slabs_per_sku": self.slab_count,
+            "group_commit": self.group_commit.metrics() if self.group_commit else None,
+        }
 
 spanner_service = SpannerLedgerService()
@@ -0,0 +1,41 @@
+from collections import deque
+from typing import Deque, Dict, Any
+
+STREAM_SAMPLE_WINDOW = 512
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 1)
+
+
+class StreamMetrics:
+    """
+    Per-endpoint time-to-first-token and total stream time over a sliding window of requests.
+    """
+    def __init__(self, window: int = STREAM_SAMPLE_WINDOW):
+        self.window = window
+        self._ttft: Dict[str, Deque[float]] = {}
+        self._total: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, ttft_ms: float, total_ms: float, cancelled: bool = False):
+        self._ttft.setdefault(endpoint, deque(maxlen=self.window)).append(ttft_ms)
+        self._total.setdefault(endpoint, deque(maxlen=self.window)).append(total_ms)
+        counts = self._counts.setdefault(endpoint, {"streams": 0, "cancelled": 0})
+        counts["streams"] += 1
+        counts["cancelled"] += int(cancelled)
+
+    def metrics(self) -> Dict[str, Any]:
+        report = {}
+        for endpoint, ttft in self._ttft.items():
+            report[endpoint] = {
+                **self._counts[endpoint],
+                "ttft_p50_ms": _percentile(ttft, 0.5),
+                "ttft_p99_ms": _percentile(ttft, 0.99),
+                "total_p50_ms": _percentile(self._total[endpoint], 0.5),
+            }
+        return report
+
+
+stream_metrics = StreamMetrics()
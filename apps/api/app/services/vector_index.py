@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.http_pool import http_pool
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+HEADERS = {
+    "apikey": SUPABASE_KEY or "",
+    "Authorization": f"Bearer {SUPABASE_KEY or ''}",
+    "Content-Type": "application/json"
+}
+
+VECTOR_INDEX_TTL = int(os.getenv("VECTOR_INDEX_TTL", "600"))          # seconds between background reloads
+VECTOR_INDEX_EXACT_MAX = int(os.getenv("VECTOR_INDEX_EXACT_MAX", "20000"))  # brute force below this many rows
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+RECENCY_HALF_LIFE = float(os.getenv("RECOMMEND_RECENCY_HALF_LIFE", "3"))  # views
+
+
+def parse_vector(value: Any) -> Optional[np.ndarray]:
+    """PostgREST returns pgvector columns as text ("[0.1,0.2,...]")."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def recency_weighted_centroid(vectors: np.ndarray, half_life: float = RECENCY_HALF_LIFE) -> np.ndarray:
+    """
+    Vectors ordered most-recent first (the web client's view history order).
+    The i-th view counts 0.5 ** (i / half_life), so tastes drift with the session.
+    """
+    weights = np.power(0.5, np.arange(len(vectors), dtype=np.float32) / half_life)
+    centroid = weights @ vectors / weights.sum()
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm else centroid
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over unit vectors, in pure NumPy.
+    Rows are bucketed by their nearest k-means centroid; a query scores only the
+    rows of its `nprobe` closest buckets, so per-query work is ~n * nprobe / nlist.
+    """
+    def __init__(self, vectors: np.ndarray, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        n = len(vectors)
+        self.nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        self.centroids = vectors[rng.choice(n, size=self.nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    self.centroids[c] = members.mean(axis=0)
+            self.centroids = normalize_rows(self.centroids)
+
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(self.nlist)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.nlist)
+        nearest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+class IndexSnapshot(NamedTuple):
+    ids: List[str]
+    positions: Dict[str, int]
+    matrix: np.ndarray
+    ivf: Optional[IVFIndex]
+
+
+class ProductVectorIndex:
+    """
+    In-memory float32 matrix of product embeddings (L2-normalized, so dot product == cosine).
+    - Loaded in keyset pages from PostgREST; refreshed in the background after `ttl`.
+    - Exact search below `exact_max` rows, IVF above, so p99 stays flat as the catalog grows.
+    - `ready` is False until the first load; callers fall back to the pgvector RPC meanwhile.
+    """
+    RETRY_EMPTY = 30
+
+    def __init__(self, ttl: int = VECTOR_INDEX_TTL, exact_max: int = VECTOR_INDEX_EXACT_MAX, nprobe: int = VECTOR_INDEX_NPROBE):
+        self.ttl = ttl
+        self.exact_max = exact_max
+        self.nprobe = nprobe
+        self.snapshot = IndexSnapshot([], {}, np.zeros((0, 0), dtype=np.float32), None)
+        self.loaded_at = 0.0
+        self._last_attempt = float("-inf")
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.stats = {"loads": 0, "queries": 0, "ann_queries": 0, "rows": 0}
+
+    @property
+    def ready(self) -> bool:
+        return len(self.snapshot.ids) > 0
+
+    def build(self, ids: Sequence[str], vectors: np.ndarray):
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        ivf = IVFIndex(matrix) if len(ids) > self.exact_max else None
+        # Single reference swap: a concurrent query sees either the old or the new index, never a mix
+        self.snapshot = IndexSnapshot(list(ids), {pid: i for i, pid in enumerate(ids)}, matrix, ivf)
+        self.loaded_at = time.monotonic()
+        self.stats["loads"] += 1
+        self.stats["rows"] = len(ids)
+
+    def search(self, query: np.ndarray, k: int, exclude: Sequence[str] = (), snapshot: Optional[IndexSnapshot] = None) -> List[Tuple[str, float]]:
+        snap = snapshot or self.snapshot
+        self.stats["queries"] += 1
+        if snap.ivf is not None:
+            self.stats["ann_queries"] += 1
+            candidates = snap.ivf.candidates(query, self.nprobe)
+        else:
+            candidates = np.arange(len(snap.ids))
+
+        scores = snap.matrix[candidates] @ query
+        excluded = {snap.positions[pid] for pid in exclude if pid in snap.positions}
+        want = min(len(candidates), k + len(excluded))
+        top = np.argpartition(-scores, want - 1)[:want] if want < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            row = int(candidates[i])
+            if row in excluded:
+                continue
+            results.append((snap.ids[row], float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def recommend(self, history: Sequence[str], k: int) -> Optional[List[Tuple[str, float]]]:
+        """None when none of the viewed products are indexed (caller should fall back)."""
+        snap = self.snapshot
+        known = [snap.positions[pid] for pid in history if pid in snap.positions]
+        if not known:
+            return None
+        centroid = recency_weighted_centroid(snap.matrix[known])
+        return self.search(centroid, k, exclude=history, snapshot=snap)
+
+    # --- Loading ---
+
+    async def refresh(self, page_size: int = 1000):
+        if not SUPABASE_URL:
+            return
+        ids: List[str] = []
+        vectors: List[np.ndarray] = []
+        last_id = None
+        while True:
+            params = {"select": "id,embedding", "embedding": "not.is.null", "order": "id.asc", "limit": str(page_size)}
+            if last_id:
+                params["id"] = f"gt.{last_id}"
+            resp = await http_pool.get(f"{SUPABASE_URL}/rest/v1/products", headers=HEADERS, params=params)
+            resp.raise_for_status()
+            rows = resp.json()
+            if not rows:
+                break
+            for row in rows:
+                ids.append(row["id"])
+                vectors.append(parse_vector(row["embedding"]))
+            last_id = rows[-1]["id"]
+
+        if ids:
+            # k-means on a large catalog is CPU work: keep it off the event loop
+            await asyncio.to_thread(self.build, ids, np.stack(vectors))
+        print(f"[VectorIndex] Loaded {len(ids)} product embeddings")
+
+    def ensure_fresh(self):
+        """Schedules a background reload when empty or older than ttl; never blocks the request."""
+        # Until the first load succeeds, retry at most every RETRY_EMPTY seconds rather than per request
+        interval = self.ttl if self.ready else self.RETRY_EMPTY
+        if time.monotonic() - self._last_attempt < interval:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_attempt = time.monotonic()
+            self._refresh_task = asyncio.create_task(self._safe_refresh())
+
+    def mark_stale(self):
+        """Reload on the next request (e.g. after an embedding backfill)."""
+        self._last_attempt = float("-inf")
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"[VectorIndex] Refresh failed: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "ivf_lists": self.snapshot.ivf.nlist if self.snapshot.ivf else 0, "age_sec": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None}
+
+
+product_vector_index = ProductVectorIndex()
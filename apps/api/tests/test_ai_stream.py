@@ -0,0 +1,65 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import gemini
+from app.services.prompt_cache import prompt_cache
+from app.services.stream_metrics import stream_metrics
+
+client = TestClient(app)
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+class _FakeStream:
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for part in self.parts:
+            yield _Chunk(part)
+
+class _FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        return _FakeStream(["Hello", " from", " Jarvis"])
+
+def test_chat_stream_yields_deltas_and_caches_answer(monkeypatch):
+    model = _FakeModel()
+    monkeypatch.setattr(gemini, "api_key", "test-key")
+    monkeypatch.setattr(gemini, "get_model", lambda name: model)
+    prompt_cache.clear()
+
+    body = client.post("/api/v1/ai/chat/stream", json={"message": "best laptop?"}).text
+    events = _events(body)
+    assert [d["delta"] for e, d in events if e == "message"] == ["Hello", " from", " Jarvis"]
+    assert events[-1][0] == "done" and events[-1][1]["ttft_ms"] <= events[-1][1]["total_ms"]
+
+    # Second identical request is served from the prompt cache in one piece
+    events = _events(client.post("/api/v1/ai/chat/stream", json={"message": "best laptop?"}).text)
+    assert [d["delta"] for e, d in events if e == "message"] == ["Hello from Jarvis"]
+    assert model.calls == 1
+    assert stream_metrics.metrics()["chat"]["streams"] >= 2
+
+def test_ask_stream_sends_products_before_answer(monkeypatch):
+    monkeypatch.setattr(gemini, "api_key", None)
+
+    events = _events(client.post("/api/v1/ai/ask/stream", json={"query": "noise cancelling headphones"}).text)
+
+    assert events[0][0] == "products"
+    assert events[0][1]["recommended_products"][0]["id"] == "prod_1"
+    assert events[1][0] == "message" and events[1][1]["delta"]
+    assert events[-1][0] == "done"
@@ -0,0 +1,47 @@
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from supabase import Client, ClientOptions
+from app.main import app
+from app.api.deps import get_current_user
+from app.api.routers import cart
+from app.schemas.user import AuthenticatedUser
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+CART = {"id": "00000000-0000-0000-0000-0000000000cc", "user_id": USER_ID, "items": []}
+
+client = TestClient(app)
+
+@pytest.fixture
+def rpc_calls(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200, json=CART)
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    supabase = Client("http://localhost:54321", "key", ClientOptions(httpx_client=http))
+    monkeypatch.setattr(cart, "get_supabase", lambda: supabase)
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(id=USER_ID)
+    yield calls
+    app.dependency_overrides.clear()
+
+def test_add_item_is_a_single_rpc(rpc_calls):
+    product_id = "00000000-0000-0000-0000-000000000001"
+    response = client.post("/api/v1/cart/items", json={"product_id": product_id, "quantity": 2})
+
+    assert response.status_code == 200
+    assert rpc_calls == [(
+        "/rest/v1/rpc/cart_add_items",
+        {"p_user_id": USER_ID, "p_items": [{"product_id": product_id, "quantity": 2}]},
+    )]
+
+def test_batch_add_sends_every_line_in_one_call(rpc_calls):
+    items = [{"product_id": f"00000000-0000-0000-0000-00000000000{i}", "quantity": i} for i in (1, 2, 3)]
+    response = client.post("/api/v1/cart/items/batch", json={"items": items})
+
+    assert response.status_code == 200
+    assert len(rpc_calls) == 1
+    assert rpc_calls[0][1]["p_items"] == items
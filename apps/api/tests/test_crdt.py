@@ -0,0 +1,231 @@
+import threading
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.admin_deps import require_admin_role
+from app.schemas.user import AuthenticatedUser
+from app.services.crdt_service import CRDTService, InventoryCRDT, InventoryStore, DEFAULT_SKU, crdt_service
+
+TS = {"p": 0, "l": 0}
+
+def test_delta_sync_returns_only_unseen_entries():
+    server = CRDTService()
+    first = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"n": {"tab": 2}}})["skus"][DEFAULT_SKU]
+    assert first["value"] == 98
+    assert first["p"] == {"server-virginia": 100} and first["n"] == {}  # own write not echoed
+
+    server.sync_deltas("phone", TS, {DEFAULT_SKU: {"n": {"phone": 1}}})
+
+    second = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"since": first["vv"]}})["skus"][DEFAULT_SKU]
+    assert second["p"] == {} and second["n"] == {"phone": 1}
+    assert second["value"] == 97
+
+    # Nothing new: empty delta, same vector
+    third = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"since": second["vv"]}})["skus"][DEFAULT_SKU]
+    assert third["p"] == {} and third["n"] == {} and third["vv"] == second["vv"]
+
+def test_replayed_or_stale_entries_do_not_advance_the_vector():
+    server = CRDTService()
+    vv = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"n": {"tab": 3}}})["skus"][DEFAULT_SKU]["vv"]
+    again = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"n": {"tab": 1}, "since": vv}})["skus"][DEFAULT_SKU]
+    assert again["vv"] == vv and again["value"] == 97
+
+def test_deltas_converge_a_client_replica():
+    server = CRDTService()
+    client = InventoryCRDT()
+    since = {}
+    for node, amount in [("a", 1), ("b", 4), ("a", 2), ("c", 1)]:
+        server.sync_deltas(node, TS, {DEFAULT_SKU: {"n": {node: amount}}})
+        reply = server.sync_deltas("client", TS, {DEFAULT_SKU: {"since": since}})["skus"][DEFAULT_SKU]
+        client.merge(reply["p"], reply["n"])
+        since = reply["vv"]
+    assert client.value() == server.inventory.value() == 100 - 2 - 4 - 1
+
+def test_multi_sku_endpoint():
+    body = {"node_id": "tab", "timestamp": TS, "skus": {"sku-1": {"p": {"tab": 5}}, "sku-2": {"n": {"tab": 1}}}}
+    data = TestClient(app).post("/api/v1/sync/inventory/sync/delta", json=body).json()
+    assert data["skus"]["sku-1"]["value"] == 5 and data["skus"]["sku-2"]["value"] == -1
+
+def test_running_totals_track_merges():
+    crdt = InventoryCRDT()
+    crdt.inc("a", 10)
+    crdt.merge({"a": 7, "b": 5}, {"b": 3})  # a=7 is stale, b is new
+    crdt.merge({"b": 4}, {"b": 2})          # both stale: no change
+    crdt.merge({"b": 6}, {})                # b grows by 1
+    assert crdt.value() == sum(crdt.P.values()) - sum(crdt.N.values()) == 13
+
+def test_store_concurrent_writers_lose_no_updates():
+    store = InventoryStore(shards=4)
+    skus = [f"sku-{i}" for i in range(16)]
+
+    def writer(node):
+        for _ in range(200):
+            for sku in skus:
+                store.dec(sku, node)
+
+    threads = [threading.Thread(target=writer, args=(f"dev-{t}",)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.values(skus) == {sku: -1600 for sku in skus}
+
+def test_store_merge_many():
+    store = InventoryStore(shards=8)
+    store.inc("x", "server", 50)
+    values = store.merge_many({"x": ({}, {"tab": 3}), "y": ({"server": 9}, {})})
+    assert values == {"x": 47, "y": 9}
+    assert len(store) == 2 and "y" in store and store.value("missing") == 0
+
+def test_stock_endpoint():
+    client = TestClient(app)
+    resp = client.get("/api/v1/sync/inventory/stock", params=[("sku", DEFAULT_SKU), ("sku", "unknown")])
+    assert resp.status_code == 200
+    assert resp.json()["unknown"] == 0
+
+def test_state_survives_restart_via_log_and_snapshot(tmp_path):
+    server = CRDTService(data_dir=str(tmp_path))
+    server.store.merge_many({DEFAULT_SKU: ({}, {"tab": 4}), "sku-2": ({"server": 30}, {"phone": 2})})
+    vv = server.sync_deltas("tab", TS, {"sku-2": {}})["skus"]["sku-2"]["vv"]
+    server.close()
+
+    # Log-only recovery; the seed stock is not re-added
+    replayed = CRDTService(data_dir=str(tmp_path))
+    assert replayed.stock_levels([DEFAULT_SKU, "sku-2"]) == {DEFAULT_SKU: 96, "sku-2": 28}
+    assert replayed.persistence.stats["replayed_records"] >= 2
+
+    replayed.checkpoint()
+    replayed.store.dec("sku-2", "phone", 1)
+    replayed.close()
+    assert len(list(tmp_path.glob("snapshot-*.bin"))) == 1
+
+    # Snapshot (lazy, via mmap) + the one record logged after it
+    restored = CRDTService(data_dir=str(tmp_path))
+    assert restored.persistence.stats["replayed_records"] == 1
+    assert restored.stock_levels(["sku-2", DEFAULT_SKU]) == {"sku-2": 27, DEFAULT_SKU: 96}
+    # Dots continue after the persisted sequence, so old version vectors still see new writes
+    restored.store.dec("sku-2", "tab", 1)
+    delta = restored.sync_deltas("x", TS, {"sku-2": {"since": vv}})["skus"]["sku-2"]
+    assert delta["n"] == {"tab": 1, "phone": 3}
+    restored.close()
+
+def test_torn_log_tail_is_truncated(tmp_path):
+    server = CRDTService(data_dir=str(tmp_path))
+    server.store.dec("sku-1", "tab", 5)
+    server.close()
+    log = sorted(tmp_path.glob("delta-*.log"))[-1]
+    with open(log, "ab") as f:
+        f.write(b'0000dead ["sku-1",[["N","tab",9')
+
+    restored = CRDTService(data_dir=str(tmp_path))
+    assert restored.store.value("sku-1") == -5
+    assert restored.persistence.stats["truncated_bytes"] > 0
+    restored.close()
+
+def test_compaction_folds_retired_devices_into_base():
+    server = CRDTService()
+    for node in ("old-tab", "phone"):
+        server.sync_deltas(node, TS, {DEFAULT_SKU: {"n": {node: 3}}})
+    server.squad_tracker.merge({"old-tab": 2, "phone": 1})
+
+    server.retire_device("old-tab")
+    report = server.compact()
+    assert report["retired"] == 1 and report["entries_reclaimed"] == 1 and report["approx_bytes_reclaimed"] > 0
+    assert "old-tab" not in server.inventory.N and server.inventory.N["~base"] == 3
+    assert server.inventory.value() == 94 and server.squad_tracker.value() == 3
+
+    # A stale copy relayed through a full-state client can't be added on top of the base
+    reply = server.handle_sync("phone", {}, {"old-tab": 3, "phone": 3}, TS, epoch=1)
+    assert reply["current_stock"] == 94
+    assert reply["compaction"] == {"epoch": 2, "retired": ["old-tab"]}
+    assert server.sync_deltas("old-tab", TS, {})["status"] == "RESET_REQUIRED"
+
+    # Forgotten only once the remaining replica acknowledged the epoch
+    assert server.compact()["pending_ack"] == 1
+    server.sync_deltas("phone", TS, {}, epoch=2)
+    assert server.compact()["forgotten"] == 1 and not server.retired
+    # ...but the tombstone stays: the ID is still filtered and still reset
+    assert "old-tab" in server.store.retired
+    assert server.sync_deltas("old-tab", TS, {}, epoch=2)["status"] == "RESET_REQUIRED"
+
+def test_device_returning_after_twice_the_ttl_is_still_reset():
+    server = CRDTService(device_ttl=60)
+    server.sync_deltas("D", TS, {"sku-1": {"p": {"D": 10}}})
+    server.sync_deltas("busy", TS, {})
+    t0 = server.replicas["D"]["seen"]
+    server.replicas["busy"]["seen"] = t0 + 90
+    server.compact(now=t0 + 90)                      # D is stale: retired and folded
+    server.sync_deltas("busy", TS, {}, epoch=2)
+    server.replicas["busy"]["seen"] = t0 + 200
+    report = server.compact(now=t0 + 200)            # acked and folded record expired
+    assert report["forgotten"] == 1 and "D" not in server.folded
+
+    # Returning with its old entries, claiming a current epoch, via the legacy route (epoch 0), or relayed
+    reset = server.sync_deltas("D", TS, {"sku-1": {"p": {"D": 10}}}, epoch=2)
+    assert reset["status"] == "RESET_REQUIRED" and reset["folded"] is None
+    assert server.handle_sync("D", {"D": 10}, {}, TS)["status"] == "RESET_REQUIRED"
+    server.sync_deltas("busy", TS, {"sku-1": {"p": {"D": 10}}}, epoch=2)
+    assert server.stock_levels(["sku-1"]) == {"sku-1": 10}
+
+def test_admin_routes_require_admin_role(monkeypatch):
+    client = TestClient(app)
+    assert client.post("/api/v1/sync/inventory/compact").status_code in (401, 403)
+    assert client.post("/api/v1/sync/inventory/devices/x/retire").status_code in (401, 403)
+
+    monkeypatch.setattr(crdt_service, "compact", lambda: {"retired": 0})
+    app.dependency_overrides[require_admin_role] = lambda: AuthenticatedUser(id="a", app_metadata={"role": "ROLE_ADMIN"})
+    try:
+        assert client.post("/api/v1/sync/inventory/compact").json() == {"retired": 0}
+    finally:
+        app.dependency_overrides.clear()
+
+def test_inactive_devices_retire_and_fold_survives_restart(tmp_path):
+    server = CRDTService(data_dir=str(tmp_path), device_ttl=60)
+    server.sync_deltas("idle", TS, {"sku-1": {"n": {"idle": 4}}})
+    server.sync_deltas("busy", TS, {"sku-1": {"n": {"busy": 1}}})
+    server.replicas["busy"]["seen"] += 120
+    assert server.compact(now=server.replicas["idle"]["seen"] + 90)["retired"] == 1
+    server.close()
+
+    restored = CRDTService(data_dir=str(tmp_path))
+    crdt = restored.store.counter("sku-1")
+    assert crdt.N == {"~base": 4, "busy": 1} and crdt.value() == -5
+    reset = restored.sync_deltas("idle", TS, {})
+    # The reply carries what was folded, so the device can re-submit anything beyond it
+    assert reset["status"] == "RESET_REQUIRED" and reset["folded"] == {"sku-1": {"p": 0, "n": 4}}
+    # Unknown but claiming an epoch: nothing proves it was forgotten, so it is re-registered
+    assert restored.sync_deltas("ghost", TS, {}, epoch=1)["status"] == "CONVERGED"
+
+    # Once "busy" acks epoch 2, "idle" is forgotten; the persisted forgotten epoch still
+    # identifies an unregistered device from before it
+    restored.sync_deltas("busy", TS, {}, epoch=2)
+    restored.sync_deltas("ghost", TS, {}, epoch=2)
+    assert restored.compact()["forgotten"] == 1 and restored.forgotten_epoch == 2
+    restored.close()
+    again = CRDTService(data_dir=str(tmp_path))
+    assert again.sync_deltas("gone", TS, {}, epoch=1)["status"] == "RESET_REQUIRED"
+    again.close()
+
+def test_in_memory_restart_accepts_returning_devices():
+    server = CRDTService()
+    first = server.sync_deltas("tab", TS, {DEFAULT_SKU: {"n": {"tab": 7}}})
+    epoch = first["compaction"]["epoch"]
+
+    restarted = CRDTService()  # no data dir: the restart forgot every replica
+    reply = restarted.sync_deltas("tab", TS, {DEFAULT_SKU: {"n": {"tab": 7}}}, epoch=epoch)
+    assert reply["status"] == "CONVERGED"
+    assert restarted.stock_levels([DEFAULT_SKU]) == {DEFAULT_SKU: 93}
+
+def test_replica_seen_is_persisted_lazily(tmp_path):
+    server = CRDTService(data_dir=str(tmp_path), device_ttl=60)
+    server.sync_deltas("tab", TS, {})
+    registered = server.replicas["tab"]["seen"]
+    server.replicas["tab"]["seen"] = registered - 1000  # pretend the registration write was long ago
+    server.sync_deltas("tab", TS, {}, epoch=1)          # within the save interval: only marked dirty
+    server.checkpoint()                                 # the checkpoint path writes it out
+    server.close()
+
+    restored = CRDTService(data_dir=str(tmp_path), device_ttl=60)
+    assert restored.replicas["tab"]["seen"] >= registered
+    assert restored.compact()["retired"] == 0
+    restored.close()
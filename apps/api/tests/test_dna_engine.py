@@ -0,0 +1,119 @@
+import asyncio
+import numpy as np
+from app.services.dna_generator import IncrementalDNAEngine, DNAGenerator, signal_product_id
+from app.services.vector_index import product_vector_index
+
+def _with_catalog():
+    previous = product_vector_index.snapshot
+    product_vector_index.build(["shoe", "laptop"], np.array([[1, 0], [0, 1]], np.float32))
+    return previous
+
+def test_folds_every_n_signals_with_decay():
+    previous = _with_catalog()
+    engine = IncrementalDNAEngine(every=3, debounce=0, half_life=10)
+    try:
+        state = engine._state("u")
+        for _ in range(3):
+            state.pending.append({"product_id": "laptop", "event_type": "view"})
+        engine.fold("u", now=state.updated_at)
+        assert np.argmax(state.embedding()) == 1
+
+        # Ten half-lives later a burst of shoe views dominates the decayed laptop history
+        for _ in range(3):
+            state.pending.append({"product_id": "shoe", "event_type": "view"})
+        engine.fold("u", now=state.updated_at + 100)
+    finally:
+        product_vector_index.snapshot = previous
+
+    embedding = state.embedding()
+    assert embedding[0] > 0.99 and state.signals == 6
+    assert engine.stats["folds"] == 2 and "u" in engine._dirty
+
+def test_observe_debounces_and_batches_upserts(monkeypatch):
+    previous = _with_catalog()
+    engine = IncrementalDNAEngine(every=2, debounce=0.01, flush_interval=0.02)
+    written = []
+
+    async def upsert_batch(rows):
+        written.append(rows)
+
+    async def no_rows(user_ids):
+        return {}
+    monkeypatch.setattr(DNAGenerator, "_upsert_dna_batch", staticmethod(upsert_batch))
+    monkeypatch.setattr(DNAGenerator, "_fetch_dna_batch", staticmethod(no_rows))
+
+    async def run():
+        for user in ("a", "b"):
+            for _ in range(5):  # burst: one fold per user, not one per signal
+                engine.observe(user, {"product_id": None, "event_type": "view", "metadata": {"path": "/products/x"}})
+                engine.observe(user, {"product_id": "shoe", "event_type": "click"})
+        await asyncio.sleep(0.08)
+        await engine.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        product_vector_index.snapshot = previous
+
+    assert engine.stats["folds"] == 2 and engine.stats["folded_signals"] == 20
+    assert len(written) == 1 and {r["user_id"] for r in written[0]} == {"a", "b"}
+    assert all(len(r["embedding"]) == 1536 for r in written[0])
+
+def test_first_flush_blends_persisted_dna_and_keeps_rich_summary(monkeypatch):
+    previous = _with_catalog()
+    engine = IncrementalDNAEngine(every=1, half_life=1e9)
+    written = []
+    stored = {
+        "u": {"user_id": "u", "dna_summary": "Loves trail running gear.", "embedding": "[1.0, 0.0]", "updated_at": None},
+        "v": {"user_id": "v", "dna_summary": "User has interacted with 40 items. Prefers Footwear.", "embedding": [1.0, 0.0]},
+    }
+
+    async def fetch(user_ids):
+        return {u: stored[u] for u in user_ids if u in stored}
+
+    async def upsert_batch(rows):
+        written.extend(rows)
+    monkeypatch.setattr(DNAGenerator, "_fetch_dna_batch", staticmethod(fetch))
+    monkeypatch.setattr(DNAGenerator, "_upsert_dna_batch", staticmethod(upsert_batch))
+
+    try:
+        for user in ("u", "v"):
+            engine._state(user).pending.append({"product_id": "laptop", "event_type": "view"})
+            engine.fold(user)
+        asyncio.run(engine.flush())
+    finally:
+        product_vector_index.snapshot = previous
+
+    rows = {r["user_id"]: r for r in written}
+    # One post-restart laptop view does not replace the stored shoe-leaning vector
+    assert rows["u"]["embedding"][0] > rows["u"]["embedding"][1] > 0
+    assert rows["u"]["dna_summary"] == "Loves trail running gear."
+    assert rows["v"]["dna_summary"].startswith("User has interacted with 41 items. Prefers Footwear")
+
+def test_evicted_dirty_user_is_still_flushed(monkeypatch):
+    previous = _with_catalog()
+    engine = IncrementalDNAEngine(every=100, max_users=1)
+    written = []
+
+    async def no_rows(user_ids):
+        return {}
+
+    async def upsert_batch(rows):
+        written.extend(rows)
+    monkeypatch.setattr(DNAGenerator, "_fetch_dna_batch", staticmethod(no_rows))
+    monkeypatch.setattr(DNAGenerator, "_upsert_dna_batch", staticmethod(upsert_batch))
+
+    try:
+        engine._state("a").pending.append({"product_id": "shoe", "event_type": "view"})  # below `every`
+        engine._state("b")  # evicts "a": its signal is folded and parked, not lost
+        assert "a" not in engine.users and engine.metrics()["retiring"] == 1
+        asyncio.run(engine.flush())
+    finally:
+        product_vector_index.snapshot = previous
+
+    assert [r["user_id"] for r in written] == ["a"] and engine.metrics()["retiring"] == 0
+
+def test_product_id_from_view_path():
+    pid = "0b8f6b1e-5d2a-4a8e-9d4e-1f2a3b4c5d6e"
+    assert signal_product_id({"metadata": {"path": f"/products/{pid}"}}) == pid
+    assert signal_product_id({"metadata": {"path": "/cart"}}) is None
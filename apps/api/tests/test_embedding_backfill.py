@@ -0,0 +1,58 @@
+import asyncio
+import json
+import httpx
+from app.core.http_pool import AsyncHTTPPool
+from app.services import embedding_backfill as backfill_module
+from app.services.embedding_backfill import EmbeddingBackfillJob
+from app.services.gemini import GeminiService
+
+PRODUCTS = [{"id": f"{i:08d}-0000-0000-0000-000000000000", "title": f"P{i}", "description": "d"} for i in range(5)]
+
+def _run_backfill(monkeypatch, tmp_path, embed):
+    updates = []
+
+    def handler(request):
+        if request.url.path.endswith("/rpc/bulk_set_product_embeddings"):
+            rows = json.loads(request.content)["p_rows"]
+            updates.append(rows)
+            return httpx.Response(200, json=len(rows))
+        after = request.url.params.get("id")
+        remaining = [p for p in PRODUCTS if not after or p["id"] > after[len("gt."):]]
+        return httpx.Response(200, json=remaining[:int(request.url.params["limit"])])
+
+    pool = AsyncHTTPPool(max_retries=0, backoff_base=0)
+    pool._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(backfill_module, "http_pool", pool)
+    monkeypatch.setattr(backfill_module, "SUPABASE_URL", "http://db")
+    monkeypatch.setattr(GeminiService, "generate_embeddings", staticmethod(embed))
+
+    job = EmbeddingBackfillJob(checkpoint_path=str(tmp_path / "ckpt.json"), page_size=3, batch_size=2, concurrency=2)
+    result = asyncio.run(job.run())
+    return job, result, updates
+
+def test_backfill_batches_and_bulk_writes_each_page(monkeypatch, tmp_path):
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return [[0.5] * 4 for _ in texts]
+
+    job, result, updates = _run_backfill(monkeypatch, tmp_path, embed)
+
+    assert result["completed"] and result["processed"] == 5 and result["failed"] == 0
+    assert sorted(calls) == [1, 2, 2]          # pages of 3 -> batches of 2 + 1, then 2
+    assert [len(rows) for rows in updates] == [3, 2]  # one bulk write per page
+    checkpoint = json.loads((tmp_path / "ckpt.json").read_text())
+    assert checkpoint["last_id"] == PRODUCTS[-1]["id"]
+
+def test_failed_batches_are_counted_not_written(monkeypatch, tmp_path):
+    def embed(texts):
+        if any(t.startswith("P0") for t in texts):
+            raise RuntimeError("quota")
+        return [[0.5] * 4 for _ in texts]
+
+    job, result, updates = _run_backfill(monkeypatch, tmp_path, embed)
+
+    written = {row["id"] for rows in updates for row in rows}
+    assert result["failed"] == 2 and result["processed"] == 3
+    assert PRODUCTS[0]["id"] not in written and PRODUCTS[1]["id"] not in written
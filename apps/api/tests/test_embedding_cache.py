@@ -0,0 +1,52 @@
+import pytest
+from app.services import gemini
+from app.services.embedding_cache import EmbeddingCache
+from app.services.gemini import GeminiService, EmbeddingError
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    monkeypatch.setattr(gemini, "embedding_cache", cache)
+    monkeypatch.setattr(gemini, "api_key", "test-key")
+    yield cache
+    cache.close()
+
+def test_unchanged_text_is_embedded_once(cache, monkeypatch):
+    calls = []
+
+    def embed_content(model, content, task_type, **kwargs):
+        calls.append(list(content))
+        return {"embedding": [[0.25, float(len(t))] for t in content]}
+
+    monkeypatch.setattr(gemini.genai, "embed_content", embed_content)
+
+    first = GeminiService.generate_embeddings(["a: x", "b: yy"])
+    second = GeminiService.generate_embeddings(["b: yy", "c: zzz", "a: x"])
+
+    assert calls == [["a: x", "b: yy"], ["c: zzz"]]  # only the miss goes to the API
+    assert second[0] == first[1] and second[2] == first[0]
+    assert cache.metrics()["hits"] == 2
+
+    # Keyed by task type too: a query embedding of the same text is a separate entry
+    GeminiService.generate_embedding("a: x", task_type="retrieval_query")
+    assert calls[-1] == ["a: x"]
+
+def test_failures_raise_and_are_not_cached(cache, monkeypatch):
+    def failing(**kwargs):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(gemini.genai, "embed_content", failing)
+    with pytest.raises(EmbeddingError):
+        GeminiService.generate_embedding("a: x")
+    assert cache.get(gemini.EMBEDDING_MODEL, "retrieval_document", "a: x") is None
+
+def test_zero_vectors_are_never_stored(cache):
+    cache.put("m", "retrieval_document", "t", [0.0] * 768)
+    assert cache.get("m", "retrieval_document", "t") is None
+    assert cache.metrics()["rejected"] == 1
+
+def test_cache_persists_across_instances(cache, tmp_path):
+    cache.put("m", "retrieval_document", "t", [0.5, -1.0])
+    reopened = EmbeddingCache(cache.path)
+    assert reopened.get("m", "retrieval_document", "t") == [0.5, -1.0]
+    reopened.close()
@@ -0,0 +1,121 @@
+import asyncio
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import inventory
+from app.services.spanner_ledger import LEDGER_MAX_UNCERTAINTY_MS, SpannerLedgerService
+
+def test_hot_sku_sells_exactly_its_stock_in_few_commits():
+    ledger = SpannerLedgerService(slabs=4)
+    ledger.add_sku("HOT", 500)
+
+    async def run():
+        return await asyncio.gather(*[ledger.execute_flash_sale_order("HOT", 1, uncertainty_ms=1) for _ in range(600)])
+
+    results = asyncio.run(run())
+    statuses = [r["status"] for r in results]
+    assert statuses.count("SUCCESS") == 500 and statuses.count("SOLD_OUT") == 100
+    assert ledger.get_stock("HOT") == 0
+    # Combined: a handful of commit waits, not one per buyer (and no retries)
+    assert ledger.stats["commits"] <= 16
+    assert all(r["metrics"]["attempts"] == 1 for r in results if r["status"] == "SUCCESS")
+
+def test_slab_borrows_before_selling_out():
+    ledger = SpannerLedgerService(slabs=4)
+    ledger.add_sku("RARE", 3)  # slabs hold 1, 1, 1, 0
+    result = asyncio.run(ledger.execute_flash_sale_order("RARE", 3, uncertainty_ms=0))
+    assert result["status"] == "SUCCESS" and ledger.get_stock("RARE") == 0
+
+def test_reservations_confirm_release_and_expire():
+    ledger = SpannerLedgerService(slabs=2)
+    ledger.add_sku("S", 10)
+
+    held = ledger.reserve("S", 4)
+    assert held["status"] == "RESERVED" and ledger.get_stock("S") == 6 and ledger.get_reserved("S") == 4
+    confirmed = asyncio.run(ledger.confirm_reservation(held["token"], uncertainty_ms=0))
+    assert confirmed["status"] == "SUCCESS" and ledger.get_stock("S") == 6 and ledger.get_reserved("S") == 0
+
+    released = ledger.reserve("S", 2)
+    assert ledger.release_reservation(released["token"])["status"] == "RELEASED"
+    assert ledger.get_stock("S") == 6
+
+    lapsed = ledger.reserve("S", 6, ttl=0)
+    assert ledger.get_stock("S") == 6  # expired on read, stock back
+    assert asyncio.run(ledger.confirm_reservation(lapsed["token"], uncertainty_ms=0))["status"] == "EXPIRED"
+    assert ledger.reserve("S", 7)["status"] == "SOLD_OUT"
+
+def test_non_positive_quantity_is_invalid_not_sold_out():
+    ledger = SpannerLedgerService(slabs=2)
+    ledger.add_sku("S", 10)
+    assert asyncio.run(ledger.execute_flash_sale_order("S", 0, uncertainty_ms=0))["status"] == "INVALID"
+    assert ledger.reserve("S", -1)["status"] == "INVALID"
+    assert ledger.stats["sold_out"] == 0 and ledger.stats["orders"] == 0
+
+def test_reservation_lookup_touches_only_its_sku():
+    ledger = SpannerLedgerService(slabs=1)
+    ledger.add_sku("A", 5)
+    ledger.add_sku("B", 5)
+    lapsed = ledger.reserve("B", 2, ttl=0)
+    held = ledger.reserve("A", 1)
+    assert ledger.release_reservation(held["token"])["status"] == "RELEASED"
+    # B's lapsed hold is untouched by a lookup on A, and its token is dropped once B is read
+    assert ledger.stats["expired"] == 0 and lapsed["token"] in ledger._tokens
+    assert ledger.get_stock("B") == 5 and ledger.stats["expired"] == 1
+    assert ledger._tokens == {}
+
+def test_flash_sale_endpoints():
+    client = TestClient(app)
+    held = client.post("/api/v1/inventory/flash-sale/reserve", params={"quantity": 2}).json()
+    assert held["status"] == "RESERVED"
+    assert client.post(f"/api/v1/inventory/flash-sale/reservations/{held['token']}/confirm").json()["status"] == "SUCCESS"
+    bought = client.post("/api/v1/inventory/flash-sale/buy", params={"quantity": 1, "uncertainty_ms": 3000}).json()
+    assert bought["status"] == "SUCCESS"
+    assert bought["metrics"]["uncertainty_window_ms"] == "DYNAMIC"  # epsilon is not a public knob
+    assert client.post("/api/v1/inventory/flash-sale/reserve", params={"sku": "NOPE"}).status_code == 404
+    assert client.post("/api/v1/inventory/flash-sale/buy", params={"quantity": 0}).status_code == 422
+    assert client.post("/api/v1/inventory/flash-sale/reserve", params={"quantity": -2}).status_code == 422
+    for ttl in ("1e12", "nan", "inf", "0"):
+        assert client.post("/api/v1/inventory/flash-sale/reserve", params={"ttl_seconds": ttl}).status_code == 422
+
+def test_ledger_routes_run_on_the_event_loop():
+    # Sync routes would run in the threadpool, racing _commit_batch on the loop
+    assert all(asyncio.iscoroutinefunction(route.endpoint) for route in inventory.router.routes if isinstance(route, APIRoute))
+
+def test_group_commit_shares_one_wait_across_skus():
+    ledger = SpannerLedgerService(slabs=1)
+    for i in range(20):
+        ledger.add_sku(f"S{i}", 5)
+
+    async def run():
+        return await asyncio.gather(*[ledger.execute_flash_sale_order(f"S{i}", 1, uncertainty_ms=5) for i in range(20)])
+
+    results = asyncio.run(run())
+    assert all(r["status"] == "SUCCESS" for r in results)
+    # 20 independent slab commits, one commit-wait, distinct consecutive timestamps
+    assert ledger.stats["commits"] == 20
+    assert ledger.group_commit.stats["groups"] == 1
+    stamps = sorted(r["commit_ts"] for r in results)
+    assert len(set(stamps)) == 20
+
+def test_large_epsilon_is_capped_and_does_not_stall_other_commits():
+    ledger = SpannerLedgerService(slabs=1)
+    ledger.add_sku("SLOW", 5)
+    ledger.add_sku("FAST", 5)
+
+    async def run():
+        slow = asyncio.ensure_future(ledger.execute_flash_sale_order("SLOW", 1, uncertainty_ms=3000))
+        fast = await ledger.execute_flash_sale_order("FAST", 1, uncertainty_ms=1)
+        stalled = not slow.done()
+        return fast, stalled, await slow
+
+    fast, stalled, slow = asyncio.run(run())
+    assert fast["metrics"]["commit_wait_ms"] == 1 and stalled
+    assert slow["metrics"]["commit_wait_ms"] == LEDGER_MAX_UNCERTAINTY_MS
+    assert ledger.group_commit.stats["groups"] == 2
+
+def test_ungrouped_commits_wait_individually():
+    ledger = SpannerLedgerService(slabs=1, group_commit=False)
+    ledger.add_sku("S", 5)
+    result = asyncio.run(ledger.execute_flash_sale_order("S", 1, uncertainty_ms=0))
+    assert result["status"] == "SUCCESS" and ledger.group_commit is None
@@ -0,0 +1,93 @@
+import random
+import threading
+
+from app.services.hlc import HLCTimestamp, HybridLogicalClock, LOGICAL_MASK
+
+# Property checks over seeded random schedules (same idea as hypothesis, no extra dependency)
+SEEDS = range(25)
+MS = 1_000_000  # clocks are injected in nanoseconds
+
+class FakeWall:
+    def __init__(self, rng: random.Random, start: int = 1_700_000_000_000):
+        self.rng = rng
+        self.ms = start
+
+    def __call__(self) -> int:
+        # Mostly still or creeping forward, sometimes stepping back (NTP slew)
+        self.ms += self.rng.choice((0, 0, 0, 1, 2, -3))
+        return self.ms * MS
+
+def _random_stamp(rng: random.Random, around: int) -> HLCTimestamp:
+    return HLCTimestamp.of(around + rng.randint(-50, 400), rng.randint(0, LOGICAL_MASK), rng.choice("abc"))
+
+def test_timestamps_strictly_increase_and_dominate_received_ones():
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        wall = FakeWall(rng)
+        clock = HybridLogicalClock("node", clock=wall)
+        last = clock.now()
+        for _ in range(500):
+            if rng.random() < 0.4:
+                remote = _random_stamp(rng, wall.ms)
+                ts = clock.update(remote)
+                assert ts.packed > remote.packed
+            else:
+                ts = clock.now()
+            assert ts > last
+            assert ts.wall_ms >= wall.ms  # never behind the wall clock
+            last = ts
+
+def test_logical_resets_when_wall_clock_advances():
+    wall = [1000]
+    clock = HybridLogicalClock("n", clock=lambda: wall[0] * MS)
+    clock.update(HLCTimestamp.of(1000, 7))
+    assert clock.latest_logical == 8
+    wall[0] = 1001
+    assert clock.now() == HLCTimestamp.of(1001, 0, "n")
+    # Remote ahead within the offset bound: adopt its wall time, logical = remote + 1
+    assert clock.update({"p": 1050 * 1_000_000, "l": 3}) == HLCTimestamp.of(1050, 4, "n")
+
+def test_logical_overflow_carries_into_next_millisecond():
+    clock = HybridLogicalClock("n", clock=lambda: 5 * MS)
+    clock.update(HLCTimestamp.of(5, LOGICAL_MASK))
+    assert (clock.latest_phys, clock.latest_logical) == (6, 0)
+
+def test_remote_clock_too_far_ahead_is_not_adopted():
+    clock = HybridLogicalClock("n", clock=lambda: 1000 * MS, max_offset_ms=100)
+    ts = clock.update(HLCTimestamp.of(5000, 0))
+    assert ts.wall_ms == 1000 and clock.rejected_remote == 1
+
+def test_encodings_round_trip_and_preserve_order():
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        stamps = [HLCTimestamp.of(rng.randint(0, 2**47), rng.randint(0, LOGICAL_MASK), rng.choice(["a", "b", "node-1"])) for _ in range(200)]
+        for ts in stamps:
+            assert HLCTimestamp.from_bytes(ts.to_bytes()) == ts
+            assert HLCTimestamp.parse(str(ts)) == ts
+            assert HLCTimestamp.coerce(ts.to_dict()) == ts
+        assert sorted(stamps, key=HLCTimestamp.to_bytes) == sorted(stamps)
+        assert sorted(stamps, key=str) == sorted(stamps)
+
+def test_concurrent_generation_is_unique():
+    clock = HybridLogicalClock("n")
+    results = [[] for _ in range(8)]
+
+    def worker(out):
+        for _ in range(2000):
+            out.append(clock.now_packed())
+
+    threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    merged = [ts for out in results for ts in out]
+    assert len(set(merged)) == len(merged)
+    assert all(out == sorted(out) for out in results)
+
+def test_now_range_reserves_consecutive_block():
+    wall = [1000]
+    clock = HybridLogicalClock("n", clock=lambda: wall[0] * MS)
+    first = clock.now_range(5)
+    assert first == HLCTimestamp.of(1000, 0).packed
+    assert clock.now().packed == first + 5
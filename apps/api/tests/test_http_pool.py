@@ -0,0 +1,36 @@
+import asyncio
+import httpx
+from app.core.http_pool import AsyncHTTPPool
+
+def _pool_with(handler) -> AsyncHTTPPool:
+    pool = AsyncHTTPPool(max_retries=2, backoff_base=0)
+    pool._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool
+
+def test_get_retries_transient_status():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 2 else 200, json=[])
+
+    pool = _pool_with(handler)
+    response = asyncio.run(pool.get("http://db/rest/v1/products?select=id"))
+
+    assert response.status_code == 200
+    stats = pool.metrics()["endpoints"]["GET /rest/v1/products"]
+    assert stats["calls"] == 2
+    assert stats["retries"] == 1
+
+def test_post_is_not_replayed_after_server_error():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    pool = _pool_with(handler)
+    response = asyncio.run(pool.post("http://db/rest/v1/orders", json={}))
+
+    assert response.status_code == 503
+    assert len(calls) == 1
@@ -0,0 +1,92 @@
+import httpx
+from urllib.parse import parse_qs, urlsplit
+from fastapi.testclient import TestClient
+from supabase import Client, ClientOptions
+from app.main import app
+from app.api.deps import get_current_user, get_current_user_remote
+from app.api.routers import orders
+from app.schemas.user import AuthenticatedUser
+from app.services.catalog_cache import catalog_cache
+
+USER_ID = "00000000-0000-0000-0000-0000000000aa"
+
+client = TestClient(app)
+
+def test_summary_listing_returns_item_counts_and_cursor(monkeypatch):
+    requests = []
+    rows = [
+        {"id": f"00000000-0000-0000-0000-00000000000{i}", "user_id": USER_ID, "total_amount": "10.00",
+         "status": "paid", "created_at": f"2024-01-0{i}T00:00:00+00:00", "item_count": [{"count": i}]}
+        for i in (3, 2, 1)
+    ]
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=rows)
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(orders, "get_supabase", lambda: Client("http://localhost:54321", "key", ClientOptions(httpx_client=http)))
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(id=USER_ID)
+    try:
+        response = client.get("/api/v1/orders/", params={"summary": "true", "limit": 2})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert [o["item_count"] for o in response.json()] == [3, 2]
+    assert response.json()[0]["items"] == []
+    assert "X-Next-Cursor" in response.headers
+
+    select = parse_qs(urlsplit(str(requests[0].url)).query)["select"][0]
+    assert "item_count:order_items(count)" in select
+    assert "price_at_purchase" not in select
+
+def test_checkout_retires_listings_of_purchased_products(monkeypatch):
+    product_id = "00000000-0000-0000-0000-0000000000b1"
+    order = {"id": "00000000-0000-0000-0000-000000000009", "user_id": USER_ID, "total_amount": "10.00",
+             "status": "paid", "created_at": "2024-01-01T00:00:00+00:00",
+             "items": [{"id": "00000000-0000-0000-0000-000000000010", "order_id": "00000000-0000-0000-0000-000000000009",
+                        "product_id": product_id, "quantity": 1, "price_at_purchase": "10.00"}]}
+
+    def handler(request):
+        if request.url.path.endswith("/rpc/checkout_cart"):
+            return httpx.Response(200, json=order)
+        return httpx.Response(200, json=[{"id": product_id, "category": "Books", "vendor_id": "v9"}])
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(orders, "get_supabase", lambda: Client("http://localhost:54321", "key", ClientOptions(httpx_client=http)))
+    app.dependency_overrides[get_current_user_remote] = lambda: AuthenticatedUser(id=USER_ID)
+    tags = ["products:all", "products:category:Books", "products:vendor:v9"]
+    before = [catalog_cache.generation(tag) for tag in tags]
+    try:
+        response = client.post("/api/v1/orders/checkout")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert [catalog_cache.generation(tag) for tag in tags] == [g + 1 for g in before]
+
+def test_checkout_succeeds_when_cache_invalidation_fails(monkeypatch):
+    order = {"id": "00000000-0000-0000-0000-000000000009", "user_id": USER_ID, "total_amount": "10.00",
+             "status": "paid", "created_at": "2024-01-01T00:00:00+00:00",
+             "items": [{"id": "00000000-0000-0000-0000-000000000010", "order_id": "00000000-0000-0000-0000-000000000009",
+                        "product_id": "00000000-0000-0000-0000-0000000000b1", "quantity": 1, "price_at_purchase": "10.00"}]}
+
+    def handler(request):
+        if request.url.path.endswith("/rpc/checkout_cart"):
+            return httpx.Response(200, json=order)
+        raise httpx.ReadTimeout("products lookup timed out", request=request)
+
+    def broken_invalidation(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(orders, "get_supabase", lambda: Client("http://localhost:54321", "key", ClientOptions(httpx_client=http)))
+    monkeypatch.setattr(orders, "invalidate_product", broken_invalidation)
+    app.dependency_overrides[get_current_user_remote] = lambda: AuthenticatedUser(id=USER_ID)
+    try:
+        response = client.post("/api/v1/orders/checkout")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200 and response.json()["id"] == order["id"]
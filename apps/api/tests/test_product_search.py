@@ -0,0 +1,73 @@
+import asyncio
+import time
+import numpy as np
+from app.services import product_search as search_module
+from app.services.gemini import GeminiService
+from app.services.product_search import BM25Index, HybridProductSearch, reciprocal_rank_fusion
+from app.services.vector_index import product_vector_index
+
+PRODUCTS = [
+    {"id": "p1", "title": "Wireless Noise Cancelling Headphones", "description": "Over-ear, 30h battery", "category": "Electronics", "price": 348, "images": ["h.jpg"]},
+    {"id": "p2", "title": "Ergonomic Office Chair", "description": "Mesh back, lumbar support", "category": "Home", "price": 1250, "images": []},
+    {"id": "p3", "title": "Studio Monitor Headphones", "description": "Closed-back, wired", "category": "Electronics", "price": 99, "images": []},
+]
+
+def _search():
+    search = HybridProductSearch()
+    search._last_attempt = time.monotonic()  # no background reload in tests
+    for p in PRODUCTS:
+        search.upsert(p)
+    return search
+
+def test_bm25_ranks_and_updates_incrementally():
+    index = BM25Index()
+    for p in PRODUCTS:
+        index.add(p["id"], f"{p['title']} {p['description']}")
+
+    assert [d for d, _ in index.search("noise cancelling headphones", 3)][:2] == ["p1", "p3"]
+
+    index.remove("p1")
+    index.add("p3", "Studio Monitor Speakers")  # replace
+    assert index.search("headphones", 3) == []
+    assert len(index) == 2 and "headphone" not in index.postings
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([("a", 9.0), ("b", 5.0)], [("b", 0.9), ("c", 0.8)])
+    assert fused[0][0] == "b"
+
+def test_slow_embedding_degrades_to_lexical_within_budget(monkeypatch):
+    search = _search()
+    monkeypatch.setattr(search_module, "EMBED_BUDGET_MS", 20)
+
+    def slow_embedding(text, task_type):
+        time.sleep(0.3)
+        return [1.0]
+
+    monkeypatch.setattr(GeminiService, "generate_embedding", staticmethod(slow_embedding))
+    result = asyncio.run(search.retrieve("headphones", k=2))
+
+    assert {p["id"] for p in result.products} == {"p1", "p3"}
+    assert result.timings_ms["total"] < 200
+    assert search.stats["budget_overruns"]["embed"] == 1 and search.stats["lexical_only"] == 1
+    # Stage timings are reported through metrics(), not logged per request
+    assert search.metrics()["avg_stage_ms"]["embed"] >= 20 and "vector" not in search.metrics()["avg_stage_ms"]
+
+def test_vector_stage_is_fused_with_lexical(monkeypatch):
+    search = _search()
+    previous = product_vector_index.snapshot
+    # p2 is the semantic match even though it shares no words with the query
+    product_vector_index.build(["p1", "p2", "p3"], np.array([[1, 0, 0], [0, 1, 0], [0.9, 0, 0.1]], np.float32))
+    monkeypatch.setattr(GeminiService, "generate_embedding", staticmethod(lambda text, task_type: [0.0, 1.0]))
+
+    async def no_knowledge(vector, count):
+        return [{"id": "k1", "content": "Returns within 30 days", "metadata": {"source": "faq.md"}}]
+    monkeypatch.setattr(HybridProductSearch, "_match_knowledge", staticmethod(no_knowledge))
+
+    try:
+        result = asyncio.run(search.retrieve("something to sit on", k=3))
+    finally:
+        product_vector_index.snapshot = previous
+
+    assert result.products[0]["id"] == "p2"
+    assert result.knowledge[0]["metadata"]["source"] == "faq.md"
+    assert "vector" in result.timings_ms
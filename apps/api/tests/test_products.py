@@ -0,0 +1,144 @@
+import base64
+import json
+
+import httpx
+import pytest
+from urllib.parse import parse_qs, urlsplit
+from fastapi.testclient import TestClient
+from supabase import Client, ClientOptions
+from app.main import app
+from app.api.pagination import decode_cursor
+from app.api.routers import products
+from app.services.catalog_cache import catalog_cache, invalidate_product
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def clear_catalog_cache():
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+ROWS = [
+    {
+        "id": f"00000000-0000-0000-0000-00000000000{i}",
+        "vendor_id": "00000000-0000-0000-0000-0000000000aa",
+        "title": f"Item {i}",
+        "description": None,
+        "price": "10.00",
+        "stock": 5,
+        "images": [],
+        "category": "Electronics",
+        "created_at": f"2024-01-0{i}T00:00:00+00:00",
+    }
+    for i in (3, 2, 1)
+]
+
+def _supabase(requests):
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=ROWS)
+    http = httpx.Client(transport=httpx.MockTransport(handler))
+    return Client("http://localhost:54321", "key", ClientOptions(httpx_client=http))
+
+def test_list_products_projects_columns_and_returns_cursor(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+
+    response = client.get("/api/v1/products/", params={"limit": 2, "category": "Electronics"})
+
+    assert response.status_code == 200
+    assert [p["title"] for p in response.json()] == ["Item 3", "Item 2"]
+    assert decode_cursor(response.headers["X-Next-Cursor"]) == (ROWS[1]["created_at"], ROWS[1]["id"])
+
+    params = parse_qs(urlsplit(str(requests[0].url)).query)
+    assert "embedding" not in params["select"][0]
+    assert params["limit"] == ["3"]
+    assert params["category"] == ["eq.Electronics"]
+
+def test_list_products_seeks_past_cursor(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+    first = client.get("/api/v1/products/", params={"limit": 2})
+
+    client.get("/api/v1/products/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+
+    params = parse_qs(urlsplit(str(requests[1].url)).query)
+    assert params["or"] == [f'(created_at.lt."{ROWS[1]["created_at"]}",and(created_at.eq."{ROWS[1]["created_at"]}",id.lt.{ROWS[1]["id"]}))']
+
+def test_list_products_rejects_garbage_cursor(monkeypatch):
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase([]))
+    assert client.get("/api/v1/products/", params={"cursor": "!!"}).status_code == 400
+
+def test_list_products_rejects_cursor_with_injected_filter_terms(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+    forged = [
+        {"s": ROWS[1]["created_at"], "i": "0),vendor_id.eq.x,and(id.gt.0"},
+        {"s": '2024-01-01",id.gt."0', "i": ROWS[1]["id"]},
+        {"s": 5, "i": ROWS[1]["id"]},
+    ]
+    for payload in forged:
+        cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+        assert client.get("/api/v1/products/", params={"cursor": cursor}).status_code == 400
+    assert requests == []
+
+def test_list_products_is_cached_and_revalidates_with_etag(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+
+    first = client.get("/api/v1/products/", params={"category": "Electronics"})
+    second = client.get("/api/v1/products/", params={"category": "Electronics"}, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert second.status_code == 304
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"  # always revalidate; never served stale
+    assert len(requests) == 1
+
+def test_product_write_invalidates_matching_listings_only(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+    client.get("/api/v1/products/", params={"category": "Electronics"})
+    client.get("/api/v1/products/", params={"category": "Books"})
+
+    invalidate_product(categories=["Books"], vendor_id="someone-else")
+    client.get("/api/v1/products/", params={"category": "Electronics"})
+    client.get("/api/v1/products/", params={"category": "Books"})
+
+    assert len(requests) == 3
+    assert parse_qs(urlsplit(str(requests[2].url)).query)["category"] == ["eq.Books"]
+
+class _SharedTier:
+    """In-memory stand-in for the Redis tier all workers share."""
+    def __init__(self):
+        self.entries, self.generations = {}, {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries[key] = entry
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def generation(self, tag):
+        return self.generations.get(tag, 0)
+
+    def bump(self, tag):
+        self.generations[tag] = self.generations.get(tag, 0) + 1
+
+def test_product_invalidation_on_another_worker_retires_local_item_copy(monkeypatch):
+    requests = []
+    monkeypatch.setattr(products, "get_supabase", lambda: _supabase(requests))
+    shared = _SharedTier()
+    monkeypatch.setattr(catalog_cache, "shared", shared)
+    product_id = ROWS[0]["id"]
+
+    client.get(f"/api/v1/products/{product_id}")
+    client.get(f"/api/v1/products/{product_id}")
+    assert len(requests) == 1  # served from this worker's local tier
+
+    shared.bump(f"product:{product_id}")  # another worker handled a write to this product
+    client.get(f"/api/v1/products/{product_id}")
+    assert len(requests) == 2
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from app.services.prompt_cache import PromptCache, Completion
+
+def test_identical_concurrent_prompts_cost_one_call():
+    cache = PromptCache()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return Completion("hello", prompt_tokens=10, output_tokens=5)
+
+    async def burst():
+        first = await asyncio.gather(*[cache.complete("gemini-pro", "  Hi   Jarvis\n", call) for _ in range(20)])
+        again = await cache.complete("gemini-pro", "Hi Jarvis", call)  # whitespace-normalized hit
+        return first, again
+
+    first, again = asyncio.run(burst())
+
+    assert first == ["hello"] * 20 and again == "hello"
+    assert len(calls) == 1
+    metrics = cache.metrics()
+    assert metrics["coalesced"] == 19 and metrics["hits"] == 1
+    assert metrics["prompt_tokens"] == 10 and metrics["tokens_saved"] == 15
+
+def test_models_do_not_share_entries_and_failures_are_not_cached():
+    cache = PromptCache()
+    outcomes = iter([RuntimeError("quota"), Completion("ok")])
+
+    async def call():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.complete("gemini-pro", "p", call)
+        return await cache.complete("gemini-pro", "p", call)
+
+    assert asyncio.run(run()) == "ok"
+    assert cache.metrics()["errors"] == 1
+
+    async def other_model():
+        return Completion("pro")
+    assert asyncio.run(cache.complete("gemini-1.5-pro", "p", other_model)) == "pro"
+
+def test_lru_evicts_oldest_entry():
+    cache = PromptCache(maxsize=2)
+
+    async def run():
+        for prompt in ["a", "b", "c"]:
+            async def call(p=prompt):
+                return Completion(p)
+            await cache.complete("m", prompt, call)
+
+    asyncio.run(run())
+    assert cache.metrics()["entries"] == 2
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.consistency_service import ConsistencyService, consistency_service
+
+FAST, SLOW = 0.005, 0.3
+
+def _service() -> ConsistencyService:
+    return ConsistencyService(latency={"US-EAST": FAST, "EU-WEST": FAST, "AP-SOUTH": SLOW})
+
+def test_quorum_write_returns_after_w_acks_and_straggler_catches_up():
+    service = _service()
+
+    async def run():
+        t0 = time.perf_counter()
+        result = await service.write_review("p1", {"stars": 5})
+        elapsed = time.perf_counter() - t0
+        # the slow region has not applied it yet...
+        assert "p1" not in service._distributed_store["AP-SOUTH"]
+        await service.drain()
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert result["status"] == "SUCCESS" and sorted(result["acked"]) == ["EU-WEST", "US-EAST"]
+    assert elapsed < SLOW / 2
+    # ...but it does in the background
+    assert service._distributed_store["AP-SOUTH"]["p1"][0] == {"stars": 5}
+    assert service.stats["background_acks"] == 1
+
+def test_all_waits_for_every_replica():
+    service = _service()
+    result = asyncio.run(service.write_review("p1", {"stars": 1}, consistency_level="ALL"))
+    assert result["status"] == "SUCCESS" and len(result["acked"]) == 3
+
+def test_unreachable_replica_gets_hint_handed_off_on_recovery():
+    service = _service()
+    service.set_down("AP-SOUTH")
+
+    async def run():
+        assert (await service.write_review("p1", {"stars": 4}))["status"] == "SUCCESS"
+        assert (await service.write_review("p1", {"stars": 2}))["status"] == "SUCCESS"
+        await service.drain()
+        assert service.metrics()["pending_hints"] == {"AP-SOUTH": 1}  # newest version only
+        assert (await service.write_review("p1", {"stars": 1}, consistency_level="ALL"))["status"] == "FAILURE"
+        await service.drain()
+
+        service.set_down("AP-SOUTH", False)
+        await service.write_review("p2", {"stars": 3})  # any request starts the handoff
+        await service.drain()
+
+    asyncio.run(run())
+    assert service._distributed_store["AP-SOUTH"]["p1"][0] == {"stars": 1}
+    assert service.stats["hints_delivered"] >= 1 and not service.metrics()["pending_hints"]
+
+def test_quorum_read_returns_newest_and_repairs_stale_replicas():
+    service = _service()
+
+    async def run():
+        await service.write_review("p1", {"stars": 5}, consistency_level="ALL")
+        # A newer version that reached only one fast replica
+        newer = service.clock.now_packed()
+        service._distributed_store["EU-WEST"]["p1"] = ({"stars": 3}, newer)
+
+        t0 = time.perf_counter()
+        result = await service.read_review("p1")
+        elapsed = time.perf_counter() - t0
+        await service.drain()
+        return result, newer, elapsed
+
+    result, newer, elapsed = asyncio.run(run())
+    assert result["status"] == "SUCCESS" and result["review"] == {"stars": 3}
+    assert elapsed < SLOW / 2
+    assert all(store["p1"] == ({"stars": 3}, newer) for store in service._distributed_store.values())
+    assert service.stats["read_repairs"] == 2
+
+def test_read_quorum_unreachable():
+    service = _service()
+    service.set_down("US-EAST")
+    service.set_down("EU-WEST")
+
+    async def run():
+        one = await service.read_review("missing", consistency_level="ONE")
+        quorum = await service.read_review("missing")
+        await service.drain()
+        return one, quorum
+
+    one, quorum = asyncio.run(run())
+    assert one["status"] == "SUCCESS" and one["review"] is None
+    assert quorum["status"] == "FAILURE"
+
+def test_unknown_consistency_level_is_rejected():
+    with pytest.raises(ValueError):
+        _service().quorum("TWO")
+    client = TestClient(app)
+    assert client.get("/api/v1/reviews/global", params={"product_id": "p1", "consistency_level": "quorum"}).status_code == 422
+    assert client.post("/api/v1/reviews/global", params={"product_id": "p1", "consistency_level": "TWO"}, json={}).status_code == 422
+
+def test_shutdown_drains_background_replication(monkeypatch):
+    monkeypatch.setattr(consistency_service, "latency", {"US-EAST": FAST, "EU-WEST": FAST, "AP-SOUTH": SLOW})
+    with TestClient(app) as client:
+        written = client.post("/api/v1/reviews/global", params={"product_id": "drain-1"}, json={"stars": 4}).json()
+        assert written["status"] == "SUCCESS"
+    # the straggler ran to completion on shutdown instead of being dropped with the loop
+    assert consistency_service._distributed_store["AP-SOUTH"]["drain-1"][0] == {"stars": 4}
@@ -0,0 +1,45 @@
+import time
+import jwt
+import pytest
+from app.core.jwt_verifier import TokenVerifier
+
+SECRET = "test-secret-with-at-least-32-characters"
+
+def _token(**overrides) -> str:
+    claims = {
+        "sub": "user-1",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "exp": int(time.time()) + 300,
+        "app_metadata": {"role": "ROLE_VENDOR"},
+        **overrides,
+    }
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+def test_hs256_token_verified_locally_and_cached():
+    verifier = TokenVerifier(secret=SECRET, jwks_url=None)
+    token = _token()
+
+    user = verifier.verify_local(token)
+    assert user.id == "user-1"
+    assert user.app_metadata.get("role") == "ROLE_VENDOR"
+    assert verifier.cached(token) == user
+
+def test_rejects_bad_signature_and_expired_tokens():
+    verifier = TokenVerifier(secret=SECRET, jwks_url=None)
+    forged = jwt.encode({"sub": "x", "aud": "authenticated", "exp": int(time.time()) + 60}, "other-secret-other-secret-other-secret", algorithm="HS256")
+
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify_local(forged)
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify_local(_token(exp=int(time.time()) - 10))
+
+def test_without_key_material_defers_to_remote():
+    verifier = TokenVerifier(secret=None, jwks_url=None)
+    assert verifier.verify_local(_token()) is None
+
+def test_cache_never_outlives_token_expiry():
+    verifier = TokenVerifier(secret=SECRET, jwks_url=None, ttl=3600)
+    token = _token()
+    verifier.remember(token, verifier.user_from_claims(jwt.decode(token, options={"verify_signature": False})), exp=time.time() - 1)
+    assert verifier.cached(token) is None
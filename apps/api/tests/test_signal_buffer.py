@@ -0,0 +1,67 @@
+import asyncio
+from app.services.signal_buffer import SignalBuffer
+
+def _row(i):
+    return {"user_id": "u", "product_id": None, "event_type": "scroll", "metadata": {"i": i}, "created_at": "t"}
+
+def _buffer(monkeypatch, insert, **kwargs):
+    buffer = SignalBuffer(**{"capacity": 100, "flush_size": 10, "flush_interval": 0.02, **kwargs})
+    monkeypatch.setattr(buffer, "_insert", insert)
+    return buffer
+
+def test_flushes_by_size_and_interval_then_drains(monkeypatch):
+    batches = []
+
+    async def insert(batch):
+        batches.append(len(batch))
+
+    buffer = _buffer(monkeypatch, insert)
+
+    async def run():
+        await buffer.start()
+        for i in range(25):
+            assert buffer.offer(_row(i))
+        await asyncio.sleep(0.1)           # two full batches by size, remainder by interval
+        assert buffer.offer_many([_row(i) for i in range(3)]) == 3
+        await buffer.stop()                # drain on shutdown
+
+    asyncio.run(run())
+    assert batches[:2] == [10, 10] and sum(batches) == 28
+    assert buffer.metrics()["buffered"] == 0 and buffer.stats["flushed"] == 28
+
+def test_backpressure_and_drop_counters_when_db_is_slow(monkeypatch):
+    async def slow_insert(batch):
+        await asyncio.sleep(10)
+
+    buffer = _buffer(monkeypatch, slow_insert, capacity=15, flush_size=5, drain_timeout=0.05)
+
+    async def run():
+        await buffer.start()
+        accepted = sum(buffer.offer(_row(i)) for i in range(30))
+        await asyncio.sleep(0.05)
+        await buffer.stop()
+        return accepted
+
+    accepted = asyncio.run(run())
+    assert accepted == 15
+    assert buffer.stats["dropped_full"] == 15
+    assert buffer.stats["flushed"] == 0 and buffer.stats["dropped_failed"] > 0
+
+def test_failed_batch_is_requeued_once(monkeypatch):
+    calls = []
+
+    async def flaky_insert(batch):
+        calls.append(len(batch))
+        if len(calls) <= 2:
+            raise RuntimeError("db unavailable")
+
+    buffer = _buffer(monkeypatch, flaky_insert, max_retries=1, backoff_base=0)
+
+    async def run():
+        await buffer.start()
+        buffer.offer_many([_row(i) for i in range(10)])
+        await asyncio.sleep(0.05)
+        await buffer.stop()
+
+    asyncio.run(run())
+    assert buffer.stats["requeued"] == 10 and buffer.stats["flushed"] == 10
@@ -0,0 +1,22 @@
+from app.core.supabase_pool import SupabaseClientRegistry
+
+KEYS = {"default": "key", "anon": "anon-key", "service": "service-key"}
+
+def test_role_clients_are_reused():
+    registry = SupabaseClientRegistry("http://localhost:54321", KEYS)
+    assert registry.client("default") is registry.client("default")
+    assert registry.anon() is not registry.service()
+    assert registry.metrics()["clients_built"] == 3
+    registry.shutdown()
+
+def test_user_clients_share_pool_and_cache():
+    registry = SupabaseClientRegistry("http://localhost:54321", KEYS)
+    first = registry.for_user("token-a")
+    assert registry.for_user("token-a") is first
+    assert first.options.headers["Authorization"] == "Bearer token-a"
+    assert first.options.httpx_client is registry.service().options.httpx_client
+
+    metrics = registry.metrics()
+    assert metrics["user_client_hits"] == 1
+    assert metrics["user_client_misses"] == 1
+    registry.shutdown()
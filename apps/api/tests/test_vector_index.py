@@ -0,0 +1,40 @@
+import numpy as np
+from app.services.vector_index import ProductVectorIndex, recency_weighted_centroid, parse_vector
+
+def _catalog(n=3000, dims=32, clusters=40, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.1 * rng.normal(size=(n, dims))
+    return [f"p{i}" for i in range(n)], vectors.astype(np.float32)
+
+def test_recency_weighting_favours_latest_view():
+    latest, older = np.array([1.0, 0.0], np.float32), np.array([0.0, 1.0], np.float32)
+    centroid = recency_weighted_centroid(np.stack([latest, older]), half_life=1)
+    assert centroid[0] > centroid[1]
+    assert np.isclose(np.linalg.norm(centroid), 1.0)
+
+def test_ivf_matches_exact_search_and_excludes_history():
+    ids, vectors = _catalog()
+    exact = ProductVectorIndex(exact_max=10**9)
+    ann = ProductVectorIndex(exact_max=100, nprobe=8)
+    exact.build(ids, vectors)
+    ann.build(ids, vectors)
+    assert exact.snapshot.ivf is None and ann.snapshot.ivf is not None
+
+    history = ["p7", "p42"]
+    truth = {pid for pid, _ in exact.recommend(history, 10)}
+    found = ann.recommend(history, 10)
+
+    assert not {pid for pid, _ in found} & set(history)
+    assert len(truth & {pid for pid, _ in found}) >= 8   # recall@10 >= 0.8
+    assert [s for _, s in found] == sorted((s for _, s in found), reverse=True)
+
+def test_unknown_history_signals_fallback():
+    index = ProductVectorIndex()
+    assert index.recommend(["p1"], 5) is None
+    index.build(["p1", "p2"], np.eye(2, dtype=np.float32))
+    assert index.recommend(["missing"], 5) is None
+    assert index.recommend(["p1"], 5) == [("p2", 0.0)]
+
+def test_parse_vector_accepts_pgvector_text():
+    assert parse_vector("[0.5,-1]").tolist() == [0.5, -1.0]
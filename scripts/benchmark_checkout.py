@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import time
+import uuid
+import httpx
+
+# Drives concurrent checkouts of ONE hot product against a running API + Supabase stack.
+#
+#   API_URL=http://127.0.0.1:8000 BENCH_TOKENS=tok1,tok2,... BENCH_PRODUCT_ID=<uuid> \
+#       python scripts/benchmark_checkout.py
+#
+# Each token is a distinct buyer: add 1 unit to cart -> POST /checkout (with Idempotency-Key).
+# Afterwards we verify there was no overselling: units sold == stock delta.
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+TOKENS = [t for t in os.getenv("BENCH_TOKENS", "").split(",") if t]
+PRODUCT_ID = os.getenv("BENCH_PRODUCT_ID")
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "3"))
+
+async def get_stock(client: httpx.AsyncClient) -> int:
+    # Checkout drops the cached detail entry, so this read reflects the committed stock
+    resp = await client.get(f"{API_URL}/api/v1/products/{PRODUCT_ID}")
+    return int(resp.json()["stock"])
+
+async def buyer(client: httpx.AsyncClient, token: str) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    await client.post(f"{API_URL}/api/v1/cart/items", json={"product_id": PRODUCT_ID, "quantity": 1}, headers=headers)
+
+    t0 = time.perf_counter()
+    resp = await client.post(
+        f"{API_URL}/api/v1/orders/checkout",
+        headers={**headers, "Idempotency-Key": str(uuid.uuid4())}
+    )
+    latency = (time.perf_counter() - t0) * 1000
+    return {"status": resp.status_code, "latency": latency, "detail": resp.json().get("detail") if resp.status_code != 200 else None}
+
+async def benchmark_checkout():
+    print("--- CHECKOUT CONCURRENCY BENCHMARK ---")
+    if not TOKENS or not PRODUCT_ID:
+        print("Set BENCH_TOKENS (comma-separated access tokens) and BENCH_PRODUCT_ID.")
+        sys.exit(1)
+
+    print(f"Buyers: {len(TOKENS)} concurrent | Rounds: {ROUNDS} | Product: {PRODUCT_ID}")
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        stock_before = await get_stock(client)
+        results = []
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            results += await asyncio.gather(*[buyer(client, t) for t in TOKENS])
+        wall = time.perf_counter() - t0
+        stock_after = await get_stock(client)
+
+    ok = [r for r in results if r["status"] == 200]
+    sold_out = [r for r in results if r["detail"] and "Insufficient stock" in r["detail"]]
+    errors = len(results) - len(ok) - len(sold_out)
+
+    latencies = sorted(r["latency"] for r in results)
+    p50 = latencies[int(len(latencies) * 0.5)]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    print(f"\n{'Checkouts':<12} | {'OK':<6} | {'Sold Out':<9} | {'Errors':<7} | {'p50 (ms)':<9} | {'p99 (ms)':<9} | {'Throughput'}")
+    print("-" * 85)
+    print(f"{len(results):<12} | {len(ok):<6} | {len(sold_out):<9} | {errors:<7} | {p50:<9.1f} | {p99:<9.1f} | {len(results) / wall:.1f} req/s")
+
+    delta = stock_before - stock_after
+    print(f"\nStock: {stock_before} -> {stock_after} (delta {delta}), units sold: {len(ok)}")
+    if delta == len(ok) and stock_after >= 0:
+        print("[PASS] No overselling: every successful checkout maps to exactly one decremented unit.")
+    else:
+        print("[FAIL] Stock delta does not match successful checkouts.")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark_checkout())
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple
+
+import httpx
+from fastapi import APIRouter, FastAPI, Query
+from app.routers import inventory
+from app.services.spanner_ledger import SpannerLedgerService, spanner_service
+
+# Parametric flash-sale contention suite: closed-loop buyers against the ledger service
+# directly, or through POST /api/v1/inventory/flash-sale/buy (the inventory router served
+# in-process over ASGI, so no Supabase/Redis stack is needed). The public route has no
+# epsilon knob; the benchmark mounts its own buy route in front of it to pin epsilon.
+#
+#   cd apps/api && PYTHONPATH=. python ../../scripts/benchmark_flash_sale.py --target both \
+#       --json out.json --csv out.csv --baseline ../../scripts/baselines/flash_sale.json
+#
+# Every scenario is seeded, so two runs issue the same orders; only the timings move.
+# --update-baseline rewrites the baseline; otherwise a regression beyond --tolerance exits 1.
+# Sell-outs are a property of the workload and are reported apart from aborts: abort_rate is
+# the share of attempts lost to contention or failure (retried or final FAILURE).
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "flash_sale.json")
+BUY_PATH = "/api/v1/inventory/flash-sale/buy"
+
+CONCURRENCY = (16, 128, 512)
+ZIPF = (0.0, 1.2)                    # 0 = uniform over SKUs
+QUANTITIES = ("1", "uniform:1-4")
+UNCERTAINTY_MS = (1, 10)
+
+class Scenario(NamedTuple):
+    target: str
+    concurrency: int
+    zipf: float
+    quantity: str
+    uncertainty_ms: float
+    skus: int
+    orders: int
+    stock_ratio: float  # stock per SKU = ratio * its uniform share of demand
+
+    @property
+    def name(self) -> str:
+        return f"{self.target}/c{self.concurrency}/z{self.zipf:g}/q{self.quantity}/u{self.uncertainty_ms:g}"
+
+bench_router = APIRouter()
+
+@bench_router.post("/flash-sale/buy")
+async def bench_buy(sku: str, quantity: int = Query(1, ge=1), uncertainty_ms: float = 0.0):
+    return await spanner_service.execute_flash_sale_order(sku, quantity, uncertainty_ms=uncertainty_ms)
+
+def zipf_sampler(rng: random.Random, n: int, s: float):
+    cum, total = [], 0.0
+    for k in range(1, n + 1):
+        total += 1.0 / k ** s
+        cum.append(total)
+    population = range(n)
+    return lambda: rng.choices(population, cum_weights=cum)[0]
+
+def quantity_sampler(rng: random.Random, spec: str):
+    """"3" (fixed), "uniform:1-4" or "geometric:0.5" (capped at 10)."""
+    kind, _, arg = spec.partition(":")
+    if kind == "uniform":
+        lo, hi = (int(x) for x in arg.split("-"))
+        return lambda: rng.randint(lo, hi)
+    if kind == "geometric":
+        p = float(arg)
+        return lambda: min(10, next(k for k in itertools.count(1) if rng.random() < p))
+    fixed = int(kind)
+    return lambda: fixed
+
+def mean_quantity(spec: str) -> float:
+    rng = random.Random(0)
+    sample = quantity_sampler(rng, spec)
+    return sum(sample() for _ in range(10_000)) / 10_000
+
+def workload(scenario: Scenario) -> List[tuple]:
+    rng = random.Random(f"{scenario.zipf}/{scenario.quantity}/{scenario.orders}")
+    pick_sku = zipf_sampler(rng, scenario.skus, scenario.zipf)
+    pick_qty = quantity_sampler(rng, scenario.quantity)
+    return [(pick_sku(), pick_qty()) for _ in range(scenario.orders)]
+
+def percentile(sorted_ms: List[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+async def run_scenario(scenario: Scenario, max_retries: int, run_id: int) -> Dict[str, Any]:
+    orders = workload(scenario)
+    stock = max(1, round(scenario.stock_ratio * scenario.orders * mean_quantity(scenario.quantity) / scenario.skus))
+    prefix = f"BENCH-{run_id}-"
+
+    if scenario.target == "service":
+        ledger = SpannerLedgerService()
+        client = None
+
+        async def buy(sku: str, quantity: int) -> Dict[str, Any]:
+            return await ledger.execute_flash_sale_order(sku, quantity, uncertainty_ms=scenario.uncertainty_ms)
+    else:
+        ledger = spanner_service
+        app = FastAPI()
+        app.include_router(bench_router, prefix="/api/v1/inventory")
+        app.include_router(inventory.router, prefix="/api/v1/inventory")
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+        async def buy(sku: str, quantity: int) -> Dict[str, Any]:
+            resp = await client.post(BUY_PATH, params={"sku": sku, "quantity": quantity, "uncertainty_ms": scenario.uncertainty_ms})
+            return resp.json() if resp.status_code == 200 else {"status": "FAILURE", "message": f"HTTP {resp.status_code}"}
+
+    for i in range(scenario.skus):
+        ledger.add_sku(f"{prefix}{i}", stock)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    attempts: Counter = Counter()
+    units = aborted = 0
+    cursor = iter(orders)
+
+    async def buyer():
+        nonlocal units, aborted
+        for sku, quantity in cursor:
+            t0 = time.perf_counter()
+            for tries in range(1, max_retries + 2):
+                # Client retries only transport/server failures; SOLD_OUT is a final answer
+                result = await buy(f"{prefix}{sku}", quantity)
+                if result.get("status") != "FAILURE":
+                    break
+            latencies.append((time.perf_counter() - t0) * 1000)
+            status = result.get("status", "FAILURE")
+            statuses[status] += 1
+            tried = tries - 1 + result.get("metrics", {}).get("attempts", 1)
+            attempts[tried] += 1
+            aborted += tried if status == "FAILURE" else tried - 1
+            if status == "SUCCESS":
+                units += quantity
+
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*[buyer() for _ in range(scenario.concurrency)])
+    finally:
+        if client is not None:
+            await client.aclose()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    sold = statuses["SUCCESS"]
+    total_attempts = sum(k * v for k, v in attempts.items())
+    return {
+        "scenario": scenario.name,
+        **scenario._asdict(),
+        "stock_per_sku": stock,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(len(orders) / elapsed, 1),
+        "throughput_sold": round(sold / elapsed, 1),
+        "units_sold": units,
+        "sellout_rate": round(statuses["SOLD_OUT"] / len(orders), 4),
+        "abort_rate": round(aborted / total_attempts, 4) if total_attempts else 0.0,
+        "statuses": dict(statuses),
+        "retry_histogram": {str(k): v for k, v in sorted(attempts.items())},
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p90_ms": round(percentile(latencies, 0.90), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "p999_ms": round(percentile(latencies, 0.999), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+def scenarios(args) -> List[Scenario]:
+    targets = ("service", "http") if args.target == "both" else (args.target,)
+    return [
+        Scenario(target, c, z, q, u, args.skus, args.orders, args.stock_ratio)
+        for target, c, z, q, u in itertools.product(targets, args.concurrency, args.zipf, args.quantity, args.uncertainty)
+    ]
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float, p99_tolerance: float) -> List[str]:
+    """
+    Throughput may not drop by more than `tolerance` nor p99 rise by more than `p99_tolerance`
+    (tails are far noisier run to run); the contention abort rate may not rise by more than
+    two points. Sell-outs are fixed by the seeded workload and are not gated.
+    """
+    regressions = []
+    for row in results:
+        base = baseline.get(row["scenario"])
+        if base is None:
+            continue
+        if row["throughput_ops"] < base["throughput_ops"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']}: throughput {row['throughput_ops']:.0f} < baseline {base['throughput_ops']:.0f}")
+        if row["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance) + 1.0:
+            regressions.append(f"{row['scenario']}: p99 {row['p99_ms']:.1f}ms > baseline {base['p99_ms']:.1f}ms")
+        if row["abort_rate"] > base["abort_rate"] + 0.02:
+            regressions.append(f"{row['scenario']}: abort rate {row['abort_rate']:.3f} vs baseline {base['abort_rate']:.3f}")
+    return regressions
+
+def write_csv(path: str, results: List[Dict[str, Any]]):
+    fields = [k for k in results[0] if k not in ("statuses", "retry_histogram")] + ["retry_histogram"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for row in results:
+            writer.writerow({**row, "retry_histogram": json.dumps(row["retry_histogram"])})
+
+async def benchmark_flash_sale(args) -> int:
+    print("--- FLASH-SALE CONTENTION SUITE ---")
+    print(f"{args.orders} orders per scenario over {args.skus} SKUs, stock ratio {args.stock_ratio:g}\n")
+    print(f"{'Scenario':<40} | {'ops/s':>8} | {'sold/s':>8} | {'sold out':>8} | {'abort':>6} | {'p50':>7} | {'p99':>7} | {'p99.9':>7} | retries")
+    print("-" * 123)
+    results = []
+    run_ids = itertools.count()
+    for scenario in scenarios(args):
+        # Median of repeats: single runs of a few seconds are at the mercy of GC and the scheduler
+        runs = sorted([await run_scenario(scenario, args.max_retries, next(run_ids)) for _ in range(args.repeat)], key=lambda r: r["throughput_ops"])
+        row = runs[len(runs) // 2]
+        for key in ("p50_ms", "p90_ms", "p99_ms", "p999_ms"):
+            row[key] = round(statistics.median(r[key] for r in runs), 2)
+        row["repeats"] = len(runs)
+        results.append(row)
+        print(
+            f"{row['scenario']:<40} | {row['throughput_ops']:>8,.0f} | {row['throughput_sold']:>8,.0f} | "
+            f"{row['sellout_rate']:>8.1%} | {row['abort_rate']:>6.1%} | {row['p50_ms']:>7.1f} | {row['p99_ms']:>7.1f} | {row['p999_ms']:>7.1f} | "
+            f"{row['retry_histogram']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, results)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({row["scenario"]: {k: row[k] for k in ("throughput_ops", "p99_ms", "sellout_rate", "abort_rate")} for row in results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.p99_tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS vs {args.baseline} (tolerance {args.tolerance:.0%}, p99 {args.p99_tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Flash-sale contention benchmark")
+    parser.add_argument("--target", choices=("service", "http", "both"), default="service")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY)
+    parser.add_argument("--zipf", type=float, nargs="+", default=ZIPF)
+    parser.add_argument("--quantity", nargs="+", default=QUANTITIES, help='"1", "uniform:1-4", "geometric:0.5"')
+    parser.add_argument("--uncertainty", type=float, nargs="+", default=UNCERTAINTY_MS, help="epsilon in ms")
+    parser.add_argument("--skus", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=2_000)
+    parser.add_argument("--stock-ratio", type=float, default=1.0, help="stock per SKU as a share of uniform demand")
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; medians are reported")
+    parser.add_argument("--json")
+    parser.add_argument("--csv")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--p99-tolerance", type=float, default=1.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(benchmark_flash_sale(parse_args())))
@@ -1,6 +1,7 @@
 import asyncio
+import json
 import random
-from app.services.crdt_service import CRDTService, InventoryCRDT
+from app.services.crdt_service import CRDTService, InventoryCRDT, DEFAULT_SKU
 
 async def stress_test_crdt():
     print("--- CRDT STRESS TEST: PACKET LOSS & PARTITIONS ---")
@@ -55,5 +56,105 @@ async def stress_test_crdt():
     else:
         print(f"[FAIL] Divergence. Expected {expected}, got {final_stock}")
 
+def _bytes(payload) -> int:
+    return len(json.dumps(payload, separators=(",", ":")))
+
+def measure_sync_bytes(devices: int, rounds: int = 5, active_share: float = 0.05):
+    """
+    Every round all devices sync, but only `active_share` of them bought something since
+    their last sync (the realistic steady state). Compares the full-state protocol
+    (request + reply carry every device that ever touched the SKU) with delta-state sync.
+    """
+    rng = random.Random(7)
+    full_server, delta_server = CRDTService(), CRDTService()
+    clients = [(f"device-{i:05d}", InventoryCRDT()) for i in range(devices)]
+    since = {node: {} for node, _ in clients}
+    epochs = {node: [0, 0] for node, _ in clients}  # compaction epoch acked per protocol
+    full_bytes = delta_bytes = syncs = 0
+
+    for r in range(rounds):
+        buyers = set(rng.sample(range(devices), max(1, int(devices * active_share))))
+        for i, (node, crdt) in enumerate(clients):
+            if i in buyers or r == 0:
+                crdt.dec(node, 1)
+            ts = {"p": 0, "l": r}
+
+            # Full state: client ships its whole map, server replies with the converged maps
+            request = {"node_id": node, "p_deltas": crdt.P, "n_deltas": crdt.N, "timestamp": ts, "epoch": epochs[node][0]}
+            reply = full_server.handle_sync(node, crdt.P, crdt.N, ts, epochs[node][0])
+            if reply["compaction"]:
+                epochs[node][0] = reply["compaction"]["epoch"]
+            crdt.merge(reply["p_state"], reply["n_state"])
+            full_bytes += _bytes(request) + _bytes(reply)
+
+            # Delta state: only this device's changed entry + the version vector go up
+            changed = {node: crdt.N[node]} if i in buyers or r == 0 else {}
+            request = {"node_id": node, "timestamp": ts, "skus": {DEFAULT_SKU: {"n": changed, "since": since[node]}}, "epoch": epochs[node][1]}
+            reply = delta_server.sync_deltas(node, ts, request["skus"], epochs[node][1])
+            since[node] = reply["skus"][DEFAULT_SKU]["vv"]
+            if reply["compaction"]:
+                epochs[node][1] = reply["compaction"]["epoch"]
+            delta_bytes += _bytes(request) + _bytes(reply)
+            syncs += 1
+
+    assert full_server.inventory.value() == delta_server.inventory.value()
+    return full_bytes / syncs, delta_bytes / syncs
+
+def benchmark_sync_bytes():
+    print("\n--- BYTES PER SYNC: FULL STATE vs DELTA STATE ---")
+    print(f"{'Devices':<10} | {'Full (B/sync)':<14} | {'Delta (B/sync)':<15} | {'Reduction'}")
+    print("-" * 58)
+    for devices in (10, 100, 1000):
+        full, delta = measure_sync_bytes(devices)
+        print(f"{devices:<10} | {full:<14.0f} | {delta:<15.0f} | {full / delta:.1f}x")
+
+def benchmark_device_gc(days: int = 60, new_devices_per_day: int = 50, active_days: int = 7, skus: int = 20):
+    """
+    Consumer devices churn: each day new devices appear, buy across the catalog for about a
+    week, then go silent. Compares counter width with and without daily compaction.
+    """
+    print("\n--- DEVICE-ID GC UNDER CHURN ---")
+    rng = random.Random(11)
+    day = 86400.0
+    plain, compacted = CRDTService(), CRDTService(device_ttl=active_days * day)
+    sku_ids = [f"SKU-{i:03d}" for i in range(skus)]
+    for server in (plain, compacted):
+        server.store.merge_many({sku: ({"server-virginia": 10**6}, {}) for sku in sku_ids})
+
+    devices = {}  # node -> (first day, local CRDTs, acked epoch)
+    now = 0.0
+    for d in range(days):
+        for i in range(new_devices_per_day):
+            devices[f"device-{d:03d}-{i:03d}"] = [d, {sku: InventoryCRDT() for sku in sku_ids}, 0]
+        for node, state in devices.items():
+            first_day, local, epoch = state
+            if d - first_day >= active_days:
+                continue  # gone silent
+            sku = rng.choice(sku_ids)
+            local[sku].dec(node, 1)
+            request = {sku: {"n": {node: local[sku].N[node]}}}
+            plain.sync_deltas(node, {"p": 0, "l": d}, request, epoch)
+            reply = compacted.sync_deltas(node, {"p": 0, "l": d}, request, epoch)
+            if reply["compaction"]:
+                state[2] = reply["compaction"]["epoch"]
+            compacted.replicas[node]["seen"] = now  # simulated clock instead of wall time
+        now += day
+        report = compacted.compact(now=now)
+
+    def width(server):
+        return sum(len(server.store.counter(sku).N) for sku in sku_ids)
+
+    assert plain.stock_levels(sku_ids) == compacted.stock_levels(sku_ids)
+    print(f"Devices seen: {len(devices)} over {days} days ({active_days}-day activity window)")
+    print(f"{'':<14} | {'N entries':<10} | {'Full-state sync (B)'}")
+    for label, server in (("No GC", plain), ("Compacted", compacted)):
+        full = sum(len(json.dumps(server.store.counter(sku).N)) for sku in sku_ids) // skus
+        print(f"{label:<14} | {width(server):<10} | {full}")
+    stats = compacted.metrics()["device_gc"]
+    print(f"Reclaimed {stats['entries_reclaimed']} entries (~{stats['approx_bytes_reclaimed'] / 1024:.0f} KiB), "
+          f"{stats['ids_forgotten']} retired IDs fully forgotten, {report['pending_ack']} awaiting acks")
+
 if __name__ == "__main__":
     asyncio.run(stress_test_crdt())
+    benchmark_sync_bytes()
+    benchmark_device_gc()
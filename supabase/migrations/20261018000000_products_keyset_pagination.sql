@@ -0,0 +1,13 @@
+-- Keyset pagination support for the catalog listing
+-- GET /api/v1/products orders by (created_at DESC, id DESC) and seeks past a cursor,
+-- optionally filtered by category or vendor_id. These indexes serve each shape
+-- without scanning (or detoasting embeddings of) skipped rows.
+
+CREATE INDEX IF NOT EXISTS idx_products_created_at_id
+ON public.products (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_products_category_created_at_id
+ON public.products (category, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_products_vendor_created_at_id
+ON public.products (vendor_id, created_at DESC, id DESC);
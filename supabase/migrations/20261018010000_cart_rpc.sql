@@ -0,0 +1,124 @@
+-- Single-round-trip cart API
+-- The cart router used to chain up to 7 PostgREST calls per mutation
+-- (find cart, create cart, find item, update/insert, re-read cart, re-read items).
+-- These functions do the whole read or mutation server-side and return the hydrated cart.
+-- Called by the API with the service key on behalf of an already-authenticated user.
+
+-- Hydrated cart as JSON: { id, user_id, items: [{ ..., product: {...} }] }
+-- Product fields are projected explicitly so embeddings are never shipped.
+CREATE OR REPLACE FUNCTION public.cart_hydrate(p_cart_id UUID)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT jsonb_build_object(
+    'id', c.id,
+    'user_id', c.user_id,
+    'items', COALESCE((
+      SELECT jsonb_agg(
+        jsonb_build_object(
+          'id', ci.id,
+          'cart_id', ci.cart_id,
+          'product_id', ci.product_id,
+          'quantity', ci.quantity,
+          'product', CASE WHEN p.id IS NULL THEN NULL ELSE jsonb_build_object(
+            'id', p.id,
+            'vendor_id', p.vendor_id,
+            'title', p.title,
+            'description', p.description,
+            'price', p.price,
+            'stock', p.stock,
+            'images', p.images,
+            'category', p.category,
+            'created_at', p.created_at
+          ) END
+        )
+        ORDER BY ci.added_at
+      )
+      FROM public.cart_items ci
+      LEFT JOIN public.products p ON p.id = ci.product_id
+      WHERE ci.cart_id = c.id
+    ), '[]'::jsonb)
+  )
+  FROM public.carts c
+  WHERE c.id = p_cart_id;
+$$;
+
+-- Returns the user's cart id, creating the cart if the signup trigger never ran
+CREATE OR REPLACE FUNCTION public.cart_ensure(p_user_id UUID)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_cart_id UUID;
+BEGIN
+  INSERT INTO public.carts (user_id)
+  VALUES (p_user_id)
+  ON CONFLICT (user_id) DO NOTHING;
+
+  SELECT id INTO v_cart_id FROM public.carts WHERE user_id = p_user_id;
+  RETURN v_cart_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.cart_get(p_user_id UUID)
+RETURNS JSONB
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT public.cart_hydrate(public.cart_ensure(p_user_id));
+$$;
+
+-- Adds one or many lines: p_items = [{"product_id": "...", "quantity": 2}, ...]
+-- Duplicate product ids in the batch are summed before the upsert.
+CREATE OR REPLACE FUNCTION public.cart_add_items(p_user_id UUID, p_items JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_cart_id UUID := public.cart_ensure(p_user_id);
+BEGIN
+  INSERT INTO public.cart_items (cart_id, product_id, quantity)
+  SELECT v_cart_id, item.product_id, SUM(item.quantity)
+  FROM jsonb_to_recordset(p_items) AS item(product_id UUID, quantity INTEGER)
+  GROUP BY item.product_id
+  ON CONFLICT (cart_id, product_id)
+  DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity;
+
+  RETURN public.cart_hydrate(v_cart_id);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.cart_remove_item(p_user_id UUID, p_item_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_cart_id UUID;
+BEGIN
+  SELECT id INTO v_cart_id FROM public.carts WHERE user_id = p_user_id;
+  IF v_cart_id IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  -- Scoped to the caller's cart: another user's item id is a no-op
+  DELETE FROM public.cart_items WHERE id = p_item_id AND cart_id = v_cart_id;
+
+  RETURN public.cart_hydrate(v_cart_id);
+END;
+$$;
+
+-- These take the user id as an argument, so only the backend may call them
+REVOKE EXECUTE ON FUNCTION public.cart_hydrate(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cart_ensure(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cart_get(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cart_add_items(UUID, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cart_remove_item(UUID, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.cart_get(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.cart_add_items(UUID, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION public.cart_remove_item(UUID, UUID) TO service_role;
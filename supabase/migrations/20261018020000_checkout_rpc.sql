@@ -0,0 +1,113 @@
+-- Atomic, set-based checkout
+-- Replaces the router's per-row order_items inserts and read-modify-write stock loop,
+-- which oversold under concurrent checkouts and left half-written orders on failure.
+
+-- Idempotency: a retried checkout with the same key returns the original order
+ALTER TABLE public.orders
+ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_user_idempotency_key
+ON public.orders (user_id, idempotency_key)
+WHERE idempotency_key IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.order_hydrate(p_order_id UUID)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT (to_jsonb(o) - 'idempotency_key') || jsonb_build_object(
+    'items', COALESCE((
+      SELECT jsonb_agg(to_jsonb(oi) ORDER BY oi.added_at)
+      FROM public.order_items oi
+      WHERE oi.order_id = o.id
+    ), '[]'::jsonb)
+  )
+  FROM public.orders o
+  WHERE o.id = p_order_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.checkout_cart(p_user_id UUID, p_idempotency_key TEXT DEFAULT NULL)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_cart_id UUID;
+  v_order_id UUID;
+  v_lines INTEGER;
+  v_short TEXT;
+BEGIN
+  -- 1. Serialize checkouts of the same cart (double-clicks, client retries)
+  SELECT id INTO v_cart_id FROM public.carts WHERE user_id = p_user_id FOR UPDATE;
+  IF v_cart_id IS NULL THEN
+    RAISE EXCEPTION 'No active cart found';
+  END IF;
+
+  -- 2. Idempotent replay (checked under the cart lock, so concurrent retries see the winner)
+  IF p_idempotency_key IS NOT NULL THEN
+    SELECT id INTO v_order_id FROM public.orders
+    WHERE user_id = p_user_id AND idempotency_key = p_idempotency_key;
+    IF v_order_id IS NOT NULL THEN
+      RETURN public.order_hydrate(v_order_id);
+    END IF;
+  END IF;
+
+  CREATE TEMP TABLE _checkout_lines ON COMMIT DROP AS
+  SELECT ci.product_id, SUM(ci.quantity)::INTEGER AS quantity
+  FROM public.cart_items ci
+  WHERE ci.cart_id = v_cart_id
+  GROUP BY ci.product_id;
+
+  GET DIAGNOSTICS v_lines = ROW_COUNT;
+  IF v_lines = 0 THEN
+    RAISE EXCEPTION 'Cart is empty';
+  END IF;
+
+  -- 3. Lock product rows in a stable order so concurrent checkouts cannot deadlock
+  PERFORM 1 FROM public.products p
+  JOIN _checkout_lines l ON l.product_id = p.id
+  ORDER BY p.id
+  FOR UPDATE OF p;
+
+  -- 4. Conditional, set-based decrement: a line only applies if stock covers it
+  CREATE TEMP TABLE _checkout_priced ON COMMIT DROP AS
+  WITH decremented AS (
+    UPDATE public.products p
+    SET stock = p.stock - l.quantity
+    FROM _checkout_lines l
+    WHERE p.id = l.product_id AND p.stock >= l.quantity
+    RETURNING p.id AS product_id, l.quantity, p.price
+  )
+  SELECT * FROM decremented;
+
+  IF (SELECT COUNT(*) FROM _checkout_priced) <> v_lines THEN
+    SELECT COALESCE(p.title, l.product_id::TEXT) INTO v_short
+    FROM _checkout_lines l
+    LEFT JOIN public.products p ON p.id = l.product_id
+    WHERE l.product_id NOT IN (SELECT product_id FROM _checkout_priced)
+    LIMIT 1;
+    -- Aborts the transaction: every decrement above is rolled back
+    RAISE EXCEPTION 'Insufficient stock for %', v_short;
+  END IF;
+
+  -- 5. Order + bulk order_items
+  INSERT INTO public.orders (user_id, total_amount, status, idempotency_key)
+  SELECT p_user_id, SUM(price * quantity), 'paid', p_idempotency_key
+  FROM _checkout_priced
+  RETURNING id INTO v_order_id;
+
+  INSERT INTO public.order_items (order_id, product_id, quantity, price_at_purchase)
+  SELECT v_order_id, product_id, quantity, price
+  FROM _checkout_priced;
+
+  -- 6. Clear cart
+  DELETE FROM public.cart_items WHERE cart_id = v_cart_id;
+
+  RETURN public.order_hydrate(v_order_id);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.order_hydrate(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.checkout_cart(UUID, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.checkout_cart(UUID, TEXT) TO service_role;
@@ -0,0 +1,11 @@
+-- Order history pagination
+-- GET /api/v1/orders seeks on (created_at DESC, id DESC) per user.
+-- INCLUDE makes summary listings index-only: no heap visits for the order columns.
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at_id
+ON public.orders (user_id, created_at DESC, id DESC)
+INCLUDE (total_amount, status);
+
+-- order_items.order_id had no index: every embedded `items` / `count` lookup was a scan
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id
+ON public.order_items (order_id)
+INCLUDE (product_id, quantity, price_at_purchase);
@@ -0,0 +1,33 @@
+-- Bulk embedding write-back for the backfill job
+-- Replaces one UPDATE round trip per product with one call per page:
+-- p_rows = [{"id": "...", "embedding": [0.1, ...]}, ...]
+-- text-embedding-004 returns 768 dims; the column is vector(1536) since the master
+-- schema alignment, so shorter vectors are zero-padded the same way that migration did.
+CREATE OR REPLACE FUNCTION public.bulk_set_product_embeddings(p_rows JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_updated INTEGER;
+BEGIN
+  UPDATE public.products p
+  SET embedding = (
+    CASE
+      WHEN jsonb_array_length(r.embedding) < 1536
+      THEN (ARRAY(SELECT jsonb_array_elements_text(r.embedding)::float4)
+            || array_fill(0::float4, ARRAY[1536 - jsonb_array_length(r.embedding)]))
+      ELSE ARRAY(SELECT jsonb_array_elements_text(r.embedding)::float4)
+    END
+  )::vector(1536)
+  FROM jsonb_to_recordset(p_rows) AS r(id UUID, embedding JSONB)
+  WHERE p.id = r.id;
+
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.bulk_set_product_embeddings(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bulk_set_product_embeddings(JSONB) TO service_role;
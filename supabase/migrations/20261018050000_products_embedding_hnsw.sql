@@ -0,0 +1,42 @@
+-- ANN index + single-distance match_products
+-- The ivfflat index was trained on the original 768-dim column (lists = 100 regardless of
+-- catalog size) and match_products still declares vector(768) although the column is
+-- vector(1536) since the master schema alignment. The old body also evaluated
+-- `embedding <=> query` twice per row and filtered on it, which keeps the planner off the index.
+
+DROP INDEX IF EXISTS public.products_embedding_idx;
+
+-- HNSW needs no training pass and keeps recall as products are added
+CREATE INDEX IF NOT EXISTS products_embedding_hnsw_idx
+ON public.products
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+DROP FUNCTION IF EXISTS public.match_products(vector, float, int);
+
+-- Returns ids + similarity only: the API hydrates the projected product rows itself,
+-- so embeddings are never shipped back over the wire.
+CREATE FUNCTION public.match_products (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int
+)
+RETURNS TABLE (
+  id uuid,
+  similarity float
+)
+LANGUAGE sql
+STABLE
+AS $$
+  -- Inner ORDER BY <=> ... LIMIT is the shape the HNSW index serves; distance is computed once
+  SELECT nearest.id, 1 - nearest.distance AS similarity
+  FROM (
+    SELECT p.id, p.embedding <=> query_embedding AS distance
+    FROM public.products p
+    WHERE p.embedding IS NOT NULL
+    ORDER BY p.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+$$;